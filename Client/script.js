@@ -115,6 +115,13 @@ async function handleGeneration() {
             })
         });
 
+        if (response.status === 429) {
+            const busy = await response.json();
+            const wait = busy.retry_after ? ` Try again in about ${busy.retry_after} seconds.` : "";
+            alert((busy.error || "The server is busy.") + wait);
+            stopPremiumLoading();
+            return;
+        }
         if (!response.ok) throw new Error("Failed to initiate generation");
 
         const initData = await response.json();
@@ -122,7 +129,10 @@ async function handleGeneration() {
 
         if (!jobId) throw new Error("No Job ID received");
 
-        // 2. Poll for Status
+        // 2. Show the screenplay as it is written
+        streamScreenplay(jobId);
+
+        // 3. Poll for Status
         await pollForCompletion(jobId);
 
     } catch (error) {
@@ -133,12 +143,26 @@ async function handleGeneration() {
 }
 
 async function pollForCompletion(jobId) {
-    const pollInterval = 3000; // 3 seconds
+    const pollInterval = 3000; // 3 seconds, when the server cannot hold requests
+    const longPoll = 25; // the server answers as soon as the status or step changes
+    let pushAvailable = true;
+    let showSteps = false;
+    let lastStep = null;
 
     const checkStatus = async () => {
         try {
-            const res = await fetch(`/generation-status/${jobId}`);
-            if (!res.ok) throw new Error("Polling failed");
+            const wait = pushAvailable ? `?wait=${longPoll}` : '';
+            const res = await fetch(`/generation-status/${jobId}${wait}`);
+            if (!res.ok) {
+                // A proxy may cut long requests short: retry once as plain polling.
+                if (pushAvailable && res.status !== 404) {
+                    pushAvailable = false;
+                    setTimeout(checkStatus, pollInterval);
+                    return;
+                }
+                throw new Error("Polling failed");
+            }
+            pushAvailable = pushAvailable && res.headers.has('X-Long-Poll');
 
             const data = await res.json();
 
@@ -158,8 +182,15 @@ async function pollForCompletion(jobId) {
                 // Failure
                 throw new Error(data.error || "Generation failed in background");
             } else {
-                // Still processing... keep polling
-                setTimeout(checkStatus, pollInterval);
+                // Waiting in line or a new step: show it instead of the cycling phrases
+                if (data.queue_position || showSteps || (lastStep !== null && data.step !== lastStep)) {
+                    showSteps = true;
+                    clearInterval(loadingInterval);
+                    document.getElementById('loading-status').textContent = data.step;
+                }
+                lastStep = data.step;
+                // Still processing: a held request already waited, so ask again right away
+                setTimeout(checkStatus, pushAvailable ? 0 : pollInterval);
             }
         } catch (error) {
             console.error("Polling Error:", error);
@@ -168,8 +199,43 @@ async function pollForCompletion(jobId) {
         }
     };
 
-    // Start polling
-    setTimeout(checkStatus, pollInterval);
+    checkStatus();
+}
+
+
+/* LIVE SCREENPLAY STREAM */
+let screenplayStream = null;
+
+function streamScreenplay(jobId) {
+    if (!window.EventSource) return; // Polling alone still delivers the result
+
+    const paper = document.getElementById('screenplay-content');
+    let draft = "";
+
+    screenplayStream = new EventSource(`/generation-stream/${jobId}`);
+
+    screenplayStream.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (!data.token) return;
+
+        // First words: swap the loader for the page being written
+        if (!draft) {
+            stopPremiumLoading();
+            navigateTo('view-output');
+            paper.classList.remove('hidden');
+            document.getElementById('dock-content').classList.add('hidden');
+        }
+        draft += data.token;
+        paper.innerHTML = formatScreenplay(draft);
+    };
+
+    const close = () => {
+        if (screenplayStream) screenplayStream.close();
+        screenplayStream = null;
+    };
+    screenplayStream.addEventListener('end', close);
+    screenplayStream.addEventListener('failed', close);
+    screenplayStream.onerror = close;
 }
 
 
@@ -299,8 +365,11 @@ function createCustomAudioPlayer(url, title = "Audio Track") {
 
     // Time Update
     audio.addEventListener('timeupdate', () => {
-        const percent = (audio.currentTime / audio.duration) * 100;
-        progressFill.style.width = `${percent}%`;
+        // Streamed narration has no known duration until it finishes.
+        if (isFinite(audio.duration)) {
+            const percent = (audio.currentTime / audio.duration) * 100;
+            progressFill.style.width = `${percent}%`;
+        }
 
         const mins = Math.floor(audio.currentTime / 60);
         const secs = Math.floor(audio.currentTime % 60).toString().padStart(2, '0');
@@ -317,7 +386,7 @@ function createCustomAudioPlayer(url, title = "Audio Track") {
     progressContainer.addEventListener('click', (e) => {
         const rect = progressContainer.getBoundingClientRect();
         const pos = (e.clientX - rect.left) / rect.width;
-        audio.currentTime = pos * audio.duration;
+        if (isFinite(audio.duration)) audio.currentTime = pos * audio.duration;
     });
 
     return container;
@@ -405,9 +474,13 @@ async function generateMusic() {
             const data = await response.json();
             if (data.error) throw new Error(data.error);
 
+            // Rendering happens in the background; wait for the file
+            // (repeated descriptions come back already rendered).
+            const audioUrl = data.audio_url || await waitForMusic(data.job_id);
+
             // Replace loader with Custom Player
             item.querySelector('.loader').remove();
-            const player = createCustomAudioPlayer(data.audio_url, `Scene ${i + 1} Score`);
+            const player = createCustomAudioPlayer(audioUrl, `Scene ${i + 1} Score`);
             item.appendChild(player);
 
         } catch (e) {
@@ -417,6 +490,22 @@ async function generateMusic() {
     }
 }
 
+async function waitForMusic(jobId) {
+    const pollInterval = 1000; // renders take a few seconds at most
+
+    while (true) {
+        const started = Date.now();
+        const res = await fetch(`/music-status/${jobId}?wait=10`);
+        const data = await res.json();
+
+        if (data.status === 'completed') return data.audio_url;
+        if (data.status === 'failed' || data.error) {
+            throw new Error(data.error || "Music generation failed");
+        }
+        await new Promise(resolve => setTimeout(resolve, Math.max(0, pollInterval - (Date.now() - started))));
+    }
+}
+
 async function narrateScript() {
     const statusDiv = document.getElementById('media-player-container');
     statusDiv.innerHTML = "🎙️ Preparing Narration...";
@@ -432,7 +521,9 @@ async function narrateScript() {
         if (data.error) throw new Error(data.error);
 
         statusDiv.innerHTML = '<div>🎙️ Narration Ready:</div>';
-        const player = createCustomAudioPlayer(data.audio_url, "Full Screenplay Narration");
+        const cast = data.voices ? Object.keys(data.voices).length : 0;
+        const title = cast > 1 ? `Audio Drama (${cast} voices)` : "Full Screenplay Narration";
+        const player = createCustomAudioPlayer(data.audio_url, title);
         statusDiv.appendChild(player);
 
     } catch (e) {
@@ -0,0 +1,66 @@
+import re
+
+from utils.screenplay_parser import Scene, split_scenes
+
+# Rough BPE stand-in: words cost one token per 4 characters, punctuation
+# one token each. Within ~15% of real tokenizers on English prose, which
+# is all a prompt budget needs, and it runs in a single regex pass.
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+# Finer and finer places to cut a span that is still over budget.
+_SEPARATORS = ("\n\n", "\n", " ")
+
+def estimate_tokens(text, start=0, end=None):
+    """Approximate token count of text[start:end] without copying it."""
+    end = len(text) if end is None else end
+    return sum(1 for _ in _TOKEN_RE.finditer(text, start, end))
+
+def _split_span(text, start, end, max_tokens, level=0):
+    """Yields (start, end, tokens) pieces of a span, each within max_tokens."""
+    tokens = estimate_tokens(text, start, end)
+    if tokens <= max_tokens:
+        yield start, end, tokens
+        return
+
+    if level == len(_SEPARATORS):
+        # No whitespace left to cut on; a token is at least one character.
+        for pos in range(start, end, max_tokens):
+            piece_end = min(pos + max_tokens, end)
+            yield pos, piece_end, estimate_tokens(text, pos, piece_end)
+        return
+
+    sep = _SEPARATORS[level]
+    pos = start
+    while pos < end:
+        cut = text.find(sep, pos, end)
+        piece_end = end if cut == -1 else cut + len(sep)
+        yield from _split_span(text, pos, piece_end, max_tokens, level + 1)
+        pos = piece_end
+
+def chunk_screenplay(text, max_tokens):
+    """
+    Splits a screenplay into chunks of at most ~max_tokens, as Scene spans.
+
+    Whole scenes are packed together greedily; a scene only gets cut (on
+    paragraph, then line, then word boundaries) when it alone is over
+    budget. Chunks tile the text exactly and carry the heading of their
+    first scene, so they can stand in for scenes wherever spans are used.
+    """
+    chunks = []
+    if not text:
+        return chunks
+
+    current = None  # [start, end, tokens, heading]
+    for scene in split_scenes(text):
+        for start, end, tokens in _split_span(text, scene.start, scene.end, max_tokens):
+            heading = scene.heading if start == scene.start else ""
+            if current and current[2] + tokens <= max_tokens:
+                current[1] = end
+                current[2] += tokens
+                current[3] = current[3] or heading
+                continue
+            if current:
+                chunks.append(Scene(len(chunks), current[3], current[0], current[1]))
+            current = [start, end, tokens, heading]
+    chunks.append(Scene(len(chunks), current[3], current[0], current[1]))
+    return chunks
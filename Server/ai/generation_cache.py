@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class GenerationCache:
+    """
+    Content-addressed cache of LLM outputs.
+
+    Entries are keyed by a hash of the exact prompt, model and sampling
+    options (see make_key), so any change to a prompt template or setting
+    naturally misses. A small in-memory LRU sits in front of a disk tier
+    of one JSON file per entry. The disk tier expires entries after `ttl`
+    seconds and evicts the least recently used files once it grows past
+    `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600, memory_entries=128):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # {key: (created_at, text)}
+        self._disk_bytes = None  # computed lazily on first write
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prompt, model, options):
+        blob = json.dumps({"model": model, "options": options, "prompt": prompt},
+                          sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            record = None
+
+        with self._lock:
+            if not record or now - record["created_at"] >= self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, record["created_at"], record["text"])
+
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock
+        except OSError:
+            pass
+        return record["text"]
+
+    def put(self, key, text):
+        now = time.time()
+        path = self._path(key)
+        data = json.dumps({"created_at": now, "text": text}, ensure_ascii=False).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write generation cache entry: {e}")
+            return
+
+        with self._lock:
+            self._remember(key, now, text)
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_size()
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _remember(self, key, created_at, text):
+        self._memory[key] = (created_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drops expired entries, then the oldest until 90% of the budget."""
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, mtime in entries:
+            if total <= self.max_bytes * 0.9 and now - mtime < self.ttl:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+            key = os.path.basename(path).split(".")[0]
+            self._memory.pop(key, None)
+        self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+                "max_bytes": self.max_bytes,
+            }
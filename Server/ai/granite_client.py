@@ -1,45 +1,168 @@
 import requests
 import json
 import logging
+import os
+import re
+import time
+import threading
+
+from .task_graph import run_task_graph
+from .inference_client import InferenceClient
+from .generation_cache import GenerationCache
+from .chunking import chunk_screenplay, estimate_tokens
+from utils.screenplay_parser import Scene, split_scenes, SCENE_HEADING_RE
+from utils.response_cleaner import clean_ai_response
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
 MODEL_NAME = "granite4:micro"
 
-def query_ollama(prompt):
+# How many generations Ollama serves at once (its OLLAMA_NUM_PARALLEL).
+# Requests beyond this wait here instead of queueing inside Ollama.
+OLLAMA_NUM_PARALLEL = max(1, int(os.getenv("OLLAMA_NUM_PARALLEL", "1")))
+_ollama_slots = threading.BoundedSemaphore(OLLAMA_NUM_PARALLEL)
+
+# Generation can legitimately take minutes, so only the connect phase is short.
+# Task graphs run OLLAMA_NUM_PARALLEL workers, and every request holds an
+# _ollama_slots slot, so that many connections cover all of them.
+OLLAMA_CLIENT = InferenceClient("ollama", timeout=(5, 600), backoff_base=0.5, backoff_max=5.0,
+                                pool_size=OLLAMA_NUM_PARALLEL)
+
+OLLAMA_OPTIONS = {
+    "temperature": 0.7,
+    "num_predict": 8192
+}
+
+# How much of each neighbouring scene is shown when revising one scene.
+SCENE_CONTEXT_CHARS = 1500
+
+# Largest slice of screenplay (in estimated tokens) sent in one prompt.
+# Longer scripts are summarised chunk by chunk and the summaries reduced.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "3000"))
+# Reduce rounds before the digest is cut to the budget instead.
+MAX_REDUCE_ROUNDS = 3
+
+GENERATION_CACHE = GenerationCache(
+    os.getenv("GENERATION_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "cache", "generations")),
+    max_bytes=int(os.getenv("GENERATION_CACHE_MB", "256")) * 1024 * 1024,
+    ttl=int(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+)
+
+def query_ollama(prompt, on_token=None, use_cache=True, info=None):
     """
     Sends a prompt to the local Ollama instance and returns the generated text.
+    If on_token is given, the response is streamed and on_token(chunk) is
+    called for every piece of text as Ollama produces it.
+    Identical prompts are answered from GENERATION_CACHE unless use_cache
+    is False. If `info` is a dict, it receives 'cache': 'hit'|'miss'|'bypass'
+    and, for prompts Ollama answered, the EVAL_STATS of the call.
     Retries or handles errors gracefully.
     """
     payload = {
         "model": MODEL_NAME,
         "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.7,
-            "num_predict": 8192
-        }
+        "stream": on_token is not None,
+        "options": OLLAMA_OPTIONS
     }
+    info = info if info is not None else {}
+
+    key = GENERATION_CACHE.make_key(prompt, MODEL_NAME, OLLAMA_OPTIONS)
+    if use_cache:
+        cached = GENERATION_CACHE.get(key)
+        if cached is not None:
+            info["cache"] = "hit"
+            if on_token:
+                on_token(cached)
+            return cached
+        info["cache"] = "miss"
+    else:
+        info["cache"] = "bypass"
 
     try:
-        logger.info(f"Sending request to Ollama ({MODEL_NAME})...")
-        response = requests.post(OLLAMA_URL, json=payload, timeout=600)
-        response.raise_for_status()
-        
-        data = response.json()
-        return data.get("response", "")
+        waited = time.perf_counter()
+        with _ollama_slots:
+            started = time.perf_counter()
+            logger.info(f"Sending request to Ollama ({MODEL_NAME})...")
+            response = OLLAMA_CLIENT.post(OLLAMA_URL, json=payload, stream=on_token is not None)
+            response.raise_for_status()
+
+            if on_token is None:
+                data = response.json()
+                text = data.get("response", "")
+            else:
+                text, data = _read_stream(response, on_token)
+            _record_eval(info, data, slot_wait=started - waited, seconds=time.perf_counter() - started)
         
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         logger.error(f"Ollama request failed: {e}")
         return None  # Or raise custom exception
 
-def generate_story_content(story_idea, genre="Drama", scene_count="3-5", language="English"):
+    if text:
+        # Bypass only skips the lookup; a fresh result still refreshes the entry.
+        GENERATION_CACHE.put(key, text)
+    return text
+
+# Per-call figures query_ollama() leaves in `info`; add_stats() sums them per stage.
+EVAL_STATS = ("calls", "slot_wait", "seconds", "load_seconds", "prompt_tokens", "prompt_seconds",
+              "tokens", "eval_seconds")
+
+def _record_eval(info, data, slot_wait, seconds):
+    """Copies Ollama's counters (durations are in nanoseconds) into `info`."""
+    info.update({
+        "calls": 1,
+        "slot_wait": round(slot_wait, 3),
+        "seconds": round(seconds, 3),
+        "load_seconds": data.get("load_duration", 0) / 1e9,
+        "prompt_tokens": data.get("prompt_eval_count", 0),
+        "prompt_seconds": data.get("prompt_eval_duration", 0) / 1e9,
+        "tokens": data.get("eval_count", 0),
+        "eval_seconds": data.get("eval_duration", 0) / 1e9,
+    })
+
+def add_stats(total, info):
+    """Adds one call's EVAL_STATS to `total` and refreshes its tokens_per_second."""
+    for field in EVAL_STATS:
+        if field in info:
+            total[field] = round(total.get(field, 0) + info[field], 3)
+    if total.get("eval_seconds"):
+        total["tokens_per_second"] = round(total["tokens"] / total["eval_seconds"], 1)
+    return total
+
+def _read_stream(response, on_token):
+    """
+    Reads Ollama's NDJSON stream, forwarding each chunk to on_token.
+    Returns (text, the final message with Ollama's counters).
+    """
+    parts = []
+    data = {}
+    with response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise requests.exceptions.RequestException(data["error"])
+            chunk = data.get("response", "")
+            if chunk:
+                parts.append(chunk)
+                on_token(chunk)
+            if data.get("done"):
+                break
+    return "".join(parts), data
+
+def generate_story_content(story_idea, genre="Drama", scene_count="3-5", language="English", on_token=None,
+                           use_cache=True, on_progress=None):
     """
     Orchestrates the generation of Screenplay, Characters, and Sound Design.
     Returns a dictionary with the results.
+    on_token, if given, receives the screenplay text as it streams in.
+    on_progress, if given, is called as on_progress(stage, 'started'|'finished',
+    stats) from the worker threads; stats are the stage's summed EVAL_STATS
+    plus 'cache' and 'wall_seconds', as also returned in meta["stages"].
+    use_cache=False forces fresh generations for every stage.
     """
     from .prompts import SCREENPLAY_PROMPT, CHARACTERS_PROMPT, SOUND_DESIGN_PROMPT, SYNOPSIS_PROMPT
 
@@ -59,30 +182,72 @@ def generate_story_content(story_idea, genre="Drama", scene_count="3-5", languag
     p_characters = CHARACTERS_PROMPT.format(story=story_idea, genre=genre, language=language)
     p_sound = SOUND_DESIGN_PROMPT.format(story=story_idea, genre=genre, language=language)
 
-    # Execute requests (sequentially for stability, though parallel is possible)
-    # The requirement says "One generation request at a time (simple queue / lock)" at the server level,
-    # but for a single user request, we need 3 internal generations. 
-    # Since Ollama might struggle with parallel requests on local hardware, sequential is safer.
-    
-    logger.info("Generating Screenplay...")
-    results["screenplay"] = query_ollama(p_screenplay)
-    
-    if not results["screenplay"]:
-        results["meta"]["status"] = "failed_screenplay"
-        return results
+    cache = {}  # {stage: 'hit'|'miss'|'bypass'}
+    stages = {}  # {stage: summed EVAL_STATS}; each is only written by its own task
 
-    # NEW: Generate Synopsis from Screenplay
-    logger.info("Generating Synopsis...")
-    p_synopsis = SYNOPSIS_PROMPT.format(screenplay_text=results["screenplay"][:12000], language=language) # Limit context if needed
-    results["synopsis"] = query_ollama(p_synopsis)
+    def ask(stage, prompt, **kwargs):
+        info = {}
+        text = query_ollama(prompt, use_cache=use_cache, info=info, **kwargs)
+        cache[stage] = info.get("cache")
+        add_stats(stages.setdefault(stage, {}), info)
+        return text
 
-    logger.info("Generating Characters...")
-    p_characters = CHARACTERS_PROMPT.format(story=story_idea, genre=genre, language=language) # Fixed: using original prompt vars
-    results["characters"] = query_ollama(p_characters)
+    def staged(stage, fn):
+        def run(deps):
+            stats = stages.setdefault(stage, {})
+            if on_progress:
+                on_progress(stage, "started", stats)
+            started = time.perf_counter()
+            try:
+                return fn(deps)
+            finally:
+                stats["wall_seconds"] = round(time.perf_counter() - started, 3)
+                stats["cache"] = cache.get(stage)
+                if on_progress:
+                    on_progress(stage, "finished", stats)
+        return run
 
-    logger.info("Generating Sound Design...")
-    p_sound = SOUND_DESIGN_PROMPT.format(story=story_idea, genre=genre, language=language)
-    results["sound_design"] = query_ollama(p_sound)
+    def screenplay(_):
+        logger.info("Generating Screenplay...")
+        return ask("screenplay", p_screenplay, on_token=on_token)
+
+    def synopsis(deps):
+        if not deps["screenplay"]:
+            return None
+        logger.info("Generating Synopsis...")
+        condensed = condense_screenplay(deps["screenplay"], language, use_cache=use_cache,
+                                        stats=stages.setdefault("synopsis", {}))
+        p_synopsis = SYNOPSIS_PROMPT.format(screenplay_text=condensed, language=language)
+        return ask("synopsis", p_synopsis)
+
+    def characters(_):
+        logger.info("Generating Characters...")
+        return ask("characters", p_characters)
+
+    def sound_design(_):
+        logger.info("Generating Sound Design...")
+        return ask("sound_design", p_sound)
+
+    # Characters and sound design only need the story idea, so they run
+    # alongside the screenplay; only the synopsis waits for it.
+    # query_ollama() caps how many of these actually hit Ollama at once.
+    started = time.perf_counter()
+    outputs, timings = run_task_graph({
+        "screenplay": (staged("screenplay", screenplay), []),
+        "characters": (staged("characters", characters), []),
+        "sound_design": (staged("sound_design", sound_design), []),
+        "synopsis": (staged("synopsis", synopsis), ["screenplay"]),
+    }, max_workers=OLLAMA_NUM_PARALLEL)
+    timings["total"] = round(time.perf_counter() - started, 3)
+
+    results.update(outputs)
+    results["meta"]["timings"] = timings
+    results["meta"]["cache"] = cache
+    results["meta"]["stages"] = stages
+
+    if not results["screenplay"]:
+        results["meta"]["status"] = "failed_screenplay"
+        return results
 
     if results["screenplay"] and results["characters"] and results["sound_design"]:
         results["meta"]["status"] = "success"
@@ -91,14 +256,73 @@ def generate_story_content(story_idea, genre="Drama", scene_count="3-5", languag
 
     return results
 
+def condense_screenplay(screenplay_text, language="English", use_cache=True, max_tokens=None, stats=None,
+                        _round=0):
+    """
+    Returns the screenplay if it fits in one prompt, otherwise a digest of it.
+
+    Map: the script is cut into scene-aligned chunks of at most max_tokens
+    (CHUNK_TOKENS) and each chunk is summarised, concurrently within
+    Ollama's slots. Reduce: the summaries are joined in order; if that is
+    still over budget it is condensed again. Only the chunk being prompted
+    and the short summaries are ever held, so cost grows with script length
+    but prompt size and memory do not.
+    If `stats` is a dict, the EVAL_STATS of every summary call are added to it.
+    """
+    from .prompts import CHUNK_SUMMARY_PROMPT
+
+    max_tokens = max_tokens or CHUNK_TOKENS
+    if estimate_tokens(screenplay_text) <= max_tokens:
+        return screenplay_text
+    if _round >= MAX_REDUCE_ROUNDS:
+        logger.warning("Digest still over budget after reducing; truncating it")
+        return chunk_screenplay(screenplay_text, max_tokens)[0].text(screenplay_text)
+
+    chunks = chunk_screenplay(screenplay_text, max_tokens)
+    logger.info(f"Condensing screenplay: {len(chunks)} chunks (round {_round + 1})")
+    stats_lock = threading.Lock()
+
+    def summarize(chunk):
+        def run(_):
+            prompt = CHUNK_SUMMARY_PROMPT.format(
+                language=language, part=chunk.index + 1, parts=len(chunks),
+                chunk=chunk.text(screenplay_text)
+            )
+            info = {}
+            text = query_ollama(prompt, use_cache=use_cache, info=info)
+            if stats is not None:
+                with stats_lock:
+                    add_stats(stats, info)
+            return clean_ai_response(text)
+        return run
+
+    summaries, _ = run_task_graph(
+        {str(chunk.index): (summarize(chunk), []) for chunk in chunks},
+        max_workers=OLLAMA_NUM_PARALLEL
+    )
+
+    parts = []
+    for chunk in chunks:
+        summary = summaries.get(str(chunk.index))
+        if not summary:
+            # Keep the part's place in the story even if its summary failed.
+            headings = [sc.heading for sc in split_scenes(chunk.text(screenplay_text)) if sc.heading]
+            summary = "Scenes: " + "; ".join(headings) if headings else "(summary unavailable)"
+        label = f"Part {chunk.index + 1}" + (f" ({chunk.heading})" if chunk.heading else "")
+        parts.append(f"{label}:\n{summary}")
+
+    digest = "Condensed scene-by-scene summary of a long screenplay.\n\n" + "\n\n".join(parts)
+    return condense_screenplay(digest, language, use_cache, max_tokens, stats, _round + 1)
+
 def generate_followup_questions(screenplay_text):
     """
     Generates 3-5 follow-up questions based on the screenplay.
+    Long screenplays are condensed first so the ending is still covered.
     """
     from .prompts import FOLLOWUP_QUESTIONS_PROMPT
     
     logger.info("Generating Follow-up Questions...")
-    prompt = FOLLOWUP_QUESTIONS_PROMPT.format(screenplay=screenplay_text[:12000]) # Context limit
+    prompt = FOLLOWUP_QUESTIONS_PROMPT.format(screenplay=condense_screenplay(screenplay_text))
     response = query_ollama(prompt)
     
     if not response:
@@ -108,22 +332,126 @@ def generate_followup_questions(screenplay_text):
     questions = [line.strip() for line in response.split('\n') if line.strip() and (line[0].isdigit() or line.startswith('-'))]
     return questions
 
+# Feedback that names a position in the story rather than a character or place.
+_ENDING_RE = re.compile(r"\b(ending|ends|final|finale|climax|resolution|conclusion|last scene)\b")
+_OPENING_RE = re.compile(r"\b(opening|beginning|start|first scene|intro\w*)\b")
+_SCENE_NUMBER_RE = re.compile(r"\bscene\s+(\d+)\b")
+_STOPWORDS = {
+    "about", "after", "again", "also", "been", "before", "being", "could", "does", "doing",
+    "each", "even", "from", "have", "into", "just", "like", "make", "more", "most", "much",
+    "should", "some", "story", "than", "that", "their", "them", "then", "there", "these",
+    "they", "this", "what", "when", "where", "which", "while", "with", "would", "your",
+    "scene", "scenes", "character", "characters", "script", "screenplay", "feel", "want",
+}
+
+def _keywords(text):
+    return {w for w in re.findall(r"[a-z][a-z']{3,}", text.lower()) if w not in _STOPWORDS}
+
+def map_feedback_to_scenes(screenplay, scenes, qa_pairs):
+    """
+    Decides which scenes each Q&A answer should change.
+    Returns {scene index: [(question, answer), ...]}.
+
+    Explicit positions ("the ending", "scene 3", "the opening") win; otherwise
+    scenes are ranked by how many of the answer's keywords (names, places,
+    objects) they mention. Feedback that matches nothing specific, like
+    overall tone, applies to every scene.
+    """
+    candidates = [sc for sc in scenes if sc.heading] or scenes
+    scene_words = {sc.index: _keywords(sc.text(screenplay)) for sc in candidates}
+    targets = {}
+
+    for question, answer in qa_pairs.items():
+        feedback = f"{question} {answer}".lower()
+        chosen = []
+
+        numbers = [int(n) for n in _SCENE_NUMBER_RE.findall(feedback)]
+        chosen += [candidates[n - 1] for n in numbers if 0 < n <= len(candidates)]
+        if _ENDING_RE.search(feedback):
+            chosen.append(candidates[-1])
+        if _OPENING_RE.search(feedback):
+            chosen.append(candidates[0])
+
+        if not chosen:
+            words = _keywords(f"{question} {answer}")
+            scores = {i: len(words & scene_words[i]) for i in scene_words}
+            best = max(scores.values(), default=0)
+            if best >= 2:
+                ranked = sorted(candidates, key=lambda sc: -scores[sc.index])
+                chosen = [sc for sc in ranked if scores[sc.index] >= best * 0.6][:3]
+            else:
+                chosen = candidates
+
+        for sc in chosen:
+            pairs = targets.setdefault(sc.index, [])
+            if (question, answer) not in pairs:
+                pairs.append((question, answer))
+    return targets
+
 def improve_screenplay(original_screenplay, qa_pairs):
     """
     Rewrites the screenplay based on user feedback.
+
+    The script is split on its scene headings and only the scenes the
+    feedback touches are regenerated (concurrently, within Ollama's slots),
+    then spliced back in. Untouched scenes are kept byte for byte, and
+    long scripts are no longer cut off at the prompt limit. Scripts without
+    scene headings are split into CHUNK_TOKENS chunks the same way.
     """
-    from .prompts import SCRIPT_IMPROVEMENT_PROMPT
+    from .prompts import SCRIPT_IMPROVEMENT_PROMPT, SCENE_IMPROVEMENT_PROMPT
     
     logger.info("Improving Screenplay...")
-    
-    # Format QA for the prompt
-    qa_text = "\n".join([f"Q: {q}\nA: {a}" for q, a in qa_pairs.items()])
-    
-    prompt = SCRIPT_IMPROVEMENT_PROMPT.format(
-        screenplay=original_screenplay[:12000], 
-        qa_feedback=qa_text
+
+    scenes = split_scenes(original_screenplay)
+    if len([sc for sc in scenes if sc.heading]) < 2:
+        # Chunks are all candidates for feedback, so drop their headings.
+        scenes = [Scene(c.index, "", c.start, c.end) for c in chunk_screenplay(original_screenplay, CHUNK_TOKENS)]
+        if len(scenes) < 2:
+            # Short and unstructured: a whole-script rewrite fits one prompt.
+            qa_text = "\n".join([f"Q: {q}\nA: {a}" for q, a in qa_pairs.items()])
+            prompt = SCRIPT_IMPROVEMENT_PROMPT.format(
+                screenplay=original_screenplay, 
+                qa_feedback=qa_text
+            )
+            return query_ollama(prompt)
+
+    targets = map_feedback_to_scenes(original_screenplay, scenes, qa_pairs)
+    logger.info(f"Revising scenes {sorted(i + 1 for i in targets)} of {len(scenes)}")
+
+    def context(i):
+        if 0 <= i < len(scenes):
+            return scenes[i].text(original_screenplay)[:SCENE_CONTEXT_CHARS]
+        return "(none)"
+
+    def revise(scene, pairs):
+        def run(_):
+            prompt = SCENE_IMPROVEMENT_PROMPT.format(
+                previous_scene=context(scene.index - 1),
+                scene=scene.text(original_screenplay),
+                next_scene=context(scene.index + 1),
+                qa_feedback="\n".join(f"Q: {q}\nA: {a}" for q, a in pairs)
+            )
+            return clean_ai_response(query_ollama(prompt))
+        return run
+
+    revised, _ = run_task_graph(
+        {str(i): (revise(scenes[i], pairs), []) for i, pairs in targets.items()},
+        max_workers=OLLAMA_NUM_PARALLEL
     )
-    
-    improved_script = query_ollama(prompt)
-    return improved_script
 
+    if not any(revised.values()):
+        return None
+
+    parts = []
+    for scene in scenes:
+        original = scene.text(original_screenplay)
+        replacement = revised.get(str(scene.index))
+        if not replacement:
+            parts.append(original)
+            continue
+        if scene.heading and not SCENE_HEADING_RE.match(replacement):
+            # Keep the slugline if the model dropped it.
+            replacement = original.split("\n", 1)[0] + "\n" + replacement
+        trailing = original[len(original.rstrip()):] or "\n\n"
+        parts.append(replacement.rstrip() + trailing)
+    return "".join(parts)
@@ -0,0 +1,142 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open per backend; should cover the threads that call it.
+# Each client is sized for its own concurrency; INFERENCE_POOL_SIZE overrides that.
+POOL_SIZE = int(os.getenv("INFERENCE_POOL_SIZE", "0"))
+
+class BackendUnavailable(requests.exceptions.RequestException):
+    """The backend is failing and calls are being short-circuited."""
+
+class CircuitBreaker:
+    """
+    Stops calling a backend after `failure_threshold` consecutive failures.
+    After `reset_timeout` seconds one trial call is let through (half-open);
+    its outcome closes the circuit again or restarts the timeout.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+class InferenceClient:
+    """
+    Shared HTTP client for one inference backend (Ollama, Hugging Face).
+
+    Keeps a pooled keep-alive session, applies the backend's default
+    timeout, retries connection errors and `retry_statuses` with
+    exponential backoff plus full jitter, and fails fast with
+    BackendUnavailable while the circuit breaker is open.
+    """
+
+    def __init__(self, name, timeout, max_retries=2, backoff_base=1.0, backoff_max=30.0,
+                 retry_statuses=(429, 502, 503, 504), pool_size=8,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = set(retry_statuses)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._sleep = time.sleep
+
+        self.session = requests.Session()
+        self.pool_size = POOL_SIZE or pool_size
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def backoff(self, attempt):
+        """Full-jitter delay before retry number `attempt` (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, url, **kwargs):
+        """
+        POSTs to the backend and returns the final Response.
+        Raises BackendUnavailable if the circuit is open or every attempt
+        failed to connect. Read timeouts are not retried since the backend
+        may still be working on the request.
+        """
+        if not self.breaker.allow():
+            raise BackendUnavailable(f"{self.name} is unavailable (circuit open)")
+
+        kwargs.setdefault("timeout", self.timeout)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                error = e
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                raise
+            else:
+                retryable = response.status_code in self.retry_statuses
+                if retryable and attempt < self.max_retries:
+                    delay = self._retry_after(response, attempt)
+                    logger.warning(f"{self.name} returned {response.status_code}, retrying in {delay:.1f}s")
+                    response.close()
+                    self._sleep(delay)
+                    continue
+                if retryable or response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return response
+
+            if attempt < self.max_retries:
+                delay = self.backoff(attempt)
+                logger.warning(f"{self.name} connection failed ({error}), retrying in {delay:.1f}s")
+                self._sleep(delay)
+
+        self.breaker.record_failure()
+        raise BackendUnavailable(f"{self.name} is unreachable: {error}") from error
+
+    def _retry_after(self, response, attempt):
+        try:
+            return min(self.backoff_max, float(response.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return self.backoff(attempt)
@@ -1,17 +1,26 @@
-import requests
 import os
 import uuid
-import time
 import json
 import numpy as np
 import scipy.io.wavfile
+import scipy.signal
+import scipy.special
 import random
+import threading
+from collections import OrderedDict
+
+from .inference_client import InferenceClient, BackendUnavailable
 
 # --- CONFIG ---
 API_URL = "https://router.huggingface.co/hf-inference/models/facebook/musicgen-small"
 SAMPLE_RATE = 44100
 HF_TOKEN = os.getenv("HF_TOKEN")
 
+# 503 means the model is still loading; back off and retry a couple of times
+# before giving up on the cloud and using the local synth.
+HF_CLIENT = InferenceClient("huggingface", timeout=(5, 120), max_retries=2,
+                            backoff_base=5.0, backoff_max=20.0)
+
 # --- LOCAL SYNTHESIZER (FALLBACK) ---
 NOTE_FREQS = {
     'C3': 130.81, 'D3': 146.83, 'E3': 164.81, 'F3': 174.61, 'G3': 196.00, 'A3': 220.00, 'B3': 246.94,
@@ -27,23 +36,172 @@ SCALES = {
     'scary': [0, 1, 3, 6, 8, 9]      
 }
 
-def karplus_strong(frequency, duration, decay_factor=0.996):
+# Samples per vectorized step when rendering a string (see _pluck).
+KS_BLOCK = 1024
+
+def _pluck(out, frequency, decay_factor):
+    """
+    Renders one Karplus-Strong string into `out` in place.
+
+    The original per-sample loop is y[i] = g * (y[i-N] + y[i-N-1]). Every
+    sample only looks at least N back, so we can fill a block of N samples
+    per NumPy op. Unrolling the recurrence k times gives
+    y[i] = g^k * sum_j C(k, j) * y[i-kN-j], which stretches the block to
+    k*N samples, so high notes with short delay lines don't need thousands
+    of tiny steps.
+    """
     N = int(SAMPLE_RATE / frequency)
-    buf = np.random.uniform(-1, 1, N)
+    n_samples = len(out)
+    # z[0] is the silent sample before the delay line, z[1:] is the output.
+    z = np.zeros(n_samples + 1)
+    z[1:N + 1] = np.random.uniform(-1, 1, N)[:n_samples]
+    gain = 0.5 * decay_factor
+
+    k = max(1, KS_BLOCK // N)
+    pos = N + 1
+    # The unrolled form is only valid once k periods have been played.
+    warmup = min(n_samples + 1, k * N + k + 1)
+    while pos < warmup:
+        end = min(pos + N, warmup)
+        z[pos:end] = gain * (z[pos - N:end - N] + z[pos - N - 1:end - N - 1])
+        pos = end
+
+    span = k * N
+    kernel = gain ** k * scipy.special.comb(k, np.arange(k + 1))
+    while pos < n_samples + 1:
+        end = min(pos + span, n_samples + 1)
+        z[pos:end] = np.convolve(z[pos - span - k:end - span], kernel, mode='valid')
+        pos = end
+
+    out[:] = z[1:]
+    return out
+
+def karplus_strong_batch(frequencies, duration, decay_factor=0.996):
+    """
+    Renders several plucked strings (e.g. a chord) into one buffer.
+    Returns an array of shape (len(frequencies), n_samples).
+    """
     n_samples = int(SAMPLE_RATE * duration)
-    samples = np.zeros(n_samples)
-    for i in range(N): samples[i] = buf[i]
-    for i in range(N, n_samples):
-        samples[i] = 0.5 * (samples[i-N] + samples[i-N-1]) * decay_factor
+    samples = np.zeros((len(frequencies), n_samples))
+    for row, frequency in enumerate(frequencies):
+        _pluck(samples[row], frequency, decay_factor)
     return samples
 
-def apply_reverb(audio, delay_ms=100, decay=0.5):
+def karplus_strong(frequency, duration, decay_factor=0.996):
+    return karplus_strong_batch([frequency], duration, decay_factor)[0]
+
+# Feedback comb settings: echo spacing and per-echo gain.
+ROOM_PRESETS = {
+    'room': {'delay_ms': 40, 'decay': 0.35},
+    'hall': {'delay_ms': 100, 'decay': 0.5},
+    'cathedral': {'delay_ms': 180, 'decay': 0.65},
+}
+
+# The tail is kept until the echoes have faded below this level (-60 dB).
+REVERB_TAIL_FLOOR = 1e-3
+
+def apply_reverb(audio, delay_ms=100, decay=0.5, preset=None, keep_tail=True):
+    """
+    Feedback comb reverb: y[i] = x[i] + decay * y[i - delay].
+
+    Instead of walking the buffer sample by sample, the signal is laid out
+    as rows of `delay` samples. Each row then only depends on the row above
+    it, which is a first-order IIR filter down the columns (one lfilter call).
+
+    With keep_tail the output runs on until the echoes drop below -60 dB;
+    otherwise it is cut to the input length.
+    """
+    if preset:
+        delay_ms = ROOM_PRESETS[preset]['delay_ms']
+        decay = ROOM_PRESETS[preset]['decay']
+
     delay_samples = int(SAMPLE_RATE * delay_ms / 1000)
-    output = np.zeros(len(audio) + delay_samples * 5)
-    output[:len(audio)] = audio
-    for i in range(delay_samples, len(output)):
-        output[i] += output[i - delay_samples] * decay
-    return output[:len(audio)] 
+    if delay_samples <= 0 or decay <= 0:
+        return np.array(audio, dtype=float)
+
+    tail = 0
+    if keep_tail and decay < 1:
+        tail = delay_samples * int(np.ceil(np.log(REVERB_TAIL_FLOOR) / np.log(decay)))
+    out_len = len(audio) + tail
+
+    n_rows = -(-out_len // delay_samples)
+    grid = np.zeros(n_rows * delay_samples)
+    grid[:len(audio)] = audio
+    grid = scipy.signal.lfilter([1.0], [1.0, -decay], grid.reshape(n_rows, delay_samples), axis=0)
+    return grid.reshape(-1)[:out_len]
+
+class ToneBank:
+    """
+    Cache of rendered Karplus-Strong tones keyed by (frequency, duration, decay).
+
+    A mood only ever uses ~14 pitches, so after warm-up composing a track is
+    mostly mixing cached arrays. Each key keeps a few variants rendered from
+    different noise bursts, and one is picked at random per note so repeated
+    notes don't sound identical. Tones are stored as read-only float32 arrays
+    and the least recently used keys are evicted once max_bytes is exceeded.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, variants=3):
+        self.max_bytes = max_bytes
+        self.variants = variants
+        self._tones = OrderedDict()  # {key: [np.ndarray, ...]}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, frequency, duration, decay_factor=0.996):
+        key = (round(frequency, 2), duration, decay_factor)
+        with self._lock:
+            tones = self._tones.get(key)
+            if tones is not None:
+                self._tones.move_to_end(key)
+                if len(tones) >= self.variants:
+                    self.hits += 1
+                    return random.choice(tones)
+            self.misses += 1
+
+        tone = karplus_strong(frequency, duration, decay_factor).astype(np.float32)
+        tone.setflags(write=False)
+
+        with self._lock:
+            tones = self._tones.setdefault(key, [])
+            self._tones.move_to_end(key)
+            if len(tones) < self.variants:
+                tones.append(tone)
+                self._bytes += tone.nbytes
+                self._evict(keep=key)
+        return tone
+
+    def _evict(self, keep):
+        while self._bytes > self.max_bytes and len(self._tones) > 1:
+            key, tones = next(iter(self._tones.items()))
+            if key == keep:
+                break
+            del self._tones[key]
+            self._bytes -= sum(t.nbytes for t in tones)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "keys": len(self._tones),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._tones.clear()
+            self._bytes = 0
+
+TONE_BANK = ToneBank(max_bytes=int(os.getenv("TONE_BANK_MB", "32")) * 1024 * 1024)
 
 def get_frequencies(scale_name, root_freq=261.63):
     intervals = SCALES.get(scale_name, SCALES['happy'])
@@ -54,8 +212,12 @@ def get_frequencies(scale_name, root_freq=261.63):
         freqs.append(root_freq * 2 * (2 ** (i / 12.0)))
     return freqs
 
-def generate_local_track(mood_text, duration=10):
-    """Generates music locally using Karplus-Strong synthesis."""
+def generate_local_track(mood_text, duration=10, room='hall'):
+    """
+    Generates music locally using Karplus-Strong synthesis.
+    The reverb tail of the chosen room preset is kept, so the track runs a
+    little past `duration`.
+    """
     mood_text = mood_text.lower()
     scale, tempo, root = 'happy', 0.5, 261.63
     
@@ -75,36 +237,34 @@ def generate_local_track(mood_text, duration=10):
         f = random.choice(freqs)
         note_len = 2.0
         if random.random() < 0.3: # Chord
-            for _ in range(3):
-                tone = karplus_strong(random.choice(freqs), note_len)
-                start = int(curr_time * SAMPLE_RATE)
-                end = start + len(tone)
-                if end > audio_len:
-                    tone = tone[:audio_len - start]
-                    end = audio_len
-                mixed_audio[start:end] += tone * 0.5
+            notes, gain = [random.choice(freqs) for _ in range(3)], 0.5
         else: # Note
-            tone = karplus_strong(f, note_len)
-            start = int(curr_time * SAMPLE_RATE)
-            end = start + len(tone)
-            if end > audio_len:
-                tone = tone[:audio_len - start]
-                end = audio_len
-            mixed_audio[start:end] += tone
+            notes, gain = [f], 1.0
+        start = int(curr_time * SAMPLE_RATE)
+        for note in notes:
+            tone = TONE_BANK.get(note, note_len)
+            end = min(start + len(tone), audio_len)
+            mixed_audio[start:end] += tone[:end - start] * gain
         curr_time += tempo * random.choice([0.5, 1])
         
-    mixed_audio = apply_reverb(mixed_audio)
+    mixed_audio = apply_reverb(mixed_audio, preset=room)
     max_val = np.max(np.abs(mixed_audio))
     if max_val > 0: mixed_audio = mixed_audio / max_val * 32767
     return mixed_audio.astype(np.int16)
 
 # --- HYBRID GENERATOR ---
-def generate_music(prompt, duration=10, output_dir="server/temp_music"):
+def music_mode():
+    """'cloud' when MusicGen can be tried, else 'local'; part of a render's cache key."""
+    return "cloud" if (os.getenv("HF_TOKEN") or HF_TOKEN) else "local"
+
+def generate_music(prompt, duration=10, output_dir="server/temp_music", filename=None):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    filename = f"music_{uuid.uuid4().hex}.wav"
+    filename = filename or f"music_{uuid.uuid4().hex}.wav"
     filepath = os.path.join(output_dir, filename)
+    # Written aside and renamed, so a file at filepath is always complete.
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
     
     # 1. Try Cloud API if Token Exists (or blindly try if we want to risk 401)
     # The user got 401, so blind try without token fails.
@@ -116,22 +276,18 @@ def generate_music(prompt, duration=10, output_dir="server/temp_music"):
         headers = {"Authorization": f"Bearer {hf_token}"}
         payload = {"inputs": prompt}
         
-        for _ in range(3): # Retries
-            try:
-                response = requests.post(API_URL, headers=headers, json=payload)
-                if response.status_code == 200:
-                    with open(filepath, "wb") as f:
-                        f.write(response.content)
-                    return filepath
-                elif response.status_code == 503:
-                    time.sleep(10)
-                    continue
-                else:
-                    print(f"Cloud API Failed ({response.status_code}): {response.text}")
-                    break
-            except Exception as e:
-                print(f"Cloud Request Error: {e}")
-                break
+        try:
+            response = HF_CLIENT.post(API_URL, headers=headers, json=payload)
+            if response.status_code == 200:
+                with open(tmp_path, "wb") as f:
+                    f.write(response.content)
+                os.replace(tmp_path, filepath)
+                return filepath
+            print(f"Cloud API Failed ({response.status_code}): {response.text}")
+        except BackendUnavailable as e:
+            print(f"Cloud API Unavailable: {e}")
+        except Exception as e:
+            print(f"Cloud Request Error: {e}")
     else:
         print("⚠️ No HF_TOKEN found. Skipping Cloud Generation.")
 
@@ -139,7 +295,8 @@ def generate_music(prompt, duration=10, output_dir="server/temp_music"):
     print(f"🎹 Falling back to Local Acoustic Synth...")
     try:
         audio_data = generate_local_track(prompt, duration)
-        scipy.io.wavfile.write(filepath, SAMPLE_RATE, audio_data)
+        scipy.io.wavfile.write(tmp_path, SAMPLE_RATE, audio_data)
+        os.replace(tmp_path, filepath)
         return filepath
     except Exception as e:
         print(f"Local Synth Error: {e}")
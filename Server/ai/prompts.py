@@ -97,3 +97,38 @@ Original Screenplay:
 Q&A Feedback:
 {qa_feedback}
 """
+
+SCENE_IMPROVEMENT_PROMPT = """
+You are a professional script doctor. You will revise ONE scene of a screenplay based on the user's answers to follow-up questions.
+INSTRUCTIONS:
+1. Read the Scene to Revise and the Q&A Feedback.
+2. Rewrite the scene to incorporate the feedback that applies to it.
+3. Keep the same scene heading, characters and continuity with the neighbouring scenes.
+4. PRESERVE standard screenplay format (INT./EXT. headers, Centered Characters).
+5. Output ONLY the revised scene. Do NOT output the neighbouring scenes.
+6. NO explanations, NO markdown wrapping.
+
+Previous Scene (context only, do not rewrite):
+{previous_scene}
+
+Scene to Revise:
+{scene}
+
+Next Scene (context only, do not rewrite):
+{next_scene}
+
+Q&A Feedback:
+{qa_feedback}
+"""
+
+CHUNK_SUMMARY_PROMPT = """
+You are a professional script reader. Summarize ONE part of a longer screenplay STRICTLY in {language}.
+RULES:
+1. 80-150 words, plain prose, in story order.
+2. Name the characters involved, the key events, and any turn or reveal.
+3. Keep how the part ends; the next part continues from there.
+4. NO markdown, NO introductory text.
+
+Part {part} of {parts}:
+{chunk}
+"""
@@ -0,0 +1,54 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+def run_task_graph(tasks, max_workers=1):
+    """
+    Runs a small dependency graph of tasks on a thread pool.
+
+    tasks: {name: (fn, [dependency names])}. Each fn is called with a dict
+    of its dependencies' results and may run as soon as those are done;
+    independent tasks run concurrently, up to max_workers at a time.
+    Tasks are started in insertion order when several are ready.
+
+    A task that raises is logged and yields None, so dependents still run
+    and can decide what to do with a missing input.
+    Returns (results, timings) where timings are wall-clock seconds per task.
+    """
+    for name, (_, deps) in tasks.items():
+        missing = [d for d in deps if d not in tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown tasks: {missing}")
+
+    results, timings = {}, {}
+    remaining = dict(tasks)
+    running = {}
+
+    def _timed(name, fn, inputs):
+        start = time.perf_counter()
+        try:
+            return fn(inputs)
+        except Exception as e:
+            logger.error(f"Task '{name}' failed: {e}")
+            return None
+        finally:
+            timings[name] = round(time.perf_counter() - start, 3)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while remaining or running:
+            for name, (fn, deps) in list(remaining.items()):
+                if all(d in results for d in deps):
+                    inputs = {d: results[d] for d in deps}
+                    running[pool.submit(_timed, name, fn, inputs)] = name
+                    del remaining[name]
+
+            if not running:
+                raise ValueError(f"Dependency cycle between tasks: {list(remaining)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    return results, timings
@@ -4,20 +4,32 @@ from dotenv import load_dotenv
 load_dotenv() # Load environment variables from .env
 import secrets
 import uuid
-from datetime import datetime
-from flask import Flask, request, jsonify, session, send_file, send_from_directory, render_template
-from flask_session import Session
+from flask import Flask, request, jsonify, session, send_file, send_from_directory, render_template, Response
 from datetime import timedelta
 import logging
+import json
 
 # Import our modules
-from ai.granite_client import generate_story_content
+from ai.granite_client import generate_story_content, OLLAMA_NUM_PARALLEL
 from utils.validators import validate_story_input
 from utils.response_cleaner import clean_ai_response
-from exports.pdf_export import generate_pdf
-from exports.docx_export import generate_docx
-from utils.tts_handler import text_to_speech
-from ai.music_generator import generate_music
+from utils.screenplay_parser import parse_screenplay, get_screenplay, narration_text
+from exports.pdf_export import generate_pdf, LAYOUT_VERSION as PDF_LAYOUT_VERSION
+from exports.docx_export import generate_docx, LAYOUT_VERSION as DOCX_LAYOUT_VERSION
+from exports.txt_export import generate_txt, LAYOUT_VERSION as TXT_LAYOUT_VERSION
+from exports.bundle import render_file, stream_zip
+from utils.tts_handler import start_narration, DEFAULT_VOICE
+from utils.audio_drama import start_drama
+from utils.artifact_store import ArtifactStore
+from utils.media_server import send_media
+from ai.music_generator import generate_music, music_mode
+from utils.render_service import RenderService, QueueFull
+from utils.token_stream import TokenStream
+from utils.job_events import JobEvents
+from utils.metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.job_store import create_store
+from utils.content_store import ContentStore
+from utils.job_queue import JobQueue
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,23 +40,11 @@ client_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '../clie
 template_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates'))
 app = Flask(__name__, static_folder=client_folder, static_url_path='', template_folder=template_folder)
 
-# In-Memory Storage for Shared Scripts
-SHARED_SCRIPTS = {}
-
 # Configuration
-app.config['SECRET_KEY'] = secrets.token_hex(32)
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_USE_SIGNER'] = True
+# The session is a signed cookie holding only a content ID; set SECRET_KEY
+# so every worker process (and a restart) can read the same cookies.
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') or secrets.token_hex(32)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
-# Ensure session directory exists
-session_dir = os.path.join(os.path.dirname(__file__), 'flask_session')
-if not os.path.exists(session_dir):
-    os.makedirs(session_dir)
-app.config['SESSION_FILE_DIR'] = session_dir
-
-# Initialize Session
-Session(app)
 
 @app.route('/')
 def index():
@@ -67,40 +67,152 @@ import time
 
 # ... imports ...
 
-# In-Memory Storage
-SHARED_SCRIPTS = {}
-JOBS = {}  # {job_id: {'status': 'pending'|'processing'|'completed'|'failed', 'results': ..., 'step': 'Starting...'}}
+# Job & Share Storage (memory or SQLite, see utils/job_store.py)
+SHARE_TTL = timedelta(minutes=30)
+JOBS = create_store('jobs', ttl=3600)  # {job_id: {'status': 'pending'|'processing'|'completed'|'failed', 'results': ..., 'step': 'Starting...'}}
+MUSIC_JOBS = create_store('music_jobs', ttl=3600)  # Same shape as JOBS, 'results' is the rendered file path
+SHARED_SCRIPTS = create_store('shares', ttl=SHARE_TTL.total_seconds())  # {share_id: {'content': ...}}
+for _store in (JOBS, MUSIC_JOBS, SHARED_SCRIPTS):
+    _store.start_sweeper(interval=60)
+
+# Generated scripts live here; sessions and shares hold content IDs.
+CONTENT_TTL = int(os.getenv('CONTENT_TTL', '86400'))
+CONTENT = ContentStore(os.getenv('CONTENT_STORE_PATH', os.path.join(app.root_path, 'cache', 'content.sqlite3')),
+                       ttl=CONTENT_TTL)
+CONTENT.start_sweeper(interval=600)
+# {content_id: {'files': [music artifact, ...]}}: scores composed for a script, in scene order.
+SCORES = create_store('scores', ttl=CONTENT_TTL)
+SCORES.start_sweeper(interval=600)
+
+def _session_content(fields=None):
+    """The current user's generated content (optionally only `fields`), or None."""
+    content_id = session.get('content_id')
+    return CONTENT.get(content_id, fields) if content_id else None
+
+# Live token streams stay in-process; clients on another worker fall back to polling.
+STREAMS = {}  # {job_id: TokenStream} of screenplay text while a job runs
+STREAM_GRACE = 300  # seconds a finished stream stays readable
+NARRATIONS = {}  # {narration_id: Narration} while audio renders, plus STREAM_GRACE
+# Wakes status long-polls when a job's status, step or queue position changes.
+JOB_EVENTS = JobEvents()
+STATUS_WAIT_MAX = 30  # longest ?wait= a status long-poll may hold
+# Whether the Flask server holds ?wait requests. Each held request pins a
+# thread (or a whole sync worker), so it is off unless the deployment has
+# threads to spare; async_server.py always holds them. When off, ?wait is
+# answered at once without X-Long-Poll and clients fall back to polling.
+STATUS_LONG_POLL = os.getenv('STATUS_LONG_POLL', 'off').lower() in ('1', 'on', 'true', 'yes')
+# Changes made by other worker processes (JOB_STORE=sqlite) are not
+# notified here, so held long-polls re-read the store this often.
+STATUS_RECHECK = 2
+
+# Rendered audio, named by a hash of the request so repeats are served from disk.
+NARRATION_ARTIFACTS = ArtifactStore(os.getenv('AUDIO_CACHE_DIR', os.path.join(app.root_path, 'temp_audio')),
+                                    int(os.getenv('AUDIO_CACHE_MB', '1024')) * 1024 * 1024, name='narration')
+MUSIC_ARTIFACTS = ArtifactStore(os.getenv('MUSIC_CACHE_DIR', os.path.join(app.root_path, 'temp_music')),
+                                int(os.getenv('MUSIC_CACHE_MB', '512')) * 1024 * 1024, name='music')
+MUSIC_DURATION = 10
+# Rendered exports, named by a hash of the content they were made from.
+EXPORT_ARTIFACTS = ArtifactStore(os.getenv('EXPORT_CACHE_DIR', os.path.join(app.root_path, 'cache', 'exports')),
+                                 int(os.getenv('EXPORT_CACHE_MB', '256')) * 1024 * 1024, name='exports')
+# Bundle exports render side by side in worker processes.
+EXPORT_RENDERER = RenderService(
+    max_workers=int(os.getenv('EXPORT_WORKERS', '0')) or None,
+    max_pending=int(os.getenv('EXPORT_QUEUE_SIZE', '0')) or None
+)
+
+# Music is rendered in worker processes; the request thread only queues it.
+MUSIC_RENDERER = RenderService(
+    max_workers=int(os.getenv('MUSIC_WORKERS', '0')) or None,
+    max_pending=int(os.getenv('MUSIC_QUEUE_SIZE', '0')) or None
+)
+
+# Generation runs on a fixed pool; beyond GENERATION_QUEUE_SIZE waiting jobs
+# new submissions get 429 instead of another thread hammering Ollama.
+GENERATION_QUEUE = JobQueue(
+    workers=int(os.getenv('GENERATION_WORKERS', '0')) or OLLAMA_NUM_PARALLEL,
+    max_queued=int(os.getenv('GENERATION_QUEUE_SIZE', '16')),
+    name='generation'
+)
+# Shorter scripts are served first (see JobQueue for how far they may jump ahead).
+SCENE_COUNT_PRIORITY = {'1': 0, '3-5': 1, '5-10': 2}
+
+# Where generation time goes, served at /metrics. Ollama's own rate is
+# draftroom_ollama_tokens_total / draftroom_ollama_eval_seconds_total.
+METRICS = Registry()
+GENERATION_JOBS = METRICS.counter('draftroom_generation_jobs_total', 'Generation jobs by outcome.', ['status'])
+QUEUE_WAIT = METRICS.histogram('draftroom_generation_queue_wait_seconds', 'Time jobs waited for a generation worker.')
+JOB_SECONDS = METRICS.histogram('draftroom_generation_job_seconds', 'Time from submission to a finished script.')
+STAGE_SECONDS = METRICS.histogram('draftroom_generation_stage_seconds', 'Wall time of each generation stage.',
+                                  ['stage'])
+STAGE_CACHE = METRICS.counter('draftroom_generation_cache_total', 'Generation cache lookups per stage.',
+                              ['stage', 'result'])
+CLEAN_SECONDS = METRICS.histogram('draftroom_generation_clean_seconds',
+                                  'Time spent cleaning and parsing a finished generation.')
+OLLAMA_TOKENS = METRICS.counter('draftroom_ollama_tokens_total', 'Tokens Ollama evaluated (prompt) or generated.',
+                                ['stage', 'kind'])
+OLLAMA_EVAL_SECONDS = METRICS.counter('draftroom_ollama_eval_seconds_total',
+                                      'Seconds Ollama spent on prompt evaluation and generation.', ['stage', 'kind'])
+OLLAMA_SLOT_WAIT = METRICS.counter('draftroom_ollama_slot_wait_seconds_total',
+                                   'Seconds prompts waited for a free Ollama slot.', ['stage'])
+METRICS.gauge('draftroom_generation_queued', 'Jobs waiting for a generation worker.', lambda: GENERATION_QUEUE.queued)
+METRICS.gauge('draftroom_generation_running', 'Jobs being generated.', lambda: GENERATION_QUEUE.running)
+
+STAGE_LABELS = {'screenplay': 'the screenplay', 'characters': 'character profiles',
+                'sound_design': 'the sound design', 'synopsis': 'the synopsis'}
 
 # ... config ...
 
 def process_generation_job(job_id, data):
     """Background task to run AI generation."""
     logger.info(f"Starting job {job_id}")
-    JOBS[job_id]['status'] = 'processing'
-    JOBS[job_id]['step'] = 'Initializing AI Models...'
+    job = JOBS.get(job_id)
+    started = JOBS.transition(job_id, ['pending'], 'processing', step='Initializing AI Models...')
+    # Every job behind this one moved up the queue.
+    JOB_EVENTS.notify()
+    if not started:
+        logger.warning(f"Job {job_id} expired before it started")
+        GENERATION_JOBS.inc(status='expired')
+        _forget_job(job_id)
+        return
     
     story = data.get('story')
     genre = data.get('genre', 'Drama')
     scene_count = data.get('scene_count', '3-5')
     language = data.get('language', 'English')
+    stream = STREAMS.get(job_id)
+
+    metrics = {'queue_wait': round(time.time() - job['created_at'], 3), 'stages': {}}
+    QUEUE_WAIT.observe(metrics['queue_wait'])
+    progress_lock = threading.Lock()
+    running = []
+
+    def on_progress(stage, event, stats):
+        with progress_lock:
+            if event == 'started':
+                running.append(stage)
+            else:
+                running.remove(stage)
+                metrics['stages'][stage] = dict(stats)
+                _record_stage(stage, stats)
+            if running:
+                step = (f"Writing {' and '.join(STAGE_LABELS.get(s, s) for s in running)}... "
+                        f"({len(metrics['stages'])} of {len(STAGE_LABELS)} done)")
+            else:
+                step = 'Formatting the script...'
+            _set_step(job_id, step, metrics=metrics)
     
     try:
-        # We can update 'step' inside generate_story_content if we passed a callback, 
-        # but for now we'll just let it run.
-        # Ideally, breaking generate_story_content into steps would allow finer progress updates.
-        
-        # Simulating steps for the user if we can't hook into the deep function easily yet,
-        # or we rely on the frontend cycling text. 
-        # But let's try to update step if possible or just stick to 'processing'.
-        
-        results = generate_story_content(story, genre, scene_count, language)
+        results = generate_story_content(story, genre, scene_count, language,
+                                         on_token=stream.append if stream else None,
+                                         use_cache=not data.get('no_cache', False),
+                                         on_progress=on_progress)
         
         if results['meta']['status'] not in ['success', 'partial_success']:
-             JOBS[job_id]['status'] = 'failed'
-             JOBS[job_id]['error'] = "AI Model returned failure status."
+             _finish_job(job_id, 'failed', error="AI Model returned failure status.", metrics=metrics)
              return
 
         # Clean Output
+        cleaning = time.perf_counter()
         cleaned_screenplay = clean_ai_response(results['screenplay'])
         cleaned_characters = clean_ai_response(results['characters'])
         cleaned_sound = clean_ai_response(results['sound_design'])
@@ -108,21 +220,59 @@ def process_generation_job(job_id, data):
 
         content_data = {
             "screenplay": cleaned_screenplay,
+            # Parsed once here; exporters and the narrator reuse the spans.
+            "screenplay_doc": parse_screenplay(cleaned_screenplay).to_spans(),
             "characters": cleaned_characters,
             "sound_design": cleaned_sound,
             "synopsis": cleaned_synopsis,
             "meta": results['meta']
         }
+        metrics['clean_seconds'] = round(time.perf_counter() - cleaning, 3)
+        CLEAN_SECONDS.observe(metrics['clean_seconds'])
         
         # Store Result
-        JOBS[job_id]['results'] = content_data
-        JOBS[job_id]['status'] = 'completed'
+        _finish_job(job_id, 'completed', results=content_data, content_id=CONTENT.put(content_data),
+                    metrics=metrics)
+        JOB_SECONDS.observe(time.time() - job['created_at'])
         logger.info(f"Job {job_id} completed successfully.")
         
     except Exception as e:
         logger.error(f"Job {job_id} failed: {e}")
-        JOBS[job_id]['status'] = 'failed'
-        JOBS[job_id]['error'] = str(e)
+        _finish_job(job_id, 'failed', error=str(e), metrics=metrics)
+
+def _record_stage(stage, stats):
+    """Adds one finished stage's figures to the /metrics totals."""
+    STAGE_SECONDS.observe(stats.get('wall_seconds', 0), stage=stage)
+    if stats.get('cache'):
+        STAGE_CACHE.inc(stage=stage, result=stats['cache'])
+    OLLAMA_TOKENS.inc(stats.get('prompt_tokens', 0), stage=stage, kind='prompt')
+    OLLAMA_TOKENS.inc(stats.get('tokens', 0), stage=stage, kind='generated')
+    OLLAMA_EVAL_SECONDS.inc(stats.get('prompt_seconds', 0), stage=stage, kind='prompt')
+    OLLAMA_EVAL_SECONDS.inc(stats.get('eval_seconds', 0), stage=stage, kind='generated')
+    OLLAMA_SLOT_WAIT.inc(stats.get('slot_wait', 0), stage=stage)
+
+def _set_step(job_id, step, **fields):
+    """Updates the progress line (and any other `fields`) shown while a job runs."""
+    JOBS.update(job_id, step=step, **fields)
+    JOB_EVENTS.notify(job_id)
+
+def _finish_job(job_id, status, **fields):
+    """Records the final job state and closes its token stream."""
+    JOBS.transition(job_id, ['processing'], status, **fields)
+    JOB_EVENTS.notify(job_id)
+    GENERATION_JOBS.inc(status=status)
+    stream = STREAMS.get(job_id)
+    if stream:
+        stream.close(error=fields.get('error'))
+    # Let late SSE readers drain the stream, then drop it even if nobody polls.
+    timer = threading.Timer(STREAM_GRACE, _forget_job, args=(job_id,))
+    timer.daemon = True
+    timer.start()
+
+def _forget_job(job_id):
+    """Drops the in-process state kept beside a job record."""
+    STREAMS.pop(job_id, None)
+    JOB_EVENTS.discard(job_id)
 
 @app.route('/generate-content', methods=['POST'])
 def generate_content():
@@ -133,30 +283,98 @@ def generate_content():
         return jsonify({"error": error}), 400
 
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {
+    JOBS.create(job_id, {
         'status': 'pending',
-        'created_at': datetime.now(),
+        'created_at': time.time(),
         'step': 'Queued'
-    }
+    })
+    STREAMS[job_id] = TokenStream()
     
-    # Spawn Thread
-    thread = threading.Thread(target=process_generation_job, args=(job_id, data))
-    thread.daemon = True # Daemon threads exit when app exits
-    thread.start()
+    # Hand off to the worker pool
+    priority = SCENE_COUNT_PRIORITY.get(data.get('scene_count'), 1)
+    try:
+        GENERATION_QUEUE.submit(job_id, process_generation_job, job_id, data, priority=priority)
+    except QueueFull:
+        JOBS.delete(job_id)
+        STREAMS.pop(job_id, None)
+        retry_after = GENERATION_QUEUE.retry_after()
+        response = jsonify({"error": "The writers' room is full. Please try again shortly.",
+                            "retry_after": retry_after})
+        return response, 429, {'Retry-After': str(retry_after)}
+    # A short script may have jumped ahead of queued ones.
+    JOB_EVENTS.notify()
 
     return jsonify({"job_id": job_id, "status": "pending"})
 
 @app.route('/generation-status/<job_id>', methods=['GET'])
 def get_generation_status(job_id):
-    """Check status of a job."""
+    """
+    Check status of a job. With ?wait=N and STATUS_LONG_POLL on, the
+    request is held (up to STATUS_WAIT_MAX seconds) until the job's
+    status, step or queue position changes, so clients see progress as
+    it happens.
+    """
+    wait = _wait_seconds(request.args.get('wait')) if STATUS_LONG_POLL else 0
+    if wait:
+        _wait_for_job(job_id, wait)
+    response, code, content_id = _generation_status(job_id)
+    response = jsonify(response)
+    if wait:
+        response.headers['X-Long-Poll'] = str(int(wait))
+    if content_id:
+        # The session only keeps the content ID (narrate/download read it from CONTENT)
+        session['content_id'] = content_id
+    return response, code
+
+def _wait_seconds(value):
+    """Parses a ?wait= value, capped at STATUS_WAIT_MAX; 0 if absent or invalid."""
+    try:
+        return max(0.0, min(float(value or 0), STATUS_WAIT_MAX))
+    except ValueError:
+        return 0.0
+
+def _job_state(job_id):
+    """What a status poll reports, for change detection (None once the job is gone)."""
+    job = JOBS.get(job_id)
+    return job and (job['status'], job.get('step'), GENERATION_QUEUE.position(job_id))
+
+def _wait_for_job(job_id, timeout):
+    """Blocks until the job moves on or `timeout` passes; returns at once for finished jobs."""
+    deadline = time.monotonic() + timeout
+    version = JOB_EVENTS.version(job_id)
+    initial = _job_state(job_id)
+    if not initial or initial[0] not in ('pending', 'processing'):
+        return
+    while (remaining := deadline - time.monotonic()) > 0:
+        version = JOB_EVENTS.wait(job_id, version, min(remaining, STATUS_RECHECK))
+        if _job_state(job_id) != initial:
+            return
+
+def _generation_status(job_id):
+    """
+    Status payload of a generation job, shared by the Flask and async
+    servers. Returns (payload, HTTP status, content ID to put in the
+    session once the job has completed).
+    """
     job = JOBS.get(job_id)
     if not job:
-        return jsonify({"error": "Job not found"}), 404
+        return {"error": "Job not found"}, 404, None
     
     response = {
         "status": job['status'],
         "step": job.get('step', 'Processing...')
     }
+    if job.get('metrics'):
+        # Queue wait, per-stage Ollama figures and cleaning time so far.
+        response['metrics'] = job['metrics']
+
+    if job['status'] == 'pending':
+        position = GENERATION_QUEUE.position(job_id)
+        if position:
+            wait = int(GENERATION_QUEUE.estimated_wait(position))
+            response['step'] = f"Queued: position {position}, about {max(1, round(wait / 60))} min"
+            response['queue_position'] = position
+            response['estimated_wait'] = wait
     
     if job['status'] == 'completed':
         # Result is ready, client should fetch it or we send it here?
@@ -164,144 +382,464 @@ def get_generation_status(job_id):
         # but standard pattern often is status -> then fetch result.
         # Let's send result here to keep it simple for the frontend transition.
         
-        # Also save to session to maintain compatibility with other endpoints (narrate/download)
-        session['generated_content'] = job['results']
-        
         # Also Shared memory logic
         share_id = str(uuid.uuid4())
-        SHARED_SCRIPTS[share_id] = {
-            "content": job['results'],
-            "created_at": datetime.now()
-        }
+        SHARED_SCRIPTS.create(share_id, {
+            "status": "shared",
+            "content_id": job['content_id'],
+            "created_at": time.time()
+        })
         
         response['data'] = job['results']
         response['share_id'] = share_id
         
         # Auto-cleanup job to save memory? 
         # Maybe keep it for a bit in case of retries, but session is set now.
-        del JOBS[job_id] 
+        JOBS.delete(job_id)
+        _forget_job(job_id)
+        
+        return response, 200, job['content_id']
         
     elif job['status'] == 'failed':
         response['error'] = job.get('error', 'Unknown error')
-        del JOBS[job_id]
+        JOBS.delete(job_id)
+        _forget_job(job_id)
         
-    return jsonify(response)
+    return response, 200, None
+
+def _sse(data, event=None):
+    """Formats one Server-Sent Event."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@app.route('/generation-stream/<job_id>', methods=['GET'])
+def stream_generation(job_id):
+    """Streams the screenplay of a running job as Server-Sent Events."""
+    stream = STREAMS.get(job_id)
+    if not stream:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        cursor = 0
+        while True:
+            chunks, closed = stream.wait(cursor, timeout=15)
+            for chunk in chunks:
+                yield _sse({"token": chunk})
+            cursor += len(chunks)
+            if closed:
+                if stream.error:
+                    yield _sse({"error": stream.error}, event="failed")
+                yield _sse({}, event="end")
+                return
+            if not chunks:
+                yield ": keep-alive\n\n"
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/share/<share_id>')
 def view_shared_script(share_id):
     """Read-only view for shared scripts."""
+    # Expired shares are never returned by the store
     entry = SHARED_SCRIPTS.get(share_id)
-    if not entry:
+    content = CONTENT.get(entry['content_id']) if entry else None
+    if not content:
         return "<h1>Link Expired or Invalid</h1><p>Shared scripts are only available for 30 minutes.</p>", 404
-    
-    # Check expiry again just in case
-    if (datetime.now() - entry['created_at']) > timedelta(minutes=30):
-        del SHARED_SCRIPTS[share_id]
-        return "<h1>Link Expired</h1>", 404
 
-    return render_template('share_view.html', script_content=entry['content'])
+    return render_template('share_view.html', script_content=content, share_id=share_id,
+                           screenplay=list(get_screenplay(content)))
 
 @app.route('/narrate', methods=['POST'])
 def narrate_content():
-    """Generates audio from screenplay/synopsis."""
-    if 'generated_content' not in session:
+    """
+    Generates audio from screenplay/synopsis.
+    Screenplays are read as an audio drama (narrator plus one voice per
+    character) unless {"voices": "single"} is sent.
+    """
+    content = _session_content(NARRATION_FIELDS)
+    if content is None:
         return jsonify({"error": "No content to narrate"}), 404
+    response, code = _narrate(content, request.json)
+    return jsonify(response), code
 
-    data = request.json
+NARRATION_FIELDS = ('screenplay', 'screenplay_doc', 'characters', 'synopsis')
+
+def _narrate(content, data):
+    """Starts (or finds) the narration a /narrate request asks for. Returns (payload, HTTP status)."""
     narrate_type = data.get('type', 'screenplay') # 'screenplay' or 'synopsis'
+    single_voice = data.get('voices', 'cast') == 'single'
     
-    content = session['generated_content']
-    text_to_read = ""
-    
-    if narrate_type == 'synopsis':
-        text_to_read = content.get('synopsis', '')
-    else:
-        text_to_read = content.get('screenplay', '')
-
+    drama = narrate_type != 'synopsis' and not single_voice
+    text_to_read, key = _narration_request(content, narrate_type, single_voice)
     if not text_to_read:
-        return jsonify({"error": "No text found for selected type"}), 404
+        return {"error": "No text found for selected type"}, 404
+
+    # Same text and voices as before: hand back the finished file.
+    cached = NARRATION_ARTIFACTS.get(key, '.mp3')
+    if cached:
+        url = f"/audio/{os.path.basename(cached)}"
+        return {"audio_url": url, "download_url": url, "cached": True,
+                "cues_url": f"/narration-cues/{key}" if drama else None}, 200
 
-    # Remove strict formatting for better speech?
-    # For now, read as is.
-    
-    output_dir = os.path.join(app.root_path, 'temp_audio')
     try:
-        audio_path = text_to_speech(text_to_read, output_dir)
-        if not audio_path:
-             return jsonify({"error": "TTS failed"}), 500
-        
-        filename = os.path.basename(audio_path)
-        return jsonify({"audio_url": f"/audio/{filename}"})
+        # An identical narration still rendering is shared, not started twice.
+        narration = NARRATIONS.get(key)
+        if narration is None or (narration.done and narration.error):
+            output_path = NARRATION_ARTIFACTS.path(key, '.mp3')
+            if drama:
+                narration = start_drama(get_screenplay(content), content.get('characters', ''),
+                                        on_done=_narration_done, output_path=output_path, narration_id=key)
+            else:
+                # Chunks render in the background; the client starts playing the
+                # stream as soon as the first one is ready.
+                narration = start_narration(text_to_read, on_done=_narration_done,
+                                            output_path=output_path, narration_id=key)
+            if narration is None:
+                return {"error": "No text found for selected type"}, 404
+            NARRATIONS[key] = narration
+
+        return {
+            "audio_url": f"/narration-stream/{narration.id}",
+            "download_url": f"/audio/{os.path.basename(narration.path)}",
+            "chunks": len(narration.chunks),
+            "voices": getattr(narration, 'voices', None),
+            "cues_url": f"/narration-cues/{key}" if drama else None,
+            "cached": False
+        }, 200
     except Exception as e:
         logger.error(f"Narration error: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+def _narration_request(content, narrate_type, single_voice):
+    """The text a narration reads and its artifact key."""
+    if narrate_type == 'synopsis':
+        text = content.get('synopsis', '')
+    elif single_voice:
+        text = narration_text(get_screenplay(content))
+    else:
+        text = content.get('screenplay', '')
+        return text, NARRATION_ARTIFACTS.make_key(kind='drama', text=text, characters=content.get('characters', ''))
+    return text, NARRATION_ARTIFACTS.make_key(kind='narration', text=text, voice=DEFAULT_VOICE)
+
+def _narration_done(narration):
+    if not narration.error:
+        NARRATION_ARTIFACTS.add(narration.path)
+        if getattr(narration, 'cues', None) is not None:
+            cues_path = NARRATION_ARTIFACTS.path(narration.id, '.cues.json')
+            with open(cues_path, 'w', encoding='utf-8') as f:
+                json.dump(narration.cues, f)
+            NARRATION_ARTIFACTS.add(cues_path)
+    timer = threading.Timer(STREAM_GRACE, _forget_narration, args=(narration,))
+    timer.daemon = True
+    timer.start()
+
+def _forget_narration(narration):
+    # A retry may have replaced the entry under the same key.
+    if NARRATIONS.get(narration.id) is narration:
+        NARRATIONS.pop(narration.id, None)
+
+@app.route('/narration-stream/<narration_id>', methods=['GET'])
+def stream_narration(narration_id):
+    """Progressive MP3 of a narration: audio is sent chunk by chunk, in order, as it renders."""
+    narration = NARRATIONS.get(narration_id)
+    if not narration:
+        return jsonify({"error": "Narration not found"}), 404
+    if narration.done:
+        if narration.error:
+            return jsonify({"error": "TTS failed"}), 500
+        # Finished: serve the file so the player can seek.
+        return send_media(os.path.dirname(narration.path), os.path.basename(narration.path), "audio/mpeg")
+    return Response(narration.iter_audio(), mimetype="audio/mpeg",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/narration-cues/<narration_id>', methods=['GET'])
+def get_narration_cues(narration_id):
+    """Timeline of an audio drama: who speaks when, in seconds from the start of the track."""
+    narration = NARRATIONS.get(narration_id)
+    if not narration:
+        cues_path = NARRATION_ARTIFACTS.get(narration_id, '.cues.json')
+        if not cues_path:
+            return jsonify({"error": "Narration not found"}), 404
+        with open(cues_path, encoding='utf-8') as f:
+            return jsonify({"done": True, "cues": json.load(f)})
+    return jsonify({"done": narration.done, "cues": getattr(narration, 'cues', None)})
 
 @app.route('/audio/<filename>')
 def serve_audio(filename):
     """
     Serves generated audio files.
     """
-    audio_dir = os.path.join(app.root_path, 'temp_audio')
-    return send_from_directory(audio_dir, filename)
+    return send_media(NARRATION_ARTIFACTS.directory, filename, "audio/mpeg")
+
+MUSIC_IN_FLIGHT = {}  # {artifact key: [job_id, ...]} waiting on one render
+# Request threads and render callbacks both change MUSIC_IN_FLIGHT. Not
+# held across RenderService.submit, which may run on_done in place.
+MUSIC_IN_FLIGHT_LOCK = threading.Lock()
+
+def _music_job_done(key, future):
+    """Records the outcome of a music render for every job waiting on it."""
+    try:
+        music_path = future.result()
+        error = None if music_path else "Music generation failed"
+    except Exception as e:
+        logger.error(f"Music render {key[:12]} failed: {e}")
+        music_path, error = None, str(e)
+
+    # Indexed before the key leaves MUSIC_IN_FLIGHT, so a request that
+    # finds no render in flight finds the file instead.
+    if music_path:
+        MUSIC_ARTIFACTS.add(music_path)
+    with MUSIC_IN_FLIGHT_LOCK:
+        job_ids = MUSIC_IN_FLIGHT.pop(key, [])
+    for job_id in job_ids:
+        if error:
+            MUSIC_JOBS.transition(job_id, ['pending'], 'failed', error=error)
+        else:
+            MUSIC_JOBS.transition(job_id, ['pending'], 'completed', results=music_path)
+        JOB_EVENTS.notify(job_id)
 
 @app.route('/generate-music', methods=['POST'])
 def generate_music_route():
-    """Generates music from description."""
+    """Queues music generation from a description."""
     data = request.json
-    description = data.get('description', '')
-    
+    response, code = _queue_music(data.get('description', ''), session.get('content_id'))
+    return jsonify(response), code
+
+def _queue_music(description, content_id=None):
+    """Queues (or reuses) a music render. Returns (payload, HTTP status)."""
     if not description:
-        return jsonify({"error": "No description provided"}), 400
+        return {"error": "No description provided"}, 400
+
+    key = MUSIC_ARTIFACTS.make_key(description=description, duration=MUSIC_DURATION, mode=music_mode())
+    if content_id:
+        _remember_score(key, content_id)
+    cached = MUSIC_ARTIFACTS.get(key, '.wav')
+    if cached:
+        return {"status": "completed", "audio_url": f"/music/{os.path.basename(cached)}", "cached": True}, 200
+
+    output_dir = MUSIC_ARTIFACTS.directory
+    job_id = str(uuid.uuid4())
+    MUSIC_JOBS.create(job_id, {
+        'status': 'pending',
+        'created_at': time.time(),
+        'step': 'Queued'
+    })
+
+    # The same description already rendering: wait on that render instead.
+    with MUSIC_IN_FLIGHT_LOCK:
+        waiting = MUSIC_IN_FLIGHT.get(key)
+        if waiting is not None:
+            waiting.append(job_id)
+            return {"job_id": job_id, "status": "pending"}, 200
+        # A render may have finished since the cache lookup above.
+        cached = MUSIC_ARTIFACTS.get(key, '.wav')
+        if not cached:
+            MUSIC_IN_FLIGHT[key] = [job_id]
+    if cached:
+        MUSIC_JOBS.delete(job_id)
+        return {"status": "completed", "audio_url": f"/music/{os.path.basename(cached)}", "cached": True}, 200
 
-    output_dir = os.path.join(app.root_path, 'temp_music')
     try:
-        music_path = generate_music(description, duration=10, output_dir=output_dir)
-        if not music_path:
-             return jsonify({"error": "Music generation failed"}), 500
-        
-        filename = os.path.basename(music_path)
-        return jsonify({"audio_url": f"/music/{filename}"})
+        MUSIC_RENDERER.submit(generate_music, description, MUSIC_DURATION, output_dir, f"{key}.wav",
+                              on_done=lambda f: _music_job_done(key, f))
+    except QueueFull:
+        _cancel_music_render(key, job_id, "Composer is busy, please try again shortly.")
+        return {"error": "Composer is busy, please try again shortly."}, 429
     except Exception as e:
         logger.error(f"Music Error: {e}")
-        return jsonify({"error": str(e)}), 500
+        _cancel_music_render(key, job_id, str(e))
+        return {"error": str(e)}, 500
+
+    return {"job_id": job_id, "status": "pending"}, 200
+
+def _cancel_music_render(key, job_id, error):
+    """A render that could not be submitted: drops this job and fails any that joined it meanwhile."""
+    with MUSIC_IN_FLIGHT_LOCK:
+        job_ids = MUSIC_IN_FLIGHT.pop(key, [])
+    MUSIC_JOBS.delete(job_id)
+    for other in job_ids:
+        if other != job_id:
+            MUSIC_JOBS.transition(other, ['pending'], 'failed', error=error)
+            JOB_EVENTS.notify(other)
+
+def _remember_score(key, content_id):
+    """Notes that this music belongs to the session's script, for the bundle."""
+    filename = f"{key}.wav"
+    record = SCORES.get(content_id)
+    if record is None:
+        SCORES.create(content_id, {'status': 'scored', 'files': [filename]})
+    elif filename not in record['files']:
+        SCORES.update(content_id, files=record['files'] + [filename])
+
+@app.route('/music-status/<job_id>', methods=['GET'])
+def get_music_status(job_id):
+    """Check status of a music render."""
+    response, code = _music_status(job_id)
+    return jsonify(response), code
+
+def _music_state(job_id):
+    """A music job's status, for change detection (None once the job is gone)."""
+    job = MUSIC_JOBS.get(job_id)
+    return job and job['status']
+
+def _music_status(job_id):
+    job = MUSIC_JOBS.get(job_id)
+    if not job:
+        return {"error": "Job not found"}, 404
+
+    response = {
+        "status": job['status'],
+        "step": job.get('step', 'Processing...')
+    }
+
+    if job['status'] == 'completed':
+        filename = os.path.basename(job['results'])
+        response['audio_url'] = f"/music/{filename}"
+        MUSIC_JOBS.delete(job_id)
+        JOB_EVENTS.discard(job_id)
+    elif job['status'] == 'failed':
+        response['error'] = job.get('error', 'Unknown error')
+        MUSIC_JOBS.delete(job_id)
+        JOB_EVENTS.discard(job_id)
+
+    return response, 200
 
 @app.route('/music/<filename>')
 def serve_music(filename):
     """
     Serves generated music files.
     """
-    music_dir = os.path.join(app.root_path, 'temp_music')
-    return send_from_directory(music_dir, filename)
+    return send_media(MUSIC_ARTIFACTS.directory, filename, "audio/wav")
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit rates and disk use of the generation and media caches."""
+    from ai.granite_client import GENERATION_CACHE
+    return jsonify({
+        "generations": GENERATION_CACHE.stats(),
+        "narration": NARRATION_ARTIFACTS.stats(),
+        "music": MUSIC_ARTIFACTS.stats(),
+        "exports": EXPORT_ARTIFACTS.stats(),
+        "content": CONTENT.stats(),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Generation timings and token counts in Prometheus text format."""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+EXPORT_FIELDS = ('screenplay', 'characters', 'sound_design')
+
+def _export_key(content, ext, layout_version):
+    return EXPORT_ARTIFACTS.make_key(format=ext, layout=layout_version,
+                                     **{field: content.get(field, '') for field in EXPORT_FIELDS})
+
+def _cached_export(content, ext, render, layout_version):
+    """
+    Path of the export of `content` rendered by render(content, path),
+    rendering it only if this content and layout were never exported.
+    """
+    key = _export_key(content, ext, layout_version)
+    path = EXPORT_ARTIFACTS.get(key, ext)
+    if path:
+        return path
+    path = render_file(render, content, EXPORT_ARTIFACTS.path(key, ext))
+    EXPORT_ARTIFACTS.add(path)
+    return path
+
+def _export_rendered(future):
+    if not future.exception():
+        EXPORT_ARTIFACTS.add(future.result())
+
+@app.route('/download/bundle', methods=['GET'])
+def download_bundle():
+    """
+    ZIP of the PDF, DOCX and TXT exports plus any narration and score already
+    rendered for this script. Missing exports render concurrently in worker
+    processes; the archive is then streamed without being built in memory.
+    """
+    content = _session_content()
+    if not content:
+        return jsonify({"error": "No content generated yet."}), 404
+
+    exports = (("draftroom_export.pdf", '.pdf', generate_pdf, PDF_LAYOUT_VERSION),
+               ("draftroom_export.docx", '.docx', generate_docx, DOCX_LAYOUT_VERSION),
+               ("draftroom_export.txt", '.txt', generate_txt, TXT_LAYOUT_VERSION))
+    entries, futures = [], []
+    try:
+        for name, ext, render, layout_version in exports:
+            key = _export_key(content, ext, layout_version)
+            path = EXPORT_ARTIFACTS.get(key, ext)
+            if not path:
+                path = EXPORT_ARTIFACTS.path(key, ext)
+                futures.append(EXPORT_RENDERER.submit(render_file, render, content, path, on_done=_export_rendered))
+            entries.append((name, path))
+        for future in futures:
+            future.result()
+    except QueueFull:
+        return jsonify({"error": "Exports are busy, please try again shortly."}), 429
+    except Exception as e:
+        logger.error(f"Bundle export failed: {e}")
+        return jsonify({"error": "Bundle generation failed"}), 500
+
+    # Audio is only included if it was already rendered; the bundle never waits on TTS.
+    for name, narrate_type, single_voice in (("audio/audio_drama.mp3", 'screenplay', False),
+                                             ("audio/narration.mp3", 'screenplay', True),
+                                             ("audio/synopsis.mp3", 'synopsis', False)):
+        text, key = _narration_request(content, narrate_type, single_voice)
+        path = NARRATION_ARTIFACTS.get(key, '.mp3') if text else None
+        if path:
+            entries.append((name, path))
+    scores = SCORES.get(session['content_id'])
+    for i, filename in enumerate(scores['files'] if scores else [], start=1):
+        path = MUSIC_ARTIFACTS.get(filename[:-len('.wav')], '.wav')
+        if path:
+            entries.append((f"score/scene_{i:02d}.wav", path))
+
+    return Response(stream_zip(entries), mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename="draftroom_bundle.zip"'})
 
 @app.route('/download/<format_type>', methods=['GET'])
 def download_content(format_type):
     """Endpoint to download generated content."""
-    content = session.get('generated_content')
+    content = _session_content()
     if not content:
         return jsonify({"error": "No content generated yet."}), 404
-    
+    return _send_export(content, format_type)
+
+@app.route('/share/<share_id>/download/<format_type>', methods=['GET'])
+def download_shared_script(share_id, format_type):
+    """Downloads a shared script; the export is shared with the author's."""
+    entry = SHARED_SCRIPTS.get(share_id)
+    content = CONTENT.get(entry['content_id']) if entry else None
+    if not content:
+        return jsonify({"error": "Link expired or invalid."}), 404
+    return _send_export(content, format_type)
+
+def _send_export(content, format_type):
     if format_type == 'txt':
-        full_text = f"SCREENPLAY\n\n{content['screenplay']}\n\nCHARACTERS\n\n{content['characters']}\n\nSOUND DESIGN\n\n{content['sound_design']}"
-        from io import BytesIO
-        buffer = BytesIO()
-        buffer.write(full_text.encode('utf-8'))
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name="draftroom_export.txt", mimetype="text/plain")
+        return send_file(generate_txt(content), as_attachment=True, download_name="draftroom_export.txt", mimetype="text/plain")
 
     elif format_type == 'pdf':
         try:
-            pdf_buffer = generate_pdf(content)
-            return send_file(pdf_buffer, as_attachment=True, download_name="draftroom_export.pdf", mimetype="application/pdf")
+            # Rendered once per content; later downloads stream the file from disk.
+            pdf_path = _cached_export(content, '.pdf', generate_pdf, PDF_LAYOUT_VERSION)
         except Exception as e:
+            logger.error(f"PDF export failed: {e}")
             return jsonify({"error": "PDF generation failed"}), 500
+        return send_media(EXPORT_ARTIFACTS.directory, os.path.basename(pdf_path), "application/pdf",
+                          download_name="draftroom_export.pdf", cache_control="no-cache")
 
     elif format_type == 'docx':
         try:
-            docx_buffer = generate_docx(content)
-            return send_file(docx_buffer, as_attachment=True, download_name="draftroom_export.docx", mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+            docx_path = _cached_export(content, '.docx', generate_docx, DOCX_LAYOUT_VERSION)
         except Exception as e:
+            logger.error(f"DOCX export failed: {e}")
             return jsonify({"error": "DOCX generation failed"}), 500
+        return send_media(EXPORT_ARTIFACTS.directory, os.path.basename(docx_path),
+                          "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                          download_name="draftroom_export.docx", cache_control="no-cache")
 
     else:
         return jsonify({"error": "Invalid format requested"}), 400
@@ -309,7 +847,7 @@ def download_content(format_type):
 @app.route('/followup-questions', methods=['GET'])
 def get_followup_questions():
     """Generates follow-up questions for the current script."""
-    content = session.get('generated_content')
+    content = _session_content(('screenplay',))
     if not content or not content.get('screenplay'):
         return jsonify({"error": "No screenplay found. Please generate one first."}), 400
 
@@ -333,7 +871,7 @@ def improve_script_route():
     if not answers:
         return jsonify({"error": "No answers provided"}), 400
         
-    content = session.get('generated_content')
+    content = _session_content(('screenplay',))
     if not content or not content.get('screenplay'):
          return jsonify({"error": "Original screenplay missing."}), 400
 
@@ -343,15 +881,17 @@ def improve_script_route():
         updated_screenplay = improve_screenplay(content['screenplay'], answers)
         
         if updated_screenplay:
-            # Update session
-            content['screenplay'] = clean_ai_response(updated_screenplay)
-            session['generated_content'] = content
-            
-            # Update shared version if exists (optional but good for consistency)
-            # This is tricky without share_id being passed, but for now we update session.
+            # Copy-on-write: the new version shares every other field with the
+            # old one, and share links keep showing the version they were made from.
+            screenplay = clean_ai_response(updated_screenplay)
+            content_id = CONTENT.update(session['content_id'], screenplay=screenplay,
+                                        screenplay_doc=parse_screenplay(screenplay).to_spans())
+            if not content_id:
+                return jsonify({"error": "Original screenplay missing."}), 400
+            session['content_id'] = content_id
             
             return jsonify({
-                "screenplay": content['screenplay'],
+                "screenplay": screenplay,
                 "message": "Screenplay improved successfully!"
             })
         else:
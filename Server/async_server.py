@@ -0,0 +1,261 @@
+"""
+Optional async server for the same app.
+
+The polling and streaming endpoints run on one aiohttp event loop:
+/generation-status and /music-status (with ?wait= long-polling),
+/generation-stream, /narrate, /generate-music and /narration-stream.
+A waiting client costs a suspended coroutine, not an OS thread, so one
+process can hold thousands of idle pollers and listeners. Every other
+route goes through a WSGI bridge to the Flask app on a bounded thread
+pool (WSGI_THREADS). The native routes use that pool too, for their
+job, content and music store calls.
+
+Sessions are Flask's signed cookie, read and written here with the same
+serializer, so a client can move between both servers.
+
+Run from the Server directory:
+    python async_server.py
+"""
+import os
+import sys
+import asyncio
+import logging
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+
+import app as server
+
+logger = logging.getLogger(__name__)
+
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', '32'))
+
+_session_interface = SecureCookieSessionInterface()
+EXECUTOR = web.AppKey('executor', ThreadPoolExecutor)
+
+def _load_session(request):
+    cookie = request.cookies.get(server.app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    serializer = _session_interface.get_signing_serializer(server.app)
+    try:
+        return serializer.loads(cookie, max_age=int(server.app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+def _save_session(response, session):
+    config = server.app.config
+    serializer = _session_interface.get_signing_serializer(server.app)
+    response.set_cookie(config['SESSION_COOKIE_NAME'], serializer.dumps(dict(session)),
+                        path=config['SESSION_COOKIE_PATH'] or '/', domain=config['SESSION_COOKIE_DOMAIN'] or None,
+                        httponly=config['SESSION_COOKIE_HTTPONLY'], secure=config['SESSION_COOKIE_SECURE'],
+                        samesite=config['SESSION_COOKIE_SAMESITE'])
+
+async def _blocking(request, fn, *args):
+    """
+    Runs fn(*args) on the bridge thread pool. Anything that touches the
+    job or content stores goes through here: with JOB_STORE=sqlite a
+    write can wait seconds for the database lock, and on the loop that
+    would stall every poller and stream.
+    """
+    return await asyncio.get_running_loop().run_in_executor(request.app[EXECUTOR], fn, *args)
+
+async def _wait_for_change(request, job_id, state, timeout, waiting):
+    """
+    Suspends until state(job_id) changes or `timeout` passes, if waiting()
+    holds for its current value. Woken through app.JOB_EVENTS; the store
+    is only re-read then, or every STATUS_RECHECK seconds for changes
+    made by other worker processes.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    version = server.JOB_EVENTS.version(job_id)
+    initial = await _blocking(request, state, job_id)
+    if not waiting(initial):
+        return
+    while (remaining := deadline - loop.time()) > 0:
+        version = await server.JOB_EVENTS.wait_async(job_id, version, min(remaining, server.STATUS_RECHECK))
+        if await _blocking(request, state, job_id) != initial:
+            return
+
+async def _read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+async def generation_status(request):
+    """Like the Flask route; ?wait=N holds the request until the job's status, step or position changes."""
+    job_id = request.match_info['job_id']
+    wait = server._wait_seconds(request.query.get('wait'))
+    if wait:
+        await _wait_for_change(request, job_id, server._job_state, wait,
+                               lambda state: state and state[0] in ('pending', 'processing'))
+
+    payload, code, content_id = await _blocking(request, server._generation_status, job_id)
+    response = web.json_response(payload, status=code)
+    if wait:
+        response.headers['X-Long-Poll'] = str(int(wait))
+    if content_id:
+        session = _load_session(request)
+        session['content_id'] = content_id
+        _save_session(response, session)
+    return response
+
+async def music_status(request):
+    job_id = request.match_info['job_id']
+    wait = server._wait_seconds(request.query.get('wait'))
+    if wait:
+        await _wait_for_change(request, job_id, server._music_state, wait, lambda state: state == 'pending')
+    payload, code = await _blocking(request, server._music_status, job_id)
+    return web.json_response(payload, status=code)
+
+async def generate_music(request):
+    data = await _read_json(request)
+    if data is None:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
+    payload, code = await _blocking(request, server._queue_music, data.get('description', ''),
+                                    _load_session(request).get('content_id'))
+    return web.json_response(payload, status=code)
+
+async def narrate(request):
+    data = await _read_json(request)
+    if data is None:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
+    content_id = _load_session(request).get('content_id')
+    content = None
+    if content_id:
+        content = await _blocking(request, server.CONTENT.get, content_id, server.NARRATION_FIELDS)
+    if content is None:
+        return web.json_response({"error": "No content to narrate"}, status=404)
+    # Planning a drama parses the script; keep that off the loop too.
+    payload, code = await _blocking(request, server._narrate, content, data)
+    return web.json_response(payload, status=code)
+
+async def generation_stream(request):
+    """Server-Sent Events of the screenplay as it is written."""
+    stream = server.STREAMS.get(request.match_info['job_id'])
+    if not stream:
+        return web.json_response({"error": "Job not found"}, status=404)
+
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                           'X-Accel-Buffering': 'no'})
+    await response.prepare(request)
+    cursor = 0
+    while True:
+        chunks, closed = await stream.wait_async(cursor, timeout=15)
+        for chunk in chunks:
+            await response.write(server._sse({"token": chunk}).encode())
+        cursor += len(chunks)
+        if closed:
+            if stream.error:
+                await response.write(server._sse({"error": stream.error}, event="failed").encode())
+            await response.write(server._sse({}, event="end").encode())
+            break
+        if not chunks:
+            await response.write(b": keep-alive\n\n")
+    return response
+
+async def narration_stream(request):
+    """Progressive MP3 while the narration renders; the finished file (with ranges) via Flask."""
+    narration = server.NARRATIONS.get(request.match_info['narration_id'])
+    if not narration:
+        return web.json_response({"error": "Narration not found"}, status=404)
+    if narration.done:
+        return await wsgi_bridge(request)
+
+    response = web.StreamResponse(headers={'Content-Type': 'audio/mpeg', 'Cache-Control': 'no-cache',
+                                           'X-Accel-Buffering': 'no'})
+    await response.prepare(request)
+    async for data in narration.aiter_audio():
+        await response.write(data)
+    return response
+
+def _environ(request, body):
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': request.path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': request.url.host or 'localhost',
+        'SERVER_PORT': str(request.url.port or (443 if request.secure else 80)),
+        'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+        'REMOTE_ADDR': request.remote or '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if request.content_type and 'Content-Type' in request.headers:
+        environ['CONTENT_TYPE'] = request.headers['Content-Type']
+    for name, value in request.headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            continue
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def wsgi_bridge(request):
+    """
+    Runs the Flask app for this request on the bridge thread pool and
+    streams its body back; each body chunk is pulled on the pool too.
+    """
+    body = await request.read()
+    environ = _environ(request, body)
+    loop = asyncio.get_running_loop()
+    executor = request.app[EXECUTOR]
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = status, headers
+        return lambda data: None  # legacy write() is not used by Flask
+
+    def call():
+        result = server.app(environ, start_response)
+        chunks = iter(result)
+        return result, chunks, next(chunks, None)
+
+    result, chunks, chunk = await loop.run_in_executor(executor, call)
+    code, _, reason = started['status'].partition(' ')
+    response = web.StreamResponse(status=int(code), reason=reason or None)
+    for name, value in started['headers']:
+        response.headers.add(name, value)
+    try:
+        await response.prepare(request)
+        while chunk is not None:
+            if chunk:
+                await response.write(chunk)
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+        await response.write_eof()
+    finally:
+        if hasattr(result, 'close'):
+            executor.submit(result.close)
+    return response
+
+async def _shutdown(application):
+    application[EXECUTOR].shutdown(wait=False)
+
+def create_app():
+    application = web.Application()
+    application[EXECUTOR] = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+    application.router.add_get('/generation-status/{job_id}', generation_status)
+    application.router.add_get('/generation-stream/{job_id}', generation_stream)
+    application.router.add_get('/music-status/{job_id}', music_status)
+    application.router.add_post('/generate-music', generate_music)
+    application.router.add_post('/narrate', narrate)
+    application.router.add_get('/narration-stream/{narration_id}', narration_stream)
+    application.router.add_route('*', '/{tail:.*}', wsgi_bridge)
+    application.on_cleanup.append(_shutdown)
+    return application
+
+if __name__ == '__main__':
+    web.run_app(create_app(), host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', '5000')),
+                backlog=int(os.getenv('LISTEN_BACKLOG', '2048')))
@@ -0,0 +1,95 @@
+"""
+Benchmarks seek-heavy playback of a 30-minute narration MP3.
+
+A player seeks SEEKS times to random positions and reads PLAY_SECONDS of
+audio after each seek. Compared:
+  full       every seek re-downloads the file (a client without Range)
+  werkzeug   Range via send_from_directory (mtime ETag, no caching policy)
+  media      Range via utils.media_server.send_media (mmap, content ETag)
+  revalidate the same session replayed from cache: If-None-Match -> 304
+
+Run from the Server directory:
+    python -m benchmarks.bench_audio_serving
+"""
+import sys
+import os
+import time
+import random
+import shutil
+import tempfile
+import statistics
+
+from flask import Flask, send_from_directory
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.media_server import send_media
+from utils.tts_handler import _SILENT_FRAME, _FRAME_SECONDS
+
+MINUTES = 30
+SEEKS = 40
+PLAY_SECONDS = 10
+
+def make_app(directory):
+    app = Flask(__name__)
+
+    @app.route('/werkzeug/<filename>')
+    def werkzeug(filename):
+        return send_from_directory(directory, filename)
+
+    @app.route('/media/<filename>')
+    def media(filename):
+        return send_media(directory, filename, "audio/mpeg")
+
+    return app
+
+def run(client, url, ranges, headers_for):
+    latencies, transferred, statuses = [], 0, set()
+    for start, stop in ranges:
+        started = time.perf_counter()
+        response = client.get(url, headers=headers_for(start, stop))
+        body = response.get_data()
+        latencies.append(time.perf_counter() - started)
+        transferred += len(body)
+        statuses.add(response.status_code)
+    return latencies, transferred, statuses
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        frames = int(MINUTES * 60 / _FRAME_SECONDS)
+        with open(os.path.join(directory, "narration.mp3"), "wb") as f:
+            f.write(_SILENT_FRAME * frames)
+        size = len(_SILENT_FRAME) * frames
+        bytes_per_second = len(_SILENT_FRAME) / _FRAME_SECONDS
+        window = int(PLAY_SECONDS * bytes_per_second)
+
+        random.seed(0)
+        ranges = []
+        for _ in range(SEEKS):
+            start = random.randrange(0, size - window)
+            ranges.append((start, start + window))
+
+        client = make_app(directory).test_client()
+        etag = client.get('/media/narration.mp3', headers={'Range': 'bytes=0-0'}).headers['ETag']
+
+        scenarios = [
+            ("full", '/werkzeug/narration.mp3', lambda a, b: {}),
+            ("werkzeug", '/werkzeug/narration.mp3', lambda a, b: {'Range': f'bytes={a}-{b - 1}'}),
+            ("media", '/media/narration.mp3', lambda a, b: {'Range': f'bytes={a}-{b - 1}'}),
+            ("revalidate", '/media/narration.mp3', lambda a, b: {'If-None-Match': etag}),
+        ]
+
+        print(f"{MINUTES}-minute narration ({size / 1e6:.1f} MB), {SEEKS} seeks x {PLAY_SECONDS}s of audio")
+        print(f"{'mode':>11} {'status':>8} {'MB sent':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, url, headers_for in scenarios:
+            latencies, transferred, statuses = run(client, url, ranges, headers_for)
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{name:>11} {','.join(map(str, sorted(statuses))):>8} {transferred / 1e6:>9.2f} "
+                  f"{statistics.median(latencies) * 1000:>8.2f} {p95 * 1000:>8.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
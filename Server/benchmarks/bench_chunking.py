@@ -0,0 +1,78 @@
+"""
+Benchmarks the synopsis / follow-up pipeline on long screenplays.
+
+Ollama is replaced by a fake whose latency grows with prompt size
+(FIXED_LATENCY + PER_TOKEN * tokens), so the numbers show how the
+map-reduce schedule scales rather than how fast a model is.
+
+Run from the Server directory:
+    python -m benchmarks.bench_chunking
+"""
+import sys
+import os
+import time
+import tracemalloc
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai import granite_client
+from ai.chunking import chunk_screenplay, estimate_tokens
+
+SIZES = [5_000, 20_000, 80_000]
+FIXED_LATENCY = 0.05
+PER_TOKEN = 0.00002
+PARALLEL = 4
+
+def make_script(chars):
+    scenes = []
+    i = 0
+    while sum(len(s) for s in scenes) < chars:
+        scenes.append(
+            f"INT. WAREHOUSE {i} - NIGHT\n\n"
+            f"Rain hammers the roof. MAYA slips between the crates, counting under her breath.\n\n"
+            f"MAYA\n(whispering)\nCrate {i}. Still nothing.\n\n"
+            f"A door slams somewhere. She freezes, then moves on.\n\n"
+        )
+        i += 1
+    return "".join(scenes)[:chars]
+
+class FakeOllama:
+    def __init__(self):
+        self.calls = 0
+        self.max_prompt_tokens = 0
+
+    def __call__(self, prompt, **kwargs):
+        tokens = estimate_tokens(prompt)
+        self.calls += 1
+        self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+        time.sleep(FIXED_LATENCY + PER_TOKEN * tokens)
+        return "Maya searches the warehouse crate by crate while someone closes in. " * 3
+
+def run(script):
+    fake = FakeOllama()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with patch.object(granite_client, 'query_ollama', fake), \
+         patch.object(granite_client, 'OLLAMA_NUM_PARALLEL', PARALLEL):
+        condensed = granite_client.condense_screenplay(script)
+        granite_client.generate_followup_questions(script)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, fake, estimate_tokens(condensed)
+
+def main():
+    print(f"Map-reduce over long screenplays (CHUNK_TOKENS={granite_client.CHUNK_TOKENS}, "
+          f"{PARALLEL} Ollama slots, fake latency {FIXED_LATENCY * 1000:.0f}ms + {PER_TOKEN * 1e6:.0f}us/token)")
+    print(f"{'chars':>8} {'tokens':>8} {'chunks':>7} {'calls':>6} {'max prompt':>11} "
+          f"{'digest':>7} {'wall s':>7} {'peak KB':>8}")
+    for size in SIZES:
+        script = make_script(size)
+        chunks = chunk_screenplay(script, granite_client.CHUNK_TOKENS)
+        elapsed, peak, fake, digest_tokens = run(script)
+        print(f"{size:>8} {estimate_tokens(script):>8} {len(chunks):>7} {fake.calls:>6} "
+              f"{fake.max_prompt_tokens:>11} {digest_tokens:>7} {elapsed:>7.2f} {peak / 1024:>8.0f}")
+
+if __name__ == '__main__':
+    main()
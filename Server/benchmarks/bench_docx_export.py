@@ -0,0 +1,74 @@
+"""
+Benchmarks DOCX export of a ~120-page screenplay: the original one
+python-docx call (plus direct formatting) per paragraph against the
+cloned template with bulk-inserted styled paragraphs.
+
+Run from the Server directory:
+    python -m benchmarks.bench_docx_export
+"""
+import sys
+import os
+import time
+from io import BytesIO
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Inches, Pt
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_pdf_export import CONTENT
+from exports.docx_export import generate_docx, SCREENPLAY_INDENTS
+from utils.screenplay_parser import get_screenplay
+
+def generate_docx_original(content_dict):
+    """The per-paragraph implementation, kept as the baseline."""
+    document = Document()
+    document.add_heading('DraftRoom Export', 0)
+    document.add_paragraph('Generated by DraftRoom')
+    document.add_page_break()
+    document.add_heading('Screenplay', level=1)
+    for kind, text in get_screenplay(content_dict):
+        p = document.add_paragraph()
+        run = p.add_run(text)
+        run.font.name = 'Courier New'
+        run.font.size = Pt(12)
+        run.bold = kind == 'heading'
+        left, right = SCREENPLAY_INDENTS[kind]
+        fmt = p.paragraph_format
+        fmt.left_indent = Inches(left)
+        fmt.right_indent = Inches(right)
+        fmt.space_before = Pt(0 if kind in ('dialogue', 'parenthetical') else 12)
+        fmt.space_after = Pt(0)
+        if kind == 'transition':
+            p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    document.add_page_break()
+    for title, field in (("Character Profiles", "characters"), ("Sound Design", "sound_design")):
+        document.add_heading(title, level=1)
+        for line in content_dict[field].splitlines():
+            document.add_paragraph(line)
+    buffer = BytesIO()
+    document.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def timeit(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    paragraphs = sum(1 for _ in get_screenplay(CONTENT))
+    print(f"{len(CONTENT['screenplay']) // 1000}k-character screenplay, {paragraphs} screenplay paragraphs (best of 3)")
+    print(f"{'export':>9} {'ms':>9} {'KB':>7}")
+    original, data = timeit(lambda: generate_docx_original(CONTENT), 3)
+    print(f"{'original':>9} {original * 1000:>9.1f} {len(data.getvalue()) / 1024:>7.0f}")
+    template, data = timeit(lambda: generate_docx(CONTENT), 3)
+    print(f"{'template':>9} {template * 1000:>9.1f} {len(data.getvalue()) / 1024:>7.0f}")
+    print(f"speedup {original / template:.1f}x")
+
+if __name__ == '__main__':
+    main()
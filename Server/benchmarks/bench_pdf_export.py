@@ -0,0 +1,138 @@
+"""
+Benchmarks /download/pdf on a ~120-page screenplay.
+
+  original  styles rebuilt per call, whole PDF in a BytesIO, send_file
+  cold      first download: module-level styles, rendered to the export cache
+  warm      repeat download (or a share of the same script): streamed from disk
+
+Each scenario runs in a fresh process; peak RSS is reported above the
+process's footprint once the app is imported.
+
+Run from the Server directory:
+    python -m benchmarks.bench_pdf_export
+"""
+import sys
+import os
+import re
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+SCENES = 300
+
+def make_script(scenes=SCENES):
+    parts = []
+    for i in range(scenes):
+        parts.append(f"INT. WAREHOUSE {i} - NIGHT\n\n"
+                     f"Rain hammers the roof. SARAH edges past crate {i}, flashlight trembling & low.\n\n"
+                     f"SARAH\n(whispering)\nMarcus, the shipment in bay {i} is gone. Someone knew we were coming.\n\n"
+                     f"MARCUS\nThen we follow the tracks. They can't have gone far with a truck that heavy.\n\n"
+                     f"They move deeper into the dark, past rows of empty shelving and a stalled forklift.\n\n"
+                     f"CUT TO:")
+    return "\n\n".join(parts)
+
+CONTENT = {
+    "screenplay": make_script(),
+    "characters": "SARAH: a customs agent.\n\nMARCUS: her partner.",
+    "sound_design": "Rain, distant thunder, a forklift alarm.",
+}
+
+def generate_pdf_original(content_dict):
+    """The per-call stylesheet build, kept as the baseline."""
+    from io import BytesIO
+    from xml.sax.saxutils import escape
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+    from exports.pdf_export import SCREENPLAY_STYLES
+    from utils.screenplay_parser import get_screenplay
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Screenplay', fontName='Courier', fontSize=12, leading=14, spaceAfter=12))
+    styles.add(ParagraphStyle(name='CenterTitle', parent=styles['Heading1'], alignment=TA_CENTER, spaceAfter=24))
+    for kind, options in SCREENPLAY_STYLES.items():
+        styles.add(ParagraphStyle(name=f'Screenplay-{kind}', parent=styles['Screenplay'], **{'spaceAfter': 0, **options}))
+    story = [Paragraph("DraftRoom Export", styles['CenterTitle']), Spacer(1, 12),
+             Paragraph("Generated by DraftRoom", styles['BodyText']), PageBreak(),
+             Paragraph("Screenplay", styles['Heading2']), Spacer(1, 12)]
+    for kind, text in get_screenplay(content_dict):
+        story.append(Paragraph(escape(text), styles[f'Screenplay-{kind}']))
+    story.append(PageBreak())
+    for title, field in (("Character Profiles", "characters"), ("Sound Design", "sound_design")):
+        story.append(Paragraph(title, styles['Heading2']))
+        for line in content_dict[field].splitlines():
+            story.append(Paragraph(line, styles['BodyText']) if line.strip() else Spacer(1, 12))
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+def rss_mb(field):
+    with open("/proc/self/status") as f:
+        match = re.search(rf"{field}:\s+(\d+) kB", f.read())
+    return int(match.group(1)) / 1024 if match else float('nan')
+
+def scenario(name, directory, queue):
+    from unittest.mock import patch
+    from flask import send_file
+    import app as app_module
+    from utils.artifact_store import ArtifactStore
+    from utils.content_store import ContentStore
+
+    base = rss_mb("VmRSS")
+    client = app_module.app.test_client()
+    store = ArtifactStore(os.path.join(directory, 'exports'), name='bench-exports')
+    content = ContentStore(os.path.join(directory, 'content.sqlite3'))
+    with patch.object(app_module, 'EXPORT_ARTIFACTS', store), patch.object(app_module, 'CONTENT', content):
+        with client.session_transaction() as sess:
+            sess['content_id'] = content.put(CONTENT)
+        if name == 'original':
+            @app_module.app.route('/bench-original-pdf')
+            def original():
+                return send_file(generate_pdf_original(CONTENT), as_attachment=True,
+                                 download_name="draftroom_export.pdf", mimetype="application/pdf")
+            url = '/bench-original-pdf'
+        else:
+            url = '/download/pdf'
+
+        started = time.perf_counter()
+        response = client.get(url, buffered=False)
+        body = iter(response.response)
+        first = next(body)
+        ttfb = time.perf_counter() - started
+        size = len(first) + sum(len(chunk) for chunk in body)
+        total = time.perf_counter() - started
+        response.close()
+    queue.put((ttfb, total, size, rss_mb("VmHWM") - base))
+
+def run(name, directory):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=scenario, args=(name, directory, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    from exports.pdf_export import generate_pdf
+    pages = len(re.findall(rb"/Type /Page\b", generate_pdf(CONTENT).getvalue()))
+    print(f"{len(CONTENT['screenplay']) // 1000}k-character screenplay, {pages} pages")
+    print(f"{'scenario':>9} {'TTFB ms':>9} {'total ms':>9} {'KB':>7} {'peak RSS +MB':>13}")
+
+    directory = tempfile.mkdtemp()
+    try:
+        # 'cold' fills the cache that 'warm' then reads.
+        for name in ('original', 'cold', 'warm'):
+            ttfb, total, size, rss = run(name, directory)
+            print(f"{name:>9} {ttfb * 1000:>9.1f} {total * 1000:>9.1f} {size / 1024:>7.0f} {rss:>13.1f}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
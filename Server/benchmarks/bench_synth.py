@@ -0,0 +1,87 @@
+"""
+Benchmarks the local acoustic synth against the original per-sample loops.
+
+Run from the Server directory:
+    python -m benchmarks.bench_synth
+"""
+import sys
+import os
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.music_generator import (SAMPLE_RATE, TONE_BANK, karplus_strong, karplus_strong_batch,
+                                apply_reverb, generate_local_track)
+
+NOTE_LEN = 2.0
+FREQUENCIES = [130.81, 261.63, 440.00, 987.77]
+
+def karplus_strong_loop(frequency, duration, decay_factor=0.996):
+    """The original per-sample implementation, kept as the baseline."""
+    N = int(SAMPLE_RATE / frequency)
+    buf = np.random.uniform(-1, 1, N)
+    n_samples = int(SAMPLE_RATE * duration)
+    samples = np.zeros(n_samples)
+    for i in range(N): samples[i] = buf[i]
+    for i in range(N, n_samples):
+        samples[i] = 0.5 * (samples[i-N] + samples[i-N-1]) * decay_factor
+    return samples
+
+def apply_reverb_loop(audio, delay_ms=100, decay=0.5):
+    """The original comb reverb loop, kept as the baseline."""
+    delay_samples = int(SAMPLE_RATE * delay_ms / 1000)
+    output = np.zeros(len(audio) + delay_samples * 5)
+    output[:len(audio)] = audio
+    for i in range(delay_samples, len(output)):
+        output[i] += output[i - delay_samples] * decay
+    return output[:len(audio)]
+
+def timeit(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    print(f"Karplus-Strong, {NOTE_LEN}s notes (best of N, ms)")
+    print(f"{'freq':>8} {'loop':>10} {'vectorized':>12} {'speedup':>9} {'max err':>10}")
+    for f in FREQUENCIES:
+        np.random.seed(0)
+        expected = karplus_strong_loop(f, NOTE_LEN)
+        np.random.seed(0)
+        actual = karplus_strong(f, NOTE_LEN)
+        loop = timeit(lambda: karplus_strong_loop(f, NOTE_LEN), 3)
+        vec = timeit(lambda: karplus_strong(f, NOTE_LEN), 20)
+        err = np.max(np.abs(expected - actual))
+        print(f"{f:>8.2f} {loop * 1000:>10.2f} {vec * 1000:>12.3f} {loop / vec:>8.1f}x {err:>10.1e}")
+
+    chord = FREQUENCIES[:3]
+    loop = timeit(lambda: [karplus_strong_loop(f, NOTE_LEN) for f in chord], 3)
+    vec = timeit(lambda: karplus_strong_batch(chord, NOTE_LEN), 20)
+    print(f"{'chord':>8} {loop * 1000:>10.2f} {vec * 1000:>12.3f} {loop / vec:>8.1f}x")
+
+    track = np.random.uniform(-1, 1, SAMPLE_RATE * 10)
+    expected = apply_reverb_loop(track)
+    actual = apply_reverb(track)
+    loop = timeit(lambda: apply_reverb_loop(track), 3)
+    vec = timeit(lambda: apply_reverb(track), 20)
+    err = np.max(np.abs(expected - actual[:len(track)]))
+    print()
+    print("Comb reverb, 10s track (best of N, ms)")
+    print(f"{'loop':>10} {'vectorized':>12} {'speedup':>9} {'max err':>10}")
+    print(f"{loop * 1000:>10.2f} {vec * 1000:>12.3f} {loop / vec:>8.1f}x {err:>10.1e}")
+
+    TONE_BANK.clear()
+    cold = timeit(lambda: generate_local_track("a tense chase", 10), 1)
+    warm = timeit(lambda: generate_local_track("a tense chase", 10), 5)
+    stats = TONE_BANK.stats()
+    print()
+    print("Local track, 10s (ms)")
+    print(f"{'cold bank':>10} {'warm bank':>10} {'hit rate':>9} {'bank MB':>8}")
+    print(f"{cold * 1000:>10.2f} {warm * 1000:>10.2f} {stats['hit_rate']:>9.2f} {stats['bytes'] / 1e6:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Local stand-ins for the services the benchmarks must not depend on.
+
+FakeOllama serves /api/generate the way Ollama does: the prompt is
+"evaluated" at prompt_tokens_per_second, then the answer streams as
+NDJSON at tokens_per_second. It ends with a done message carrying
+prompt_eval_count, eval_count and their durations. Non-streaming
+requests get the same answer as one JSON object once it is done.
+A rate of 0 means no delay.
+
+Screenplay prompts are answered with a script of `scenes` scenes; a
+[[scenes=N]] tag in the story idea overrides that. All other prompts
+get `response_tokens` words of filler. Every answer mentions `nonce`, so
+separate runs never share generation, export or audio caches.
+
+For TTS, run the server with TTS_BACKEND=stub and TTS_STUB_SPEED (see
+utils/tts_handler.py).
+"""
+import re
+import json
+import time
+import asyncio
+
+from aiohttp import web
+
+from ai.chunking import estimate_tokens
+from benchmarks.bench_pdf_export import make_script
+
+# One scene of make_script() is about this many pages of the PDF export.
+PAGES_PER_SCENE = 116 / 300
+SCENES_TAG_RE = re.compile(r"\[\[scenes=(\d+)\]\]")
+TICK = 0.02  # seconds between stream writes at a limited rate
+
+def scenes_for_pages(pages):
+    return max(1, round(pages / PAGES_PER_SCENE))
+
+class FakeOllama:
+
+    def __init__(self, tokens_per_second=200, prompt_tokens_per_second=2000, response_tokens=150, scenes=3,
+                 nonce=""):
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.response_tokens = response_tokens
+        self.scenes = scenes
+        self.nonce = nonce
+        self.requests = 0
+        self.tokens = 0
+        self._runner = None
+
+    async def start(self, port=0):
+        """Starts serving on 127.0.0.1; returns the /api/generate URL."""
+        application = web.Application()
+        application.router.add_post('/api/generate', self.generate)
+        self._runner = web.AppRunner(application, handler_cancellation=True)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', port).start()
+        host, port = self._runner.addresses[0][:2]
+        return f"http://{host}:{port}/api/generate"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    def answer(self, prompt):
+        """The words of the answer to `prompt`, each with its trailing space."""
+        if "screenwriter" in prompt and "Story Idea:" in prompt:
+            tag = SCENES_TAG_RE.search(prompt)
+            scenes = int(tag.group(1)) if tag else self.scenes
+            text = f"TITLE: RUN {self.nonce}\n\n" + make_script(scenes)
+        else:
+            words = ["Rain", "hides", "the", "warehouse", "while", "Sarah", "searches."]
+            text = f"({self.nonce}) " + " ".join(words[i % len(words)] for i in range(self.response_tokens))
+        return re.findall(r"\S+\s*", text)
+
+    async def generate(self, request):
+        payload = await request.json()
+        self.requests += 1
+        prompt_tokens = estimate_tokens(payload["prompt"])
+        started = time.perf_counter()
+        if self.prompt_tokens_per_second:
+            await asyncio.sleep(prompt_tokens / self.prompt_tokens_per_second)
+        prompt_done = time.perf_counter()
+        tokens = self.answer(payload["prompt"])
+        self.tokens += len(tokens)
+
+        def done():
+            now = time.perf_counter()
+            return {"model": payload["model"], "response": "", "done": True,
+                    "total_duration": int((now - started) * 1e9), "load_duration": 0,
+                    "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int((prompt_done - started) * 1e9),
+                    "eval_count": len(tokens), "eval_duration": int((now - prompt_done) * 1e9)}
+
+        if not payload.get("stream", True):
+            if self.tokens_per_second:
+                await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return web.json_response({**done(), "response": "".join(tokens)})
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        per_write = max(1, round(self.tokens_per_second * TICK)) if self.tokens_per_second else 256
+        for i in range(0, len(tokens), per_write):
+            lines = (json.dumps({"model": payload["model"], "response": token, "done": False}) + "\n"
+                     for token in tokens[i:i + per_write])
+            await response.write("".join(lines).encode())
+            # Paced by the clock, so slow writes do not lower the rate further.
+            if self.tokens_per_second:
+                due = prompt_done + (i + per_write) / self.tokens_per_second
+                await asyncio.sleep(max(0, due - time.perf_counter()))
+        await response.write(json.dumps(done()).encode() + b"\n")
+        return response
@@ -0,0 +1,182 @@
+"""
+Load test: many idle clients on one generation job.
+
+A fake Ollama accepts the generation and then holds its stream open, so
+the job stays in 'processing'. Against each server, POLLERS clients poll
+/generation-status (every 3 s, with ?wait=25 like the web client) and
+LISTENERS clients hold /generation-stream open, for DURATION seconds.
+While they wait, a probe times /cache-stats to show whether the server
+still answers everything else. The job never changes, so an async
+long-poll is answered after LONG_POLL seconds: there, poll latency is
+the hold time, not queueing.
+
+  flask  app.run(threaded=True) with STATUS_LONG_POLL=on: a thread per open request
+  async  async_server.py: long-polls and streams on one event loop
+
+Run from the Server directory:
+    python -m benchmarks.load_pollers [pollers] [listeners]
+"""
+import sys
+import os
+import re
+import json
+import time
+import socket
+import asyncio
+import resource
+import tempfile
+import statistics
+import subprocess
+
+import aiohttp
+from aiohttp import web
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+POLLERS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+LISTENERS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+DURATION = 40  # longer than LONG_POLL, so held polls get answered
+POLL_INTERVAL = 3
+LONG_POLL = 25
+
+SERVERS = {
+    'flask': [sys.executable, '-c', "import os; from app import app; "
+                                    "app.run(port=int(os.environ['PORT']), threaded=True)"],
+    'async': [sys.executable, 'async_server.py'],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+async def fake_ollama(request):
+    """Streams one token, then never finishes."""
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    await response.write(json.dumps({"response": "INT. ", "done": False}).encode() + b"\n")
+    await asyncio.Event().wait()
+
+def server_stats(pid):
+    with open(f"/proc/{pid}/status") as f:
+        status = f.read()
+    threads = int(re.search(r"Threads:\s+(\d+)", status).group(1))
+    rss = int(re.search(r"VmRSS:\s+(\d+) kB", status).group(1)) / 1024
+    return threads, rss
+
+async def wait_until_up(session, base):
+    for _ in range(200):
+        try:
+            async with session.get(f"{base}/cache-stats") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+async def poller(session, url, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.monotonic() - started)
+        await asyncio.sleep(max(0, POLL_INTERVAL - (time.monotonic() - started)))
+
+async def listener(session, url, deadline, errors):
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=None)) as response:
+            while time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(response.content.readany(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+    except aiohttp.ClientError as e:
+        errors.append(type(e).__name__)
+
+async def run(name, ollama_url, cache_dir):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), OLLAMA_URL=ollama_url, GENERATION_WORKERS='1',
+               GENERATION_CACHE_DIR=cache_dir, TTS_BACKEND='stub', WSGI_THREADS='32',
+               STATUS_LONG_POLL='on')
+    process = subprocess.Popen(SERVERS[name], cwd=SERVER_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=LONG_POLL + 30)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await wait_until_up(session, base)
+            async with session.post(f"{base}/generate-content", json={"story": "A heist in the rain."}) as response:
+                job_id = (await response.json())['job_id']
+
+            deadline = time.monotonic() + DURATION
+            latencies, errors = [], []
+            tasks = [asyncio.create_task(poller(session, f"{base}/generation-status/{job_id}?wait={LONG_POLL}",
+                                                deadline, latencies, errors)) for _ in range(POLLERS)]
+            tasks += [asyncio.create_task(listener(session, f"{base}/generation-stream/{job_id}", deadline, errors))
+                      for _ in range(LISTENERS)]
+
+            probes, threads, rss = [], 0, 0.0
+            while time.monotonic() < deadline:
+                await asyncio.sleep(1)
+                started = time.monotonic()
+                try:
+                    async with session.get(f"{base}/cache-stats") as response:
+                        await response.read()
+                    probes.append(time.monotonic() - started)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors.append('probe')
+                t, r = server_stats(process.pid)
+                threads, rss = max(threads, t), max(rss, r)
+            # Outstanding long polls are cut off here; they are not errors.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        # The async server exits gracefully, which waits for the held generation.
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float('nan')
+    probe = statistics.median(probes) * 1000 if probes else float('nan')
+    return len(latencies), len(errors), p50, p99, probe, threads, rss
+
+async def main():
+    # Every client holds a socket; leave room for the server too.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    ollama = web.Application()
+    ollama.router.add_post('/api/generate', fake_ollama)
+    runner = web.AppRunner(ollama, handler_cancellation=True)
+    await runner.setup()
+    ollama_port = free_port()
+    await web.TCPSite(runner, '127.0.0.1', ollama_port).start()
+    ollama_url = f"http://127.0.0.1:{ollama_port}/api/generate"
+
+    print(f"{POLLERS} pollers + {LISTENERS} stream listeners on one job for {DURATION}s")
+    print(f"{'server':>6} {'polls':>7} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'probe ms':>9} "
+          f"{'threads':>8} {'RSS MB':>7}")
+    try:
+        for name in SERVERS:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                polls, errors, p50, p99, probe, threads, rss = await run(name, ollama_url, cache_dir)
+            print(f"{name:>6} {polls:>7} {errors:>7} {p50:>8.1f} {p99:>8.1f} {probe:>9.1f} "
+                  f"{threads:>8} {rss:>7.1f}")
+    finally:
+        await runner.cleanup()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,380 @@
+"""
+End-to-end benchmark suite.
+
+Every scenario starts the server in a fresh process, so peak memory is
+per scenario. Its stores and rendered files go to a temporary directory
+that is removed afterwards. The server is pointed at benchmarks.fakes.FakeOllama and
+the stub TTS backend, and is driven over HTTP:
+
+  burst      BURST stories submitted at once; submit latency, 429s,
+             time to a finished script and jobs per minute
+  polls      POLLERS clients polling the status of running jobs
+  exports    PDF, DOCX and TXT downloads of 5, 50 and 150-page scripts,
+             first (rendered) and repeat (cached)
+  music      MUSIC_RENDERS local music renders requested at once
+  narration  NARRATORS users narrating a 5-page script, as an audio drama
+             and single-voice, through the paced stub TTS (TTS_STUB_SPEED)
+
+Results (p50/p99 latency, throughput, peak RSS of the server and its
+worker processes) go to a JSON file. Commit it, so reviewers see the
+differences. --compare prints changes against an earlier file.
+
+Run from the Server directory:
+    python -m benchmarks.suite [--scenario NAME]... [--server flask|async]
+                               [--output FILE] [--compare FILE]
+"""
+import sys
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+import aiohttp
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fakes import FakeOllama, scenes_for_pages
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), 'results.json')
+
+# Ollama stand-in: a small model on a workstation GPU.
+TOKENS_PER_SECOND = 200
+PROMPT_TOKENS_PER_SECOND = 2000
+OLLAMA_PARALLEL = 4
+
+BURST = 16
+POLLERS = 100
+POLL_INTERVAL = 0.5
+POLL_DURATION = 10
+EXPORT_PAGES = (5, 50, 150)
+EXPORT_FORMATS = ('pdf', 'docx', 'txt')
+MUSIC_RENDERS = 8
+NARRATORS = 4
+TTS_STUB_SPEED = 20
+# A regression is a change this large in the worse direction.
+REGRESSION = 0.25
+
+SERVERS = {
+    'flask': [sys.executable, '-c', "import os; from app import app; "
+                                    "app.run(port=int(os.environ['PORT']), threaded=True)"],
+    'async': [sys.executable, 'async_server.py'],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def summary(values, scale=1000):
+    """p50/p99 (in ms by default) of a list of seconds."""
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+    p99 = ordered[max(0, round(len(ordered) * 0.99) - 1)]
+    return {"n": len(ordered), "p50": round(statistics.median(ordered) * scale, 1), "p99": round(p99 * scale, 1)}
+
+def tree_rss_mb(pid):
+    """Resident memory of a process and all its descendants."""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                match = re.search(r"VmRSS:\s+(\d+) kB", f.read())
+            total += int(match.group(1)) if match else 0
+            for tid in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{tid}/children") as f:
+                    pending += [int(child) for child in f.read().split()]
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total / 1024
+
+class Server:
+    """The app in a subprocess, with a sampler for its peak memory."""
+
+    def __init__(self, kind, ollama_url, workdir, **env):
+        self.port = free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        self.env = dict(os.environ, PORT=str(self.port), OLLAMA_URL=ollama_url,
+                        OLLAMA_NUM_PARALLEL=str(OLLAMA_PARALLEL), GENERATION_QUEUE_SIZE='64',
+                        GENERATION_CACHE_DIR=os.path.join(workdir, 'generations'),
+                        CONTENT_STORE_PATH=os.path.join(workdir, 'content.sqlite3'),
+                        AUDIO_CACHE_DIR=os.path.join(workdir, 'temp_audio'),
+                        MUSIC_CACHE_DIR=os.path.join(workdir, 'temp_music'),
+                        EXPORT_CACHE_DIR=os.path.join(workdir, 'exports'),
+                        TTS_BACKEND='stub', TTS_STUB_SPEED=str(TTS_STUB_SPEED), HF_TOKEN='',
+                        **{k: str(v) for k, v in env.items()})
+        self.command = SERVERS[kind]
+        self.peak_rss = 0.0
+
+    async def __aenter__(self):
+        self.process = subprocess.Popen(self.command, cwd=SERVER_DIR, env=self.env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        async with aiohttp.ClientSession() as session:
+            for _ in range(300):
+                try:
+                    async with session.get(f"{self.base}/cache-stats") as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("server did not start")
+        self._sampler = asyncio.create_task(self._sample())
+        return self
+
+    async def _sample(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, tree_rss_mb(self.process.pid))
+            await asyncio.sleep(0.1)
+
+    async def __aexit__(self, *exc):
+        self._sampler.cancel()
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def client(self):
+        """A user: its own cookie jar, so its own session."""
+        return aiohttp.ClientSession(self.base, cookie_jar=aiohttp.CookieJar(unsafe=True),
+                                     timeout=aiohttp.ClientTimeout(total=600))
+
+async def generate(client, story, **fields):
+    """Submits a story and waits for the script. Returns (status, submit s, total s, data)."""
+    started = time.perf_counter()
+    async with client.post('/generate-content', json={"story": story, **fields}) as response:
+        submitted = time.perf_counter() - started
+        body = await response.json()
+    if response.status != 200:
+        return response.status, submitted, None, body
+    while True:
+        async with client.get(f"/generation-status/{body['job_id']}", params={"wait": "25"}) as response:
+            data = await response.json()
+        if data.get('status') in ('completed', 'failed') or response.status != 200:
+            return data.get('status'), submitted, time.perf_counter() - started, data
+
+async def timed_get(client, url, **kwargs):
+    """(time to first byte, total time, bytes, status) of a GET."""
+    started = time.perf_counter()
+    async with client.get(url, **kwargs) as response:
+        first = await response.content.readany()
+        ttfb = time.perf_counter() - started
+        size = len(first) + len(await response.read())
+    return ttfb, time.perf_counter() - started, size, response.status
+
+async def scenario_burst(server, nonce, ollama):
+    async with server.client() as client:
+        started = time.perf_counter()
+        runs = await asyncio.gather(*(generate(client, f"Heist {i} ({nonce}) in the rain.") for i in range(BURST)))
+        wall = time.perf_counter() - started
+    done = [run for run in runs if run[0] == 'completed']
+    return {
+        "jobs": BURST,
+        "completed": len(done),
+        "rejected": sum(1 for run in runs if run[0] == 429),
+        "submit_ms": summary([run[1] for run in runs]),
+        "job_s": summary([run[2] for run in done], scale=1),
+        "throughput_jobs_per_min": round(len(done) / wall * 60, 2),
+        "wall_s": round(wall, 2),
+    }
+
+async def scenario_polls(server, nonce, ollama):
+    async with server.client() as client:
+        # Long scripts keep the jobs running for the whole scenario.
+        job_ids = []
+        for i in range(OLLAMA_PARALLEL):
+            async with client.post('/generate-content', json={"story": f"Epic {i} ({nonce}) [[scenes=200]]"}) as r:
+                job_ids.append((await r.json())['job_id'])
+
+        latencies, errors = [], []
+        deadline = time.monotonic() + POLL_DURATION
+
+        async def poller(job_id):
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    async with client.get(f"/generation-status/{job_id}") as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors.append(response.status)
+                except aiohttp.ClientError as e:
+                    errors.append(type(e).__name__)
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(max(0, POLL_INTERVAL - (time.perf_counter() - started)))
+
+        await asyncio.gather(*(poller(job_ids[i % len(job_ids)]) for i in range(POLLERS)))
+    return {
+        "pollers": POLLERS,
+        "poll_ms": summary(latencies),
+        "errors": len(errors),
+        "throughput_polls_per_s": round(len(latencies) / POLL_DURATION, 1),
+    }
+
+async def scenario_exports(server, nonce, ollama):
+    # Only the exports are measured; write the scripts as fast as possible.
+    ollama.tokens_per_second = ollama.prompt_tokens_per_second = 0
+    results = {}
+    async with server.client() as client:
+        for pages in EXPORT_PAGES:
+            status, _, generated, _ = await generate(client, f"Export test ({nonce}) [[scenes={scenes_for_pages(pages)}]]")
+            if status != 'completed':
+                results[f"{pages}_pages"] = {"error": status}
+                continue
+            entry = {"generate_s": round(generated, 2)}
+            for fmt in EXPORT_FORMATS:
+                first = await timed_get(client, f"/download/{fmt}")
+                repeat = await timed_get(client, f"/download/{fmt}")
+                entry[fmt] = {"first_ttfb_ms": round(first[0] * 1000, 1), "first_ms": round(first[1] * 1000, 1),
+                              "repeat_ms": round(repeat[1] * 1000, 1), "kb": round(first[2] / 1024, 1)}
+            results[f"{pages}_pages"] = entry
+    return results
+
+async def scenario_music(server, nonce, ollama):
+    async with server.client() as client:
+
+        async def render(i):
+            started = time.perf_counter()
+            async with client.post('/generate-music', json={"description": f"Tense strings {i} ({nonce})"}) as r:
+                data = await r.json()
+            job_id = data.get('job_id')
+            while data.get('status') == 'pending':
+                await asyncio.sleep(0.1)
+                async with client.get(f"/music-status/{job_id}", params={"wait": "10"}) as r:
+                    data = await r.json()
+            return data.get('status'), time.perf_counter() - started
+
+        started = time.perf_counter()
+        runs = await asyncio.gather(*(render(i) for i in range(MUSIC_RENDERS)))
+        wall = time.perf_counter() - started
+    done = [seconds for status, seconds in runs if status == 'completed']
+    return {
+        "renders": MUSIC_RENDERS,
+        "completed": len(done),
+        "render_ms": summary(done),
+        "throughput_renders_per_min": round(len(done) / wall * 60, 1),
+    }
+
+async def scenario_narration(server, nonce, ollama):
+    ollama.tokens_per_second = ollama.prompt_tokens_per_second = 0
+
+    async def narrate(i, voices):
+        async with server.client() as client:
+            await generate(client, f"Narrated ({nonce}) {voices} {i} [[scenes={scenes_for_pages(5)}]]")
+            started = time.perf_counter()
+            async with client.post('/narrate', json={"type": "screenplay", "voices": voices}) as response:
+                data = await response.json()
+            ttfb, total, size, _ = await timed_get(client, data['audio_url'])
+            elapsed = time.perf_counter() - started
+            return elapsed - total + ttfb, elapsed, size
+
+    results = {"narrators": NARRATORS}
+    # 'cast' is the audio drama (a voice per character); 'single' streams chunk by chunk.
+    for voices in ('cast', 'single'):
+        runs = await asyncio.gather(*(narrate(i, voices) for i in range(NARRATORS)))
+        results[voices] = {
+            "first_audio_ms": summary([run[0] for run in runs]),
+            "complete_ms": summary([run[1] for run in runs]),
+            "audio_kb": round(statistics.mean(run[2] for run in runs) / 1024, 1),
+        }
+    return results
+
+SCENARIOS = {
+    'burst': (scenario_burst, {}),
+    'polls': (scenario_polls, {}),
+    'exports': (scenario_exports, {}),
+    'music': (scenario_music, {'MUSIC_WORKERS': 4}),
+    'narration': (scenario_narration, {}),
+}
+
+async def run(names, server_kind):
+    nonce = uuid.uuid4().hex[:8]
+    results = {}
+    for name in names:
+        fn, env = SCENARIOS[name]
+        ollama = FakeOllama(TOKENS_PER_SECOND, PROMPT_TOKENS_PER_SECOND, nonce=nonce)
+        url = await ollama.start()
+        try:
+            with tempfile.TemporaryDirectory() as workdir:
+                async with Server(server_kind, url, workdir, **env) as server:
+                    result = await fn(server, nonce, ollama)
+                result["peak_rss_mb"] = round(server.peak_rss, 1)
+                result["ollama_requests"] = ollama.requests
+        finally:
+            await ollama.stop()
+        results[name] = result
+        print(f"{name}: {json.dumps(result)}")
+    return results
+
+def flatten(data, prefix=""):
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, path + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+def compare(old, new):
+    """Prints every metric that moved, flagging REGRESSION-sized moves the wrong way."""
+    before = dict(flatten(old["scenarios"]))
+    worse = 0
+    print(f"\n{'metric':<42} {'before':>10} {'after':>10} {'change':>8}")
+    for path, value in flatten(new["scenarios"]):
+        if path not in before or path.endswith(".n") or not before[path]:
+            continue
+        change = (value - before[path]) / before[path]
+        if abs(change) < 0.05:
+            continue
+        higher_is_better = "throughput" in path or path.endswith("completed")
+        regressed = (-change if higher_is_better else change) > REGRESSION
+        worse += regressed
+        print(f"{path:<42} {before[path]:>10} {value:>10} {change:>+8.0%}{'  REGRESSION' if regressed else ''}")
+    print(f"{worse} regression(s) beyond {REGRESSION:.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against a fake Ollama.")
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument('--server', choices=list(SERVERS), default='flask')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help="earlier results file to compare with")
+    args = parser.parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {
+        "meta": {
+            "server": args.server,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "fake_ollama": {"tokens_per_second": TOKENS_PER_SECOND,
+                            "prompt_tokens_per_second": PROMPT_TOKENS_PER_SECOND,
+                            "parallel": OLLAMA_PARALLEL},
+            "tts_stub_speed": TTS_STUB_SPEED,
+        },
+        "scenarios": asyncio.run(run(args.scenario or list(SCENARIOS), args.server)),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"wrote {args.output}")
+
+    if baseline:
+        compare(baseline, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import os
+import zipfile
+import threading
+
+BLOCK_SIZE = 256 * 1024
+
+# Already-compressed formats are stored as is; deflating them only costs CPU.
+STORED_EXTENSIONS = ('.pdf', '.docx', '.mp3', '.wav')
+
+def render_file(render, content, path):
+    """
+    Runs render(content, tmp_path) and moves the finished file to `path`,
+    so readers never see a partial export. Safe to run in a worker process.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        render(content, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+class _Sink:
+    """Write-only, unseekable target for ZipFile; the stream drains it after every block."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(entries, block_size=BLOCK_SIZE):
+    """
+    Yields a ZIP archive of `entries` ((name in archive, file path)) block by
+    block. ZipFile sees an unseekable sink, so it writes data descriptors
+    instead of seeking back, and at most one block is held in memory.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for name, path in entries:
+            info = zipfile.ZipInfo.from_file(path, name)
+            info.compress_type = (zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTENSIONS)
+                                  else zipfile.ZIP_DEFLATED)
+            with open(path, 'rb') as src, archive.open(info, 'w') as dest:
+                for block in iter(lambda: src.read(block_size), b""):
+                    dest.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
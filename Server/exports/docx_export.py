@@ -1,13 +1,91 @@
 from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Inches, Pt
+from xml.sax.saxutils import escape
 from io import BytesIO
 
-def generate_docx(content_dict):
+from utils.screenplay_parser import get_screenplay
+
+# Bump when the template changes so cached exports are not reused.
+LAYOUT_VERSION = 1
+
+# (left indent, right indent) in inches, relative to the page margin.
+SCREENPLAY_INDENTS = {
+    'heading': (0, 0),
+    'action': (0, 0),
+    'character': (2.2, 0),
+    'parenthetical': (1.6, 2.0),
+    'dialogue': (1.0, 1.5),
+    'transition': (0, 0),
+}
+
+# Word style per parsed element kind.
+SCREENPLAY_STYLE_NAMES = {
+    'heading': 'Scene Heading',
+    'action': 'Action',
+    'character': 'Character',
+    'parenthetical': 'Parenthetical',
+    'dialogue': 'Dialogue',
+    'transition': 'Transition',
+}
+
+def _build_template():
     """
-    Generates a DOCX file from the content dictionary.
-    Returns a BytesIO object containing the DOCX data.
+    The export template: title/section pages use the built-in styles, the
+    screenplay gets one Courier New paragraph style per element kind.
+    Returns (docx bytes, {kind: style id}).
     """
     document = Document()
+    style_ids = {}
+    for kind, name in SCREENPLAY_STYLE_NAMES.items():
+        style = document.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = document.styles['Normal']
+        style.font.name = 'Courier New'
+        style.font.size = Pt(12)
+        style.font.bold = kind == 'heading'
+        left, right = SCREENPLAY_INDENTS[kind]
+        fmt = style.paragraph_format
+        fmt.left_indent = Inches(left)
+        fmt.right_indent = Inches(right)
+        # Speech blocks stay together; everything else gets a blank line above.
+        fmt.space_before = Pt(0 if kind in ('dialogue', 'parenthetical') else 12)
+        fmt.space_after = Pt(0)
+        fmt.keep_with_next = kind in ('heading', 'character', 'parenthetical')
+        if kind == 'transition':
+            fmt.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        style_ids[kind] = style.style_id
     buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue(), style_ids
+
+# Built once; every export opens a fresh copy of these bytes.
+TEMPLATE, STYLE_IDS = _build_template()
+
+def _append_paragraphs(document, paragraphs):
+    """
+    Appends (style id or None, text) paragraphs in one parse instead of one
+    python-docx call per paragraph, which dominates on long scripts.
+    """
+    xml = []
+    for style_id, text in paragraphs:
+        style = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ''
+        run = f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>' if text else ''
+        xml.append(f'<w:p>{style}{run}</w:p>')
+    fragment = parse_xml(f'<w:body {nsdecls("w")}>{"".join(xml)}</w:body>')
+    sect_pr = document.element.body.sectPr
+    for p in list(fragment):
+        sect_pr.addprevious(p)
+
+def generate_docx(content_dict, output=None):
+    """
+    Generates a DOCX file from the content dictionary.
+    Writes to `output` (a path or binary file) if given and returns it;
+    otherwise returns a BytesIO object containing the DOCX data.
+    """
+    document = Document(BytesIO(TEMPLATE))
 
     document.add_heading('DraftRoom Export', 0)
     document.add_paragraph('Generated by DraftRoom')
@@ -16,26 +94,24 @@ def generate_docx(content_dict):
     # Screenplay
     if content_dict.get("screenplay"):
         document.add_heading('Screenplay', level=1)
-        # We process line by line to try and maintain some formatting
-        for line in content_dict["screenplay"].splitlines():
-             p = document.add_paragraph(line)
-             # Basic courier font application could follow here if strict formatting needed
-             # For now, default style is acceptable as per "industry-friendly formatting" requirement which allows standard doc structure
+        _append_paragraphs(document, ((STYLE_IDS[kind], text) for kind, text in get_screenplay(content_dict)))
         document.add_page_break()
 
     # Characters
     if content_dict.get("characters"):
         document.add_heading('Character Profiles', level=1)
-        for line in content_dict["characters"].splitlines():
-            document.add_paragraph(line)
+        _append_paragraphs(document, ((None, line) for line in content_dict["characters"].splitlines()))
         document.add_page_break()
 
     # Sound Design
     if content_dict.get("sound_design"):
         document.add_heading('Sound Design', level=1)
-        for line in content_dict["sound_design"].splitlines():
-            document.add_paragraph(line)
+        _append_paragraphs(document, ((None, line) for line in content_dict["sound_design"].splitlines()))
 
+    if output is not None:
+        document.save(output)
+        return output
+    buffer = BytesIO()
     document.save(buffer)
     buffer.seek(0)
     return buffer
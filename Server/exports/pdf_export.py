@@ -1,66 +1,83 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from xml.sax.saxutils import escape
 from io import BytesIO
 
-def generate_pdf(content_dict):
+from utils.screenplay_parser import get_screenplay
+
+# Courier 12 screenplay layout, indents relative to the 1" page margin.
+SCREENPLAY_STYLES = {
+    'heading': dict(fontName='Courier-Bold', spaceBefore=12, spaceAfter=12),
+    'action': dict(spaceAfter=12),
+    'character': dict(leftIndent=158, spaceBefore=6),
+    'parenthetical': dict(leftIndent=115, rightIndent=144),
+    'dialogue': dict(leftIndent=72, rightIndent=108),
+    'transition': dict(alignment=TA_RIGHT, spaceBefore=12, spaceAfter=12),
+}
+
+# Bump when the layout changes so cached renders are not reused.
+LAYOUT_VERSION = 1
+
+def _build_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Screenplay', fontName='Courier', fontSize=12, leading=14, spaceAfter=12))
+    styles.add(ParagraphStyle(name='CenterTitle', parent=styles['Heading1'], alignment=TA_CENTER, spaceAfter=24))
+    for kind, options in SCREENPLAY_STYLES.items():
+        styles.add(ParagraphStyle(name=f'Screenplay-{kind}', parent=styles['Screenplay'], **{'spaceAfter': 0, **options}))
+    return styles
+
+# Built once; ParagraphStyles are only read while laying out.
+STYLES = _build_styles()
+
+def _text_section(story, title, text):
+    story.append(Paragraph(title, STYLES['Heading2']))
+    story.append(Spacer(1, 12))
+    body = STYLES['BodyText']
+    for line in text.splitlines():
+        story.append(Paragraph(escape(line), body) if line.strip() else Spacer(1, 12))
+
+def generate_pdf(content_dict, output=None):
     """
     Generates a PDF from the content dictionary.
-    Returns a BytesIO object containing the PDF data.
+    Writes to `output` (a path or binary file) if given and returns it;
+    otherwise returns a BytesIO object containing the PDF data.
     """
-    buffer = BytesIO()
+    buffer = output if output is not None else BytesIO()
+    # invariant: identical content gives identical bytes (stable ETags for the cache).
     doc = SimpleDocTemplate(buffer, pagesize=letter,
                             rightMargin=72, leftMargin=72,
-                            topMargin=72, bottomMargin=72)
-
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='Screenplay', fontName='Courier', fontSize=12, leading=14, spaceAfter=12))
-    styles.add(ParagraphStyle(name='CenterTitle', parent=styles['Heading1'], alignment=TA_CENTER, spaceAfter=24))
+                            topMargin=72, bottomMargin=72, invariant=True)
 
     story = []
 
     # Title Page
-    story.append(Paragraph("DraftRoom Export", styles['CenterTitle']))
+    story.append(Paragraph("DraftRoom Export", STYLES['CenterTitle']))
     story.append(Spacer(1, 12))
-    story.append(Paragraph("Generated by DraftRoom", styles['BodyText']))
+    story.append(Paragraph("Generated by DraftRoom", STYLES['BodyText']))
     story.append(PageBreak())
 
     # Screenplay Section
     if content_dict.get("screenplay"):
-        story.append(Paragraph("Screenplay", styles['Heading2']))
+        story.append(Paragraph("Screenplay", STYLES['Heading2']))
         story.append(Spacer(1, 12))
-        # Handle newlines by splitting and creating paragraphs to preserve formatting
-        for line in content_dict["screenplay"].splitlines():
-            if not line.strip():
-                story.append(Spacer(1, 12))
-            else:
-                # Replace spaces for indentation (approximate for now)
-                clean_line = line.replace(" ", "&nbsp;")
-                story.append(Paragraph(clean_line, styles['Screenplay']))
+        styles = {kind: STYLES[f'Screenplay-{kind}'] for kind in SCREENPLAY_STYLES}
+        for kind, text in get_screenplay(content_dict):
+            story.append(Paragraph(escape(text), styles[kind]))
         story.append(PageBreak())
 
     # Characters Section
     if content_dict.get("characters"):
-        story.append(Paragraph("Character Profiles", styles['Heading2']))
-        story.append(Spacer(1, 12))
-        for line in content_dict["characters"].splitlines():
-             if not line.strip():
-                story.append(Spacer(1, 12))
-             else:
-                story.append(Paragraph(line, styles['BodyText']))
+        _text_section(story, "Character Profiles", content_dict["characters"])
         story.append(PageBreak())
 
     # Sound Design Section
     if content_dict.get("sound_design"):
-        story.append(Paragraph("Sound Design", styles['Heading2']))
-        story.append(Spacer(1, 12))
-        for line in content_dict["sound_design"].splitlines():
-             if not line.strip():
-                story.append(Spacer(1, 12))
-             else:
-                story.append(Paragraph(line, styles['BodyText']))
+        _text_section(story, "Sound Design", content_dict["sound_design"])
 
     doc.build(story)
+    if output is not None:
+        return output
     buffer.seek(0)
     return buffer
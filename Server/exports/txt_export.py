@@ -0,0 +1,23 @@
+from io import BytesIO
+
+from utils.screenplay_parser import get_screenplay, format_plain_text
+
+# Bump when the layout changes so cached exports are not reused.
+LAYOUT_VERSION = 1
+
+def generate_txt(content_dict, output=None):
+    """
+    Generates the plain-text export (screenplay with standard indents,
+    characters, sound design). Writes to `output` (a path) if given and
+    returns it; otherwise returns a BytesIO object.
+    """
+    screenplay_text = format_plain_text(get_screenplay(content_dict))
+    full_text = (f"SCREENPLAY\n\n{screenplay_text}\n\n"
+                 f"CHARACTERS\n\n{content_dict.get('characters', '')}\n\n"
+                 f"SOUND DESIGN\n\n{content_dict.get('sound_design', '')}")
+    data = full_text.encode('utf-8')
+    if output is not None:
+        with open(output, 'wb') as f:
+            f.write(data)
+        return output
+    return BytesIO(data)
@@ -0,0 +1,19 @@
+"""
+Imported by every test module before app or ai.*, whose stores open at
+import time: points them at a temporary directory instead of the
+developer's cache, however the tests are run.
+"""
+import os
+import atexit
+import shutil
+import tempfile
+
+_STORE_DIR = tempfile.mkdtemp(prefix="draftroom-tests-")
+atexit.register(shutil.rmtree, _STORE_DIR, ignore_errors=True)
+os.environ.update({
+    "CONTENT_STORE_PATH": os.path.join(_STORE_DIR, "content.sqlite3"),
+    "GENERATION_CACHE_DIR": os.path.join(_STORE_DIR, "generations"),
+    "AUDIO_CACHE_DIR": os.path.join(_STORE_DIR, "temp_audio"),
+    "MUSIC_CACHE_DIR": os.path.join(_STORE_DIR, "temp_music"),
+    "EXPORT_CACHE_DIR": os.path.join(_STORE_DIR, "exports"),
+})
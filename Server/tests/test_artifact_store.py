@@ -0,0 +1,84 @@
+import unittest
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.artifact_store import ArtifactStore, PARTIAL_GRACE
+
+class TestArtifactStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, store, key, size, ext=".mp3"):
+        path = store.path(key, ext)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        store.add(path)
+        return path
+
+    def test_key_is_stable_and_order_independent(self):
+        a = ArtifactStore.make_key(text="hi", voice="v")
+        self.assertEqual(a, ArtifactStore.make_key(voice="v", text="hi"))
+        self.assertNotEqual(a, ArtifactStore.make_key(text="hi", voice="w"))
+
+    def test_hit_after_add(self):
+        store = ArtifactStore(self.tmp, max_bytes=10_000)
+        self.assertIsNone(store.get("k", ".mp3"))
+        path = self.write(store, "k", 100)
+        self.assertEqual(store.get("k", ".mp3"), path)
+        stats = store.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["bytes"]), (1, 1, 100))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_quota_evicts_least_recently_used(self):
+        store = ArtifactStore(self.tmp, max_bytes=1000)
+        self.write(store, "a", 400)
+        self.write(store, "b", 400)
+        store.get("a", ".mp3")  # b is now the oldest
+        self.write(store, "c", 400)
+        self.assertIsNotNone(store.get("a", ".mp3"))
+        self.assertIsNone(store.get("b", ".mp3"))
+        self.assertFalse(os.path.exists(store.path("b", ".mp3")))
+        self.assertEqual(store.stats()["evictions"], 1)
+
+    def test_reconcile_adopts_old_files_and_drops_partials(self):
+        for i, name in enumerate(["speech_old1.mp3", "speech_old2.mp3", "abc.mp3"]):
+            path = os.path.join(self.tmp, name)
+            with open(path, "wb") as f:
+                f.write(b"x" * 400)
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        for name in ["def.mp3.part", "ghi.pdf.1.tmp"]:
+            with open(os.path.join(self.tmp, name), "wb") as f:
+                f.write(b"x")
+        stale = time.time() - PARTIAL_GRACE - 10
+        os.utime(os.path.join(self.tmp, "def.mp3.part"), (stale, stale))
+
+        store = ArtifactStore(self.tmp, max_bytes=1000)
+        # Over quota on startup: the oldest legacy file goes, the abandoned
+        # partial write too. The recent one may still be being written.
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["abc.mp3", "ghi.pdf.1.tmp", "speech_old2.mp3"])
+        self.assertEqual(store.get("abc", ".mp3"), os.path.join(self.tmp, "abc.mp3"))
+        self.assertEqual(store.stats()["bytes"], 800)
+
+    def test_get_adopts_files_written_by_another_process(self):
+        a = ArtifactStore(self.tmp, max_bytes=10_000)
+        b = ArtifactStore(self.tmp, max_bytes=10_000)
+        path = self.write(a, "k", 100)
+        self.assertEqual(b.get("k", ".mp3"), path)
+        self.assertEqual((b.stats()["hits"], b.stats()["bytes"]), (1, 100))
+
+        os.remove(path)  # evicted by the other process
+        self.assertIsNone(b.get("k", ".mp3"))
+        self.assertEqual(b.stats()["bytes"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+from concurrent.futures import Future
+
+from aiohttp.test_utils import TestClient, TestServer
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+import app as app_module
+import async_server
+from utils import tts_handler
+from utils.artifact_store import ArtifactStore
+from utils.content_store import ContentStore
+from utils.job_store import MemoryJobStore
+from utils.token_stream import TokenStream
+
+CONTENT = {'screenplay': "INT. LAB - DAY\n\nSarah mixes chemicals.\n", 'characters': "SARAH: a chemist.",
+           'sound_design': "Bubbling flasks."}
+
+class TestAsyncServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.content = ContentStore(os.path.join(self.tmp, "content.sqlite3"))
+        for name, store in (('CONTENT', self.content), ('JOBS', MemoryJobStore()),
+                            ('MUSIC_JOBS', MemoryJobStore()), ('SHARED_SCRIPTS', MemoryJobStore())):
+            p = patch.object(app_module, name, store)
+            p.start()
+            self.addCleanup(p.stop)
+        self.client = TestClient(TestServer(async_server.create_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_other_routes_go_through_the_flask_bridge(self):
+        response = await self.client.post('/set-username', json={'username': 'Sarah'})
+        self.assertEqual(response.status, 200)
+        self.assertIn('message', await response.json())
+        stats = await self.client.get('/cache-stats')
+        self.assertIn('content', await stats.json())
+        missing = await self.client.get('/no-such-route')
+        self.assertEqual(missing.status, 404)
+
+    async def test_status_long_poll_returns_on_change_and_sets_session(self):
+        job_id = 'async-job'
+        app_module.JOBS.create(job_id, {'status': 'processing', 'step': 'Writing screenplay...'})
+
+        def finish():
+            time.sleep(0.3)
+            app_module._finish_job(job_id, 'completed', results=CONTENT, content_id=self.content.put(CONTENT))
+        threading.Thread(target=finish).start()
+
+        started = time.monotonic()
+        response = await self.client.get(f'/generation-status/{job_id}?wait=10')
+        data = await response.json()
+        self.assertEqual(data['status'], 'completed')
+        self.assertLess(time.monotonic() - started, 5)
+
+        # The Flask session cookie now points at the content.
+        download = await self.client.get('/download/txt')
+        self.assertEqual(download.status, 200)
+        self.assertIn('Sarah mixes chemicals.', await download.text())
+
+    async def test_status_long_poll_times_out_unchanged(self):
+        app_module.JOBS.create('idle-job', {'status': 'pending', 'step': 'Queued'})
+        started = time.monotonic()
+        response = await self.client.get('/generation-status/idle-job?wait=0.6')
+        self.assertEqual((await response.json())['status'], 'pending')
+        self.assertGreaterEqual(time.monotonic() - started, 0.5)
+        missing = await self.client.get('/generation-status/nope?wait=5')
+        self.assertEqual(missing.status, 404)
+
+    async def test_store_calls_run_off_the_event_loop(self):
+        app_module.JOBS.create('threaded-job', {'status': 'pending', 'step': 'Queued'})
+        loop_thread = threading.current_thread()
+        readers = []
+        real_get = app_module.JOBS.get
+
+        def get(key):
+            readers.append(threading.current_thread())
+            return real_get(key)
+        with patch.object(app_module.JOBS, 'get', get):
+            response = await self.client.get('/generation-status/threaded-job?wait=0.3')
+        self.assertEqual((await response.json())['status'], 'pending')
+        self.assertTrue(readers)
+        self.assertNotIn(loop_thread, readers)
+
+    async def test_music_long_poll_is_woken_by_the_render(self):
+        job_id, key = 'async-music', 'render-key'
+        app_module.MUSIC_JOBS.create(job_id, {'status': 'pending', 'step': 'Queued'})
+        app_module.MUSIC_IN_FLIGHT[key] = [job_id]
+        reads = []
+        real_get = app_module.MUSIC_JOBS.get
+
+        def get(key):
+            reads.append(key)
+            return real_get(key)
+
+        def finish():
+            time.sleep(1)
+            done = Future()
+            done.set_result(os.path.join(self.tmp, f"{key}.wav"))
+            app_module._music_job_done(key, done)
+        threading.Thread(target=finish).start()
+
+        started = time.monotonic()
+        with patch.object(app_module.MUSIC_JOBS, 'get', get):
+            response = await self.client.get(f'/music-status/{job_id}?wait=10')
+        data = await response.json()
+        self.assertEqual(data['audio_url'], f'/music/{key}.wav')
+        self.assertLess(time.monotonic() - started, 1.5)
+        # Read on arrival, on the wake-up and for the answer: no fixed-interval polling.
+        self.assertLessEqual(len(reads), 3)
+
+    async def test_generation_stream_events(self):
+        stream = TokenStream()
+        app_module.STREAMS['async-stream'] = stream
+
+        def write():
+            for token in ("INT. ", "LAB"):
+                time.sleep(0.05)
+                stream.append(token)
+            stream.close()
+        threading.Thread(target=write).start()
+        try:
+            response = await self.client.get('/generation-stream/async-stream')
+            body = await response.text()
+        finally:
+            del app_module.STREAMS['async-stream']
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        self.assertIn('"token": "INT. "', body)
+        self.assertTrue(body.rstrip().endswith('data: {}'))
+
+    async def test_narrate_streams_audio(self):
+        await self.client.post('/set-username', json={'username': 'Sarah'})
+        job_id = 'async-narrate'
+        app_module.JOBS.create(job_id, {'status': 'processing', 'step': 'Finishing...'})
+        app_module._finish_job(job_id, 'completed', results=CONTENT, content_id=self.content.put(CONTENT))
+        await self.client.get(f'/generation-status/{job_id}')
+
+        with patch.object(tts_handler, 'TTS_BACKEND', 'stub'), \
+             patch.object(app_module, 'NARRATION_ARTIFACTS', ArtifactStore(os.path.join(self.tmp, "audio"))):
+            response = await self.client.post('/narrate', json={'type': 'screenplay'})
+            data = await response.json()
+            self.assertTrue(data['audio_url'].startswith('/narration-stream/'))
+            audio = await self.client.get(data['audio_url'])
+            self.assertEqual((await audio.read())[:2], b"\xff\xfb")
+            app_module.NARRATIONS[data['audio_url'].rsplit('/', 1)[1]].wait(5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from utils import tts_handler, audio_drama
+from utils.audio_drama import (
+    plan_drama, batch_by_voice, assign_voices, mp3_frames, slice_batch, start_drama, NARRATOR, NARRATOR_VOICE
+)
+from utils.screenplay_parser import parse_screenplay
+
+SCRIPT = """INT. LAB - DAY
+
+SARAH mixes chemicals.
+
+SARAH
+(whispering)
+It's working.
+Finally!
+
+MARCUS
+Don't touch that
+
+EXT. PARKING LOT - NIGHT
+
+Rain falls.
+
+SARAH
+We did it.
+
+MARCUS: Did we?
+"""
+
+CHARACTERS = "SARAH CHEN\nRole: lead. She is a chemist.\n\nMARCUS\nRole: rival. He wants her formula."
+
+# MPEG-2 Layer III, 48 kbps, 24 kHz, mono: what edge-tts streams.
+EDGE_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC4]) + bytes(140)
+
+class TestAudioDrama(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_plan_assigns_voices_and_skips_cues(self):
+        lines, voices, sections = plan_drama(parse_screenplay(SCRIPT), CHARACTERS)
+        self.assertEqual(voices[NARRATOR], NARRATOR_VOICE)
+        self.assertIn(voices["SARAH"], audio_drama.FEMALE_VOICES)
+        self.assertIn(voices["MARCUS"], audio_drama.MALE_VOICES)
+        self.assertEqual(sections, 2)
+        self.assertEqual([(l.speaker, l.text) for l in lines], [
+            (NARRATOR, "Interior. Lab. Day."),
+            (NARRATOR, "SARAH mixes chemicals."),
+            ("SARAH", "It's working. Finally!"),
+            ("MARCUS", "Don't touch that"),
+            (NARRATOR, "Exterior. Parking Lot. Night."),
+            (NARRATOR, "Rain falls."),
+            ("SARAH", "We did it."),
+            ("MARCUS", "Did we?"),
+        ])
+
+    def test_batches_follow_voices_not_lines(self):
+        lines, voices, _ = plan_drama(parse_screenplay(SCRIPT), CHARACTERS)
+        self.assertEqual(len(batch_by_voice(lines)), 3)
+        # Oversized voices are split so they can render in parallel.
+        self.assertEqual(len(batch_by_voice(lines, max_chars=30)), 7)
+
+    def test_unknown_characters_alternate_pools(self):
+        voices = assign_voices(["A", "B"])
+        self.assertIn(voices["A"], audio_drama.MALE_VOICES)
+        self.assertIn(voices["B"], audio_drama.FEMALE_VOICES)
+
+    def test_mp3_frames_parses_edge_format(self):
+        frames = mp3_frames(b"junk" + EDGE_FRAME * 3)
+        self.assertEqual([(s, e) for s, e, _ in frames], [(4, 148), (148, 292), (292, 436)])
+        self.assertAlmostEqual(frames[0][2], 0.024)
+
+    def test_slice_batch_cuts_at_sentence_boundaries(self):
+        lines, _, _ = plan_drama(parse_screenplay(SCRIPT), CHARACTERS)
+        batch = [l for l in lines if l.speaker == "SARAH"]
+        boundaries = [(0.0, 0.5, "It's working."), (0.5, 0.5, "Finally!"), (1.2, 0.5, "We did it.")]
+        segments = slice_batch(EDGE_FRAME * 100, batch, boundaries)
+        self.assertEqual(len(segments[batch[0].index]), 50 * len(EDGE_FRAME))
+        self.assertEqual(len(segments[batch[1].index]), 50 * len(EDGE_FRAME))
+
+    @patch.object(tts_handler, 'TTS_BACKEND', 'stub')
+    def test_drama_renders_one_call_per_voice_with_cues(self):
+        calls = []
+        real = tts_handler._synthesize_stub
+        async def counting(text, voice, boundaries=None):
+            calls.append(voice)
+            return await real(text, voice, boundaries)
+
+        with patch.object(tts_handler, '_synthesize_stub', counting):
+            drama = start_drama(parse_screenplay(SCRIPT), CHARACTERS, self.tmp)
+            path = drama.wait(5)
+
+        self.assertEqual(sorted(calls), sorted(set(calls)))
+        self.assertEqual(len(calls), 3)
+        self.assertEqual([c["speaker"] for c in drama.cues][:3], [NARRATOR, NARRATOR, "SARAH"])
+        starts = [c["start"] for c in drama.cues]
+        self.assertEqual(starts, sorted(starts))
+        self.assertTrue(all(c["duration"] > 0 for c in drama.cues))
+        total = sum(f[2] for f in mp3_frames(open(path, "rb").read()))
+        last = drama.cues[-1]
+        self.assertAlmostEqual(total, last["start"] + last["duration"] + audio_drama.LINE_GAP, delta=0.05)
+
+if __name__ == '__main__':
+    unittest.main()
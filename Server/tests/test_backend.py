@@ -2,14 +2,25 @@ import unittest
 import sys
 import os
 import json
+import shutil
+import tempfile
 from unittest.mock import patch, MagicMock
+from concurrent.futures import Future
 
 # Add server directory to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
 
 from app import app
 from utils.validators import validate_story_input
 from utils.response_cleaner import clean_ai_response
+from utils.render_service import RenderService, QueueFull
+from utils.token_stream import TokenStream
+from utils.job_queue import JobQueue
+from utils.content_store import ContentStore
+import threading
+import time
+import app as app_module
 
 class TestScriptoriaBackend(unittest.TestCase):
 
@@ -17,6 +28,16 @@ class TestScriptoriaBackend(unittest.TestCase):
         self.app = app.test_client()
         self.app.testing = True
 
+    def temp_content(self):
+        """Patches app.CONTENT with an empty store in a temporary directory."""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        store = ContentStore(os.path.join(tmp, "content.sqlite3"))
+        p = patch.object(app_module, 'CONTENT', store)
+        p.start()
+        self.addCleanup(p.stop)
+        return store
+
     def test_validators(self):
         # Valid input
         valid, msg = validate_story_input({"story": "A test story"})
@@ -51,16 +72,33 @@ class TestScriptoriaBackend(unittest.TestCase):
             "sound_design": "Scene 1: Beeping noises.",
             "meta": {"status": "success"}
         }
+        content = self.temp_content()
 
         payload = {"story": "Scientist in a lab"}
         response = self.app.post('/generate-content', 
                                  data=json.dumps(payload),
                                  content_type='application/json')
         
+        # Generation is queued; the script arrives through the status endpoint.
         self.assertEqual(response.status_code, 200)
-        data = response.json
+        self.assertEqual(response.json['status'], 'pending')
+        job_id = response.json['job_id']
+
+        # Long-polled like the web client, so each request waits for the next change.
+        status = {'status': 'pending'}
+        deadline = time.time() + 10
+        with patch.object(app_module, 'STATUS_LONG_POLL', True):
+            while status['status'] in ('pending', 'processing') and time.time() < deadline:
+                response = self.app.get(f'/generation-status/{job_id}?wait=5')
+                self.assertEqual(response.headers['X-Long-Poll'], '5')
+                status = response.json
+        self.assertEqual(status['status'], 'completed')
+        data = status['data']
         self.assertEqual(data['screenplay'], "INT. LAB - DAY\nA scientist works.")
         self.assertEqual(data['meta']['status'], "success")
+        self.assertTrue(status['share_id'])
+        with self.app.session_transaction() as sess:
+            self.assertEqual(content.get(sess['content_id'])['characters'], "Dr. Smith: A genius.")
 
     def test_set_username(self):
         response = self.app.post('/set-username', 
@@ -70,5 +108,227 @@ class TestScriptoriaBackend(unittest.TestCase):
         with self.app.session_transaction() as sess:
             self.assertEqual(sess['username'], "TestUser")
 
+    @patch('app.MUSIC_RENDERER')
+    def test_generate_music_is_queued(self, mock_renderer):
+        done = Future()
+        def submit(fn, *args, on_done=None):
+            done.set_result("/tmp/temp_music/music_abc.wav")
+            on_done(done)
+            return done
+        mock_renderer.submit.side_effect = submit
+
+        response = self.app.post('/generate-music',
+                                 data=json.dumps({"description": "tense chase"}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        job_id = response.json['job_id']
+
+        status = self.app.get(f'/music-status/{job_id}').json
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(status['audio_url'], '/music/music_abc.wav')
+        self.assertEqual(self.app.get(f'/music-status/{job_id}').status_code, 404)
+
+    @patch('app.MUSIC_RENDERER')
+    def test_generate_music_reuses_rendered_file(self, mock_renderer):
+        pending = []
+        mock_renderer.submit.side_effect = lambda fn, *args, on_done=None: pending.append((args, on_done))
+        body = json.dumps({"description": "a quiet dawn"})
+
+        first = self.app.post('/generate-music', data=body, content_type='application/json').json
+        second = self.app.post('/generate-music', data=body, content_type='application/json').json
+        self.assertEqual(len(pending), 1)  # the duplicate waits on the same render
+
+        (description, duration, output_dir, filename), on_done = pending[0]
+        path = os.path.join(output_dir, filename)
+        with open(path, 'wb') as f:
+            f.write(b'RIFF')
+        try:
+            done = Future()
+            done.set_result(path)
+            on_done(done)
+            for job in (first, second):
+                status = self.app.get(f"/music-status/{job['job_id']}").json
+                self.assertEqual(status['audio_url'], f'/music/{filename}')
+
+            third = self.app.post('/generate-music', data=body, content_type='application/json').json
+            self.assertEqual(third, {"status": "completed", "audio_url": f'/music/{filename}', "cached": True})
+            self.assertEqual(len(pending), 1)
+        finally:
+            os.remove(path)
+
+    @patch('app.MUSIC_RENDERER')
+    def test_music_render_finishing_while_duplicate_is_queued(self, mock_renderer):
+        pending = []
+        mock_renderer.submit.side_effect = lambda fn, *args, on_done=None: pending.append((args, on_done))
+        body = json.dumps({"description": "a storm at sea"})
+        first = self.app.post('/generate-music', data=body, content_type='application/json').json
+        (description, duration, output_dir, filename), on_done = pending[0]
+        path = os.path.join(output_dir, filename)
+        self.addCleanup(os.remove, path)
+
+        def finish_render():
+            with open(path, 'wb') as f:
+                f.write(b'RIFF')
+            done = Future()
+            done.set_result(path)
+            threading.Thread(target=on_done, args=(done,)).start()
+            time.sleep(0.1)
+
+        # The render completes after the duplicate's cache lookup but before it
+        # looks for a render in flight: it must neither render again nor hang.
+        create = app_module.MUSIC_JOBS.create
+        def create_then_finish(key, record):
+            create(key, record)
+            finish_render()
+        with patch.object(app_module.MUSIC_JOBS, 'create', side_effect=create_then_finish):
+            second = self.app.post('/generate-music', data=body, content_type='application/json').json
+
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(second, {"status": "completed", "audio_url": f'/music/{filename}', "cached": True})
+        self.assertEqual(self.app.get(f"/music-status/{first['job_id']}").json['status'], 'completed')
+
+    @patch('app.MUSIC_RENDERER')
+    def test_generate_music_queue_full(self, mock_renderer):
+        mock_renderer.submit.side_effect = QueueFull()
+        response = self.app.post('/generate-music',
+                                 data=json.dumps({"description": "tense chase"}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_render_service_bounds_backlog(self):
+        service = RenderService(max_workers=1, max_pending=1)
+        try:
+            # Still sleeping when the second render is submitted.
+            future = service.submit(time.sleep, 1)
+            with self.assertRaises(QueueFull):
+                service.submit(pow, 2, 11)
+            self.assertIsNone(future.result(timeout=30))
+        finally:
+            service.shutdown()
+        self.assertEqual(service.pending, 0)
+
+    @patch('ai.granite_client.GENERATION_CACHE')
+    @patch('ai.granite_client.OLLAMA_CLIENT.session.post')
+    def test_query_ollama_streams_tokens(self, mock_post, mock_cache):
+        from ai.granite_client import query_ollama
+        lines = [json.dumps({"response": "INT. ", "done": False}).encode(),
+                 b"",
+                 json.dumps({"response": "LAB", "done": False}).encode(),
+                 json.dumps({"response": "", "done": True, "eval_count": 2}).encode()]
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_lines.return_value = lines
+        mock_response.__enter__.return_value = mock_response
+        mock_post.return_value = mock_response
+
+        tokens = []
+        text = query_ollama("prompt", on_token=tokens.append, use_cache=False)
+        self.assertEqual(text, "INT. LAB")
+        self.assertEqual(tokens, ["INT. ", "LAB"])
+        self.assertTrue(mock_post.call_args.kwargs['json']['stream'])
+
+    def test_generation_stream_sse(self):
+        stream = TokenStream()
+        stream.append("INT. LAB")
+        stream.append(" - DAY")
+        stream.close()
+        app_module.STREAMS['job-sse'] = stream
+        try:
+            response = self.app.get('/generation-stream/job-sse')
+            body = response.get_data(as_text=True)
+        finally:
+            app_module.STREAMS.pop('job-sse', None)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertIn('data: {"token": "INT. LAB"}', body)
+        self.assertIn('data: {"token": " - DAY"}', body)
+        self.assertTrue(body.rstrip().endswith('event: end\ndata: {}'))
+        self.assertEqual(self.app.get('/generation-stream/missing').status_code, 404)
+
+    def test_job_queue_orders_and_bounds(self):
+        gate = threading.Event()
+        order = []
+        queue = JobQueue(workers=1, max_queued=3, priority_step=4, name="test")
+        queue.submit("blocker", gate.wait, 5)
+        time.sleep(0.05)  # let the worker pick up the blocker
+        queue.submit("long", order.append, "long", priority=2)
+        queue.submit("short", order.append, "short", priority=0)
+        self.assertEqual(queue.position("short"), 1)
+        self.assertEqual(queue.position("long"), 2)
+        self.assertGreater(queue.estimated_wait(2), 0)
+        queue.submit("filler", order.append, "filler")
+        with self.assertRaises(QueueFull):
+            queue.submit("rejected", order.append, "rejected")
+        gate.set()
+        deadline = time.time() + 5
+        while len(order) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(order, ["short", "filler", "long"])
+
+    @patch('app.GENERATION_QUEUE')
+    def test_generate_content_rejects_when_full(self, mock_queue):
+        mock_queue.submit.side_effect = QueueFull()
+        mock_queue.retry_after.return_value = 42
+        response = self.app.post('/generate-content',
+                                 data=json.dumps({"story": "Scientist in a lab"}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '42')
+
+    @patch('app.GENERATION_QUEUE')
+    def test_generation_status_reports_queue_position(self, mock_queue):
+        mock_queue.position.return_value = 3
+        mock_queue.estimated_wait.return_value = 240
+        response = self.app.post('/generate-content',
+                                 data=json.dumps({"story": "Scientist in a lab"}),
+                                 content_type='application/json')
+        job_id = response.json['job_id']
+        status = self.app.get(f'/generation-status/{job_id}').json
+        self.assertEqual(status['status'], 'pending')
+        self.assertEqual(status['queue_position'], 3)
+        self.assertIn("position 3", status['step'])
+
+    def test_generation_status_long_poll_answers_on_step_change(self):
+        job_id = 'job-long-poll'
+        app_module.JOBS.create(job_id, {'status': 'processing', 'step': 'Initializing AI Models...'})
+        self.addCleanup(app_module.JOBS.delete, job_id)
+        threading.Timer(0.2, app_module._set_step, args=(job_id, 'Writing the screenplay...')).start()
+
+        # Off by default: the Flask server answers at once and does not advertise long-polls.
+        response = self.app.get(f'/generation-status/{job_id}?wait=10')
+        self.assertEqual(response.json['step'], 'Initializing AI Models...')
+        self.assertNotIn('X-Long-Poll', response.headers)
+
+        started = time.monotonic()
+        with patch.object(app_module, 'STATUS_LONG_POLL', True):
+            response = self.app.get(f'/generation-status/{job_id}?wait=10')
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(response.json['step'], 'Writing the screenplay...')
+        self.assertEqual(response.headers['X-Long-Poll'], '10')
+        # Without ?wait the status is answered at once, as before.
+        self.assertNotIn('X-Long-Poll', self.app.get(f'/generation-status/{job_id}').headers)
+
+    def test_job_metrics_in_status_and_prometheus(self):
+        def fake_query(prompt, on_token=None, use_cache=True, info=None):
+            info.update(cache="miss", calls=1, prompt_tokens=10, tokens=20, eval_seconds=0.5)
+            return "INT. LAB - DAY\n\nSarah works."
+
+        self.temp_content()
+        job_id = 'job-metrics'
+        app_module.JOBS.create(job_id, {'status': 'pending', 'created_at': time.time(), 'step': 'Queued'})
+        with patch('ai.granite_client.query_ollama', side_effect=fake_query):
+            app_module.process_generation_job(job_id, {"story": "Scientist in a lab"})
+
+        status = self.app.get(f'/generation-status/{job_id}').json
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(status['metrics']['stages']['screenplay']['tokens_per_second'], 40.0)
+        self.assertIn('clean_seconds', status['metrics'])
+
+        response = self.app.get('/metrics')
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        body = response.get_data(as_text=True)
+        self.assertIn('# TYPE draftroom_generation_stage_seconds histogram', body)
+        self.assertIn('draftroom_generation_stage_seconds_bucket{stage="synopsis",le="+Inf"}', body)
+        self.assertRegex(body, r'draftroom_ollama_tokens_total\{stage="screenplay",kind="generated"\} \d+')
+        self.assertRegex(body, r'draftroom_generation_jobs_total\{status="completed"\} [1-9]')
+
 if __name__ == '__main__':
     unittest.main()
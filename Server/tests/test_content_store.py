@@ -0,0 +1,110 @@
+import unittest
+import sys
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from utils.content_store import ContentStore
+import app as app_module
+
+CONTENT = {
+    "screenplay": "INT. LAB - DAY\n\nSarah mixes chemicals.\n" * 200,
+    "characters": "SARAH: a chemist.",
+    "sound_design": "Bubbling flasks.",
+    "meta": {"status": "success"},
+}
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ContentStore(os.path.join(self.tmp, "content.sqlite3"), ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip_and_field_subset(self):
+        content_id = self.store.put(CONTENT)
+        self.assertEqual(self.store.get(content_id), CONTENT)
+        self.assertEqual(self.store.get(content_id, ("characters",)), {"characters": "SARAH: a chemist."})
+        self.assertIsNone(self.store.get("missing"))
+        # Repeated text compresses well.
+        stats = self.store.stats()
+        self.assertLess(stats["stored_bytes"], stats["bytes"] / 10)
+
+    def test_fields_are_deduplicated(self):
+        self.store.put(CONTENT)
+        self.store.put(dict(CONTENT, characters="MARCUS: a rival."))
+        self.assertEqual(self.store.stats()["blobs"], 5)
+
+    def test_update_is_copy_on_write(self):
+        old_id = self.store.put(CONTENT)
+        new_id = self.store.update(old_id, screenplay="INT. VAULT - NIGHT")
+        self.assertNotEqual(old_id, new_id)
+        self.assertEqual(self.store.get(old_id), CONTENT)
+        self.assertEqual(self.store.get(new_id), dict(CONTENT, screenplay="INT. VAULT - NIGHT"))
+        self.assertIsNone(self.store.update("missing", screenplay="x"))
+
+    def test_reads_do_not_wait_for_a_writer(self):
+        content_id = self.store.put(CONTENT)
+        writer = sqlite3.connect(self.store.path, isolation_level=None)
+        writer.execute("BEGIN IMMEDIATE")  # another worker storing a script
+        try:
+            started = time.monotonic()
+            self.assertEqual(self.store.get(content_id, ["characters"]), {"characters": CONTENT["characters"]})
+            self.assertEqual(self.store.stats()["contents"], 1)
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute("ROLLBACK")
+            writer.close()
+
+    def test_get_refreshes_expiry_past_half_life(self):
+        content_id = self.store.put(CONTENT)
+        db = sqlite3.connect(self.store.path)
+        expiry = lambda: db.execute("SELECT expires_at FROM contents WHERE id = ?", (content_id,)).fetchone()[0]
+        with db:
+            db.execute("UPDATE contents SET expires_at = ? WHERE id = ?", (time.time() + 10, content_id))
+        self.store.get(content_id)
+        self.assertGreater(expiry(), time.time() + 50)
+        db.close()
+
+    def test_sweep_drops_expired_contents_and_orphan_blobs(self):
+        store = ContentStore(os.path.join(self.tmp, "short.sqlite3"), ttl=0.05)
+        old_id = store.put(CONTENT)
+        time.sleep(0.1)
+        kept_id = store.put(dict(CONTENT, characters="MARCUS: a rival."))
+        self.assertIsNone(store.get(old_id))
+        self.assertEqual(store.sweep(), 1)
+        stats = store.stats()
+        self.assertEqual((stats["contents"], stats["blobs"]), (1, 4))
+        self.assertEqual(store.get(kept_id)["characters"], "MARCUS: a rival.")
+
+    def test_session_cookie_holds_only_the_content_id(self):
+        client = app_module.app.test_client()
+        with patch.object(app_module, 'CONTENT', self.store), \
+             patch('ai.granite_client.improve_screenplay', return_value="INT. VAULT - NIGHT\n\nRain."):
+            content_id = self.store.put(CONTENT)
+            with client.session_transaction() as sess:
+                sess['content_id'] = content_id
+            response = client.post('/improve-script', json={'answers': {'Where?': 'A vault'}})
+            self.assertEqual(response.get_json()['screenplay'], "INT. VAULT - NIGHT\n\nRain.")
+            with client.session_transaction() as sess:
+                self.assertEqual(set(sess), {'content_id'})
+                self.assertNotEqual(sess['content_id'], content_id)
+                new_id = sess['content_id']
+            self.assertEqual(self.store.get(new_id)['characters'], CONTENT['characters'])
+            self.assertEqual(self.store.get(content_id)['screenplay'], CONTENT['screenplay'])
+
+            download = client.get('/download/txt')
+            self.assertIn(b"INT. VAULT - NIGHT", download.get_data())
+            self.assertLess(len(client.get_cookie('session').value), 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+import sys
+import os
+import time
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+from unittest.mock import patch
+from docx import Document
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from exports.pdf_export import generate_pdf
+from exports.docx_export import generate_docx
+from exports.bundle import stream_zip, BLOCK_SIZE
+from utils.render_service import RenderService
+from utils.job_store import MemoryJobStore
+from utils.artifact_store import ArtifactStore
+from utils.content_store import ContentStore
+import app as app_module
+
+CONTENT = {
+    'screenplay': "INT. LAB - DAY\n\nSARAH mixes chemicals & hums.\n\nSARAH\nIt's <working>.\n",
+    'characters': "SARAH: a chemist & a <genius>.",
+    'sound_design': "Bubbling flasks.",
+}
+
+class TestExports(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.client = app_module.app.test_client()
+        self.content = ContentStore(os.path.join(self.tmp, "content.sqlite3"))
+        self.exports = ArtifactStore(os.path.join(self.tmp, "exports"))
+        self.patches = [patch.object(app_module, 'CONTENT', self.content),
+                        patch.object(app_module, 'EXPORT_ARTIFACTS', self.exports)]
+        for p in self.patches:
+            p.start()
+        with self.client.session_transaction() as sess:
+            sess['content_id'] = self.content.put(CONTENT)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmp)
+
+    def test_pdf_is_deterministic(self):
+        self.assertEqual(generate_pdf(CONTENT).getvalue(), generate_pdf(CONTENT).getvalue())
+
+    def test_pdf_rendered_once_per_content(self):
+        with patch.object(app_module, 'generate_pdf', side_effect=generate_pdf) as render:
+            first = self.client.get('/download/pdf')
+            self.assertEqual(first.status_code, 200)
+            self.assertTrue(first.get_data().startswith(b'%PDF'))
+            self.assertIn('draftroom_export.pdf', first.headers['Content-Disposition'])
+            self.assertEqual(first.headers['Cache-Control'], 'no-cache')
+
+            again = self.client.get('/download/pdf')
+            self.assertEqual(again.get_data(), first.get_data())
+            revalidated = self.client.get('/download/pdf', headers={'If-None-Match': first.headers['ETag']})
+            self.assertEqual(revalidated.status_code, 304)
+
+            # A share of the same content reuses the same file.
+            share_id = 'share-1'
+            app_module.SHARED_SCRIPTS.create(share_id, {'status': 'shared', 'content_id':
+                                                        self.content.put(CONTENT), 'created_at': time.time()})
+            shared = self.client.get(f'/share/{share_id}/download/pdf')
+            self.assertEqual(shared.get_data(), first.get_data())
+        self.assertEqual(render.call_count, 1)
+        files = os.listdir(self.exports.directory)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.pdf'))
+
+    def test_docx_uses_template_styles_and_cache(self):
+        with patch.object(app_module, 'generate_docx', side_effect=generate_docx) as render:
+            first = self.client.get('/download/docx')
+            again = self.client.get('/download/docx')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(again.get_data(), first.get_data())
+        document = Document(BytesIO(first.get_data()))
+        texts = [p.text for p in document.paragraphs]
+        styles = [p.style.name for p in document.paragraphs]
+        start = texts.index('Screenplay') + 1
+        self.assertEqual(styles[start:start + 4], ['Scene Heading', 'Action', 'Character', 'Dialogue'])
+        self.assertIn("It's <working>.", texts)
+
+    def test_stream_zip_holds_one_block_at_a_time(self):
+        path = os.path.join(self.tmp, "drama.mp3")
+        with open(path, "wb") as f:
+            f.write(os.urandom(5 * BLOCK_SIZE))
+        chunks = list(stream_zip([("audio/drama.mp3", path)]))
+        self.assertLessEqual(max(len(c) for c in chunks), BLOCK_SIZE + 1024)
+        with zipfile.ZipFile(BytesIO(b"".join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            with open(path, "rb") as f:
+                self.assertEqual(archive.read("audio/drama.mp3"), f.read())
+
+    def test_bundle_renders_exports_and_adds_cached_audio(self):
+        narration = ArtifactStore(os.path.join(self.tmp, "audio"))
+        music = ArtifactStore(os.path.join(self.tmp, "music"))
+        renderer = RenderService(max_workers=2)
+        with patch.object(app_module, 'NARRATION_ARTIFACTS', narration), \
+             patch.object(app_module, 'MUSIC_ARTIFACTS', music), \
+             patch.object(app_module, 'SCORES', MemoryJobStore()), \
+             patch.object(app_module, 'EXPORT_RENDERER', renderer), \
+             patch.object(app_module, 'MUSIC_RENDERER') as music_renderer:
+            with self.client.session_transaction() as sess:
+                content = self.content.get(sess['content_id'])
+            _, key = app_module._narration_request(content, 'screenplay', False)
+            with open(narration.path(key, '.mp3'), 'wb') as f:
+                f.write(b"\xff\xfb" * 100)
+            narration.add(narration.path(key, '.mp3'))
+            # A score composed for this script earlier in the session.
+            self.client.post('/generate-music', json={'description': 'Cinematic score for: INT. LAB'})
+            filename = music_renderer.submit.call_args[0][4]
+            with open(os.path.join(music.directory, filename), 'wb') as f:
+                f.write(b"RIFF" + bytes(100))
+            music.add(os.path.join(music.directory, filename))
+
+            response = self.client.get('/download/bundle')
+            renderer.shutdown()
+
+        self.assertEqual(response.mimetype, 'application/zip')
+        with zipfile.ZipFile(BytesIO(response.get_data())) as archive:
+            self.assertEqual(sorted(archive.namelist()), [
+                'audio/audio_drama.mp3', 'draftroom_export.docx', 'draftroom_export.pdf',
+                'draftroom_export.txt', 'score/scene_01.wav'])
+            self.assertTrue(archive.read('draftroom_export.pdf').startswith(b'%PDF'))
+            self.assertIn(b"SARAH", archive.read('draftroom_export.txt'))
+        # The renders went through the export cache.
+        self.assertEqual(self.exports.stats()['files'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
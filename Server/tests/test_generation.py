@@ -0,0 +1,328 @@
+import unittest
+import sys
+import os
+import time
+import threading
+from unittest.mock import patch, MagicMock
+import requests
+import tempfile
+import shutil
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from ai.task_graph import run_task_graph
+from ai import granite_client
+from ai.inference_client import InferenceClient, BackendUnavailable
+from ai.generation_cache import GenerationCache
+from utils.screenplay_parser import split_scenes
+from ai.chunking import chunk_screenplay, estimate_tokens
+
+class TestTaskGraph(unittest.TestCase):
+
+    def test_runs_independent_tasks_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        def independent(_):
+            barrier.wait()  # deadlocks unless both run at the same time
+            return "ok"
+
+        results, timings = run_task_graph({
+            "a": (independent, []),
+            "b": (independent, []),
+            "c": (lambda deps: deps["a"] + deps["b"], ["a", "b"]),
+        }, max_workers=2)
+        self.assertEqual(results, {"a": "ok", "b": "ok", "c": "okok"})
+        self.assertEqual(set(timings), {"a", "b", "c"})
+
+    def test_failed_task_yields_none(self):
+        def boom(_):
+            raise RuntimeError("boom")
+        results, _ = run_task_graph({
+            "a": (boom, []),
+            "b": (lambda deps: deps["a"] is None, ["a"]),
+        })
+        self.assertEqual(results, {"a": None, "b": True})
+
+    def test_rejects_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            run_task_graph({"a": (lambda _: 1, ["missing"])})
+
+class TestGenerateStoryContent(unittest.TestCase):
+
+    @patch('ai.granite_client.query_ollama')
+    def test_synopsis_waits_for_screenplay(self, mock_query):
+        def fake_query(prompt, on_token=None, **kwargs):
+            if "screenwriter" in prompt:
+                time.sleep(0.05)
+                return "INT. LAB - DAY"
+            if "script reader" in prompt:
+                self.assertIn("INT. LAB - DAY", prompt)
+                return "Logline: A lab."
+            return "profile"
+        mock_query.side_effect = fake_query
+
+        results = granite_client.generate_story_content("A scientist", "Drama")
+        self.assertEqual(results["meta"]["status"], "success")
+        self.assertEqual(results["synopsis"], "Logline: A lab.")
+        self.assertEqual(set(results["meta"]["timings"]),
+                         {"screenplay", "characters", "sound_design", "synopsis", "total"})
+
+    @patch('ai.granite_client.query_ollama')
+    def test_progress_and_stage_stats(self, mock_query):
+        def fake_query(prompt, on_token=None, info=None, **kwargs):
+            info.update(cache="miss", calls=1, prompt_tokens=100, tokens=50, eval_seconds=2.0)
+            return "INT. LAB - DAY"
+        mock_query.side_effect = fake_query
+        events = []
+        results = granite_client.generate_story_content(
+            "A scientist", on_progress=lambda stage, event, stats: events.append((stage, event)))
+
+        stages = results["meta"]["stages"]
+        self.assertEqual(set(stages), {"screenplay", "characters", "sound_design", "synopsis"})
+        self.assertEqual(stages["screenplay"]["tokens_per_second"], 25.0)
+        self.assertEqual(stages["synopsis"]["cache"], "miss")
+        for stage in stages:
+            self.assertLess(events.index((stage, "started")), events.index((stage, "finished")))
+        self.assertLess(events.index(("screenplay", "finished")), events.index(("synopsis", "started")))
+
+    @patch('ai.granite_client.OLLAMA_CLIENT.post')
+    def test_query_ollama_reports_eval_counters(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200)
+        mock_post.return_value.json.return_value = {
+            "response": "text", "prompt_eval_count": 40, "prompt_eval_duration": 500_000_000,
+            "eval_count": 120, "eval_duration": 4_000_000_000}
+        info = {}
+        granite_client.query_ollama("p", use_cache=False, info=info)
+        self.assertEqual((info["prompt_tokens"], info["tokens"]), (40, 120))
+        self.assertEqual((info["prompt_seconds"], info["eval_seconds"]), (0.5, 4.0))
+        self.assertEqual(granite_client.add_stats({}, info)["tokens_per_second"], 30.0)
+
+    @patch('ai.granite_client.query_ollama', return_value=None)
+    def test_failed_screenplay(self, mock_query):
+        results = granite_client.generate_story_content("A scientist")
+        self.assertEqual(results["meta"]["status"], "failed_screenplay")
+        self.assertIsNone(results["synopsis"])
+
+SCRIPT = """TITLE: THE LAB
+
+INT. LAB - DAY
+
+SARAH mixes chemicals. The beaker smokes.
+
+EXT. PARKING LOT - NIGHT
+
+MARCUS waits by his car, checking his watch.
+
+INT. SARAH'S APARTMENT - NIGHT
+
+Sarah stares at the formula. She finally smiles.
+"""
+
+class TestSceneImprovement(unittest.TestCase):
+
+    def test_split_scenes_tiles_text(self):
+        scenes = split_scenes(SCRIPT)
+        self.assertEqual([sc.heading for sc in scenes],
+                         ["", "INT. LAB - DAY", "EXT. PARKING LOT - NIGHT", "INT. SARAH'S APARTMENT - NIGHT"])
+        self.assertEqual("".join(sc.text(SCRIPT) for sc in scenes), SCRIPT)
+        self.assertEqual(split_scenes("**INT. ROOM - DAY**\nAction.")[0].heading, "INT. ROOM - DAY")
+
+    def test_map_feedback_to_scenes(self):
+        scenes = split_scenes(SCRIPT)
+        targets = granite_client.map_feedback_to_scenes(SCRIPT, scenes, {
+            "Is the ending earned?": "Make it bittersweet.",
+            "What does Marcus want?": "Marcus waits because he owes money; show it at his car.",
+            "Is the tone consistent?": "Darker overall.",
+        })
+        self.assertEqual(targets[3][0][0], "Is the ending earned?")
+        self.assertIn(("What does Marcus want?", "Marcus waits because he owes money; show it at his car."), targets[2])
+        self.assertNotIn(0, targets)  # the title block is never rewritten
+        self.assertEqual(sorted(i for i, pairs in targets.items()
+                                if ("Is the tone consistent?", "Darker overall.") in pairs), [1, 2, 3])
+
+    @patch('ai.granite_client.query_ollama')
+    def test_improve_only_rewrites_targeted_scenes(self, mock_query):
+        def fake_query(prompt, **kwargs):
+            self.assertNotIn("Original Screenplay", prompt)
+            return "Here is the revised scene:\nEXT. PARKING LOT - NIGHT\n\nMARCUS paces, sweating."
+        mock_query.side_effect = fake_query
+
+        long_script = SCRIPT + "\n".join(f"INT. HALL {i} - DAY\n\nFiller action {i}.\n" for i in range(400))
+        improved = granite_client.improve_screenplay(long_script, {"What does Marcus want?": "Marcus waits for his car money."})
+
+        self.assertEqual(mock_query.call_count, 1)
+        self.assertIn("MARCUS paces, sweating.", improved)
+        self.assertNotIn("checking his watch", improved)
+        self.assertNotIn("Here is", improved)
+        self.assertTrue(improved.startswith(SCRIPT.split("EXT. PARKING")[0]))
+        self.assertTrue(improved.endswith("Filler action 399.\n"))
+
+LONG_SCRIPT = "".join(
+    f"INT. ROOM {i} - DAY\n\nSARAH searches room {i} for the key.\n\nSARAH\nNot here either.\n\n"
+    for i in range(200)
+) + "EXT. ROOFTOP - DAWN\n\nSarah finds the key. THE END.\n"
+
+class TestChunking(unittest.TestCase):
+
+    def test_chunks_tile_text_within_budget(self):
+        chunks = chunk_screenplay(LONG_SCRIPT, 400)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(c.text(LONG_SCRIPT) for c in chunks), LONG_SCRIPT)
+        for chunk in chunks:
+            self.assertLessEqual(estimate_tokens(LONG_SCRIPT, chunk.start, chunk.end), 400)
+            # Scene-aligned: every chunk starts on a heading.
+            self.assertTrue(chunk.text(LONG_SCRIPT).startswith("INT.") or chunk.heading.startswith("EXT."))
+
+    def test_oversized_scene_is_split_on_paragraphs(self):
+        scene = "INT. HALL - DAY\n\n" + "\n\n".join(f"Paragraph {i} of action." for i in range(200))
+        chunks = chunk_screenplay(scene, 100)
+        self.assertEqual(chunks[0].heading, "INT. HALL - DAY")
+        self.assertTrue(all(c.text(scene).endswith(("\n\n", "action.")) for c in chunks))
+
+    @patch('ai.granite_client.query_ollama')
+    def test_condense_maps_chunks_concurrently_and_keeps_ending(self, mock_query):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+        def fake_query(prompt, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return "The key turns up at dawn." if "THE END" in prompt else "Sarah searches."
+        mock_query.side_effect = fake_query
+
+        with patch.object(granite_client, 'OLLAMA_NUM_PARALLEL', 3):
+            digest = granite_client.condense_screenplay(LONG_SCRIPT, max_tokens=1000)
+
+        self.assertGreater(mock_query.call_count, 3)
+        self.assertEqual(peak[0], 3)
+        self.assertIn("The key turns up at dawn.", digest)
+        self.assertLessEqual(estimate_tokens(digest), 1000)
+        # Short scripts go through untouched.
+        self.assertEqual(granite_client.condense_screenplay("INT. LAB - DAY", max_tokens=1000), "INT. LAB - DAY")
+
+    @patch('ai.granite_client.query_ollama')
+    def test_followups_see_the_ending_of_long_scripts(self, mock_query):
+        prompts = []
+        def fake_query(prompt, **kwargs):
+            prompts.append(prompt)
+            return "Finale at dawn." if "THE END" in prompt else "1. Is the ending earned?"
+        mock_query.side_effect = fake_query
+
+        with patch.object(granite_client, 'CHUNK_TOKENS', 1000):
+            questions = granite_client.generate_followup_questions(LONG_SCRIPT)
+
+        self.assertEqual(questions, ["1. Is the ending earned?"])
+        self.assertIn("Finale at dawn.", prompts[-1])
+
+class TestGenerationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_key_covers_model_and_options(self):
+        key = GenerationCache.make_key("prompt", "m1", {"temperature": 0.7})
+        self.assertEqual(key, GenerationCache.make_key("prompt", "m1", {"temperature": 0.7}))
+        self.assertNotEqual(key, GenerationCache.make_key("prompt", "m2", {"temperature": 0.7}))
+        self.assertNotEqual(key, GenerationCache.make_key("prompt", "m1", {"temperature": 0.2}))
+
+    def test_disk_tier_survives_restart(self):
+        GenerationCache(self.directory).put("abc123", "INT. LAB - DAY")
+        cache = GenerationCache(self.directory)
+        self.assertEqual(cache.get("abc123"), "INT. LAB - DAY")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_ttl_expiry(self):
+        cache = GenerationCache(self.directory, ttl=0)
+        cache.put("abc123", "text")
+        self.assertIsNone(cache.get("abc123"))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_size_eviction_drops_least_recently_used(self):
+        cache = GenerationCache(self.directory, max_bytes=400, memory_entries=0)
+        cache.put("aa1", "x" * 100)
+        cache.put("bb2", "y" * 100)
+        os.utime(cache._path("aa1"), (1, 1))  # make aa1 the oldest
+        cache.put("cc3", "z" * 100)
+        self.assertIsNone(cache.get("aa1"))
+        self.assertEqual(cache.get("cc3"), "z" * 100)
+
+    @patch('ai.granite_client.OLLAMA_CLIENT.post')
+    def test_query_ollama_uses_cache(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200)
+        mock_post.return_value.json.return_value = {"response": "fresh"}
+        with patch.object(granite_client, 'GENERATION_CACHE', GenerationCache(self.directory)):
+            info = {}
+            self.assertEqual(granite_client.query_ollama("p", info=info), "fresh")
+            self.assertEqual(info["cache"], "miss")
+            self.assertEqual(granite_client.query_ollama("p", info=info), "fresh")
+            self.assertEqual(info["cache"], "hit")
+            granite_client.query_ollama("p", use_cache=False, info=info)
+            self.assertEqual(info["cache"], "bypass")
+        self.assertEqual(mock_post.call_count, 2)
+
+class TestInferenceClient(unittest.TestCase):
+
+    def make_client(self, **kwargs):
+        client = InferenceClient("test", timeout=1, **kwargs)
+        client.delays = []
+        client._sleep = client.delays.append
+        client.session.post = MagicMock()
+        return client
+
+    def test_retries_busy_backend_with_backoff(self):
+        client = self.make_client(max_retries=3, backoff_base=1.0, backoff_max=8.0)
+        busy = MagicMock(status_code=503, headers={})
+        ok = MagicMock(status_code=200, headers={})
+        client.session.post.side_effect = [busy, busy, ok]
+
+        self.assertIs(client.post("http://backend"), ok)
+        self.assertEqual(len(client.delays), 2)
+        self.assertLessEqual(client.delays[1], 2.0)
+        self.assertEqual(client.session.post.call_args.kwargs['timeout'], 1)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_honours_retry_after(self):
+        client = self.make_client(max_retries=1)
+        client.session.post.side_effect = [MagicMock(status_code=429, headers={"Retry-After": "3"}),
+                                           MagicMock(status_code=200, headers={})]
+        client.post("http://backend")
+        self.assertEqual(client.delays, [3.0])
+
+    def test_circuit_opens_and_fails_fast(self):
+        client = self.make_client(max_retries=1, failure_threshold=2, reset_timeout=60)
+        client.session.post.side_effect = requests.exceptions.ConnectionError("refused")
+
+        for _ in range(2):
+            with self.assertRaises(BackendUnavailable):
+                client.post("http://backend")
+        self.assertEqual(client.breaker.state, "open")
+
+        calls = client.session.post.call_count
+        with self.assertRaises(BackendUnavailable):
+            client.post("http://backend")
+        self.assertEqual(client.session.post.call_count, calls)
+
+    def test_pool_sized_for_concurrency_unless_overridden(self):
+        from ai import inference_client
+        self.assertEqual(self.make_client(pool_size=3).pool_size, 3)
+        with patch.object(inference_client, 'POOL_SIZE', 12):
+            self.assertEqual(self.make_client(pool_size=3).pool_size, 12)
+        self.assertEqual(granite_client.OLLAMA_CLIENT.pool_size, granite_client.OLLAMA_NUM_PARALLEL)
+
+    def test_half_open_trial_closes_circuit(self):
+        client = self.make_client(max_retries=0, failure_threshold=1, reset_timeout=0)
+        client.session.post.side_effect = [requests.exceptions.ConnectionError("refused"),
+                                           MagicMock(status_code=200, headers={})]
+        with self.assertRaises(BackendUnavailable):
+            client.post("http://backend")
+        self.assertEqual(client.breaker.state, "half_open")
+        client.post("http://backend")
+        self.assertEqual(client.breaker.state, "closed")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+import shutil
+import sqlite3
+import threading
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.job_store import JobStore, MemoryJobStore, SQLiteJobStore
+from utils.job_events import JobEvents
+
+class JobStoreContract:
+    """Behaviour every JobStore backend must provide."""
+
+    def make_store(self, ttl=60, max_entries=100):
+        raise NotImplementedError
+
+    def test_create_get_update_delete(self):
+        store = self.make_store()
+        store.create('job', {'status': 'pending', 'step': 'Queued'})
+        self.assertTrue(store.update('job', step='Writing'))
+        self.assertEqual(store.get('job'), {'status': 'pending', 'step': 'Writing'})
+        self.assertTrue(store.delete('job'))
+        self.assertIsNone(store.get('job'))
+        self.assertFalse(store.update('job', step='Gone'))
+
+    def test_transition_is_conditional(self):
+        store = self.make_store()
+        store.create('job', {'status': 'pending'})
+        self.assertTrue(store.transition('job', ['pending'], 'processing'))
+        self.assertFalse(store.transition('job', ['pending'], 'processing'))
+        self.assertTrue(store.transition('job', ['processing'], 'completed', results={'a': 1}))
+        self.assertEqual(store.get('job'), {'status': 'completed', 'results': {'a': 1}})
+
+    def test_only_one_concurrent_transition_wins(self):
+        store = self.make_store()
+        store.create('job', {'status': 'pending'})
+        wins = []
+        def claim():
+            if store.transition('job', ['pending'], 'processing'):
+                wins.append(1)
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(len(wins), 1)
+
+    def test_expiry_and_sweep(self):
+        store = self.make_store(ttl=0.05)
+        store.create('old', {'status': 'pending'})
+        store.create('new', {'status': 'pending'}, ttl=60)
+        time.sleep(0.1)
+        self.assertIsNone(store.get('old'))
+        store.sweep()
+        self.assertEqual(len(store), 1)
+        self.assertIsNotNone(store.get('new'))
+
+    def test_max_entries_drops_oldest(self):
+        store = self.make_store(max_entries=2)
+        for key in ['a', 'b', 'c']:
+            store.create(key, {'status': 'pending'})
+            time.sleep(0.01)
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(len(store), 2)
+
+class TestMemoryJobStore(JobStoreContract, unittest.TestCase):
+
+    def make_store(self, ttl=60, max_entries=100):
+        return MemoryJobStore(ttl, max_entries)
+
+class TestIncompleteStore(unittest.TestCase):
+
+    def test_missing_methods_fail_at_construction(self):
+        class NoSweep(JobStore):
+            def create(self, key, record, ttl=None): pass
+            def get(self, key): pass
+            def update(self, key, **fields): pass
+            def transition(self, key, from_statuses, to_status, **fields): pass
+            def delete(self, key): pass
+        with self.assertRaises(TypeError):
+            NoSweep()
+
+class TestSQLiteJobStore(JobStoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def make_store(self, ttl=60, max_entries=100):
+        return SQLiteJobStore(os.path.join(self.directory, 'jobs.sqlite3'), 'jobs', ttl, max_entries)
+
+    def test_shared_between_instances(self):
+        first = self.make_store()
+        first.create('job', {'status': 'pending'})
+        second = self.make_store()
+        self.assertTrue(second.transition('job', ['pending'], 'processing'))
+        self.assertEqual(first.get('job')['status'], 'processing')
+
+    def test_reads_do_not_wait_for_a_writer(self):
+        store = self.make_store()
+        store.create('job', {'status': 'pending'})
+        writer = sqlite3.connect(os.path.join(self.directory, 'jobs.sqlite3'), isolation_level=None)
+        writer.execute("BEGIN IMMEDIATE")  # another worker mid-transition
+        try:
+            started = time.monotonic()
+            self.assertEqual(store.get('job')['status'], 'pending')
+            self.assertEqual(len(store), 1)
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute("ROLLBACK")
+            writer.close()
+
+class TestJobEvents(unittest.TestCase):
+
+    def test_wait_wakes_on_notify(self):
+        events = JobEvents()
+        version = events.version('job')
+        threading.Timer(0.05, events.notify, args=('job',)).start()
+        started = time.monotonic()
+        self.assertNotEqual(events.wait('job', version, timeout=5), version)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_other_jobs_do_not_wake_but_global_notify_does(self):
+        events = JobEvents()
+        version = events.version('job')
+        events.notify('other')
+        self.assertEqual(events.wait('job', version, timeout=0.05), version)
+        events.notify()
+        self.assertNotEqual(events.wait('job', version, timeout=0.05), version)
+
+if __name__ == '__main__':
+    unittest.main()
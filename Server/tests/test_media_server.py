@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from utils.artifact_store import ArtifactStore
+import app as app_module
+
+class TestMediaServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.data = bytes(range(256)) * 4000  # ~1 MB
+        with open(os.path.join(self.tmp, "abc.mp3"), "wb") as f:
+            f.write(self.data)
+        patcher = patch.object(app_module, 'NARRATION_ARTIFACTS', ArtifactStore(self.tmp))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_full_response_has_content_etag_and_immutable_cache(self):
+        response = self.client.get('/audio/abc.mp3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), self.data)
+        self.assertIn("immutable", response.headers['Cache-Control'])
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        etag = response.headers['ETag']
+
+        cached = self.client.get('/audio/abc.mp3', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.get_data(), b"")
+
+    def test_repeat_hits_keep_etag_memo_and_last_modified(self):
+        path = os.path.join(self.tmp, "abc.mp3")
+        store = app_module.NARRATION_ARTIFACTS
+        first = self.client.get('/audio/abc.mp3')
+        with patch('utils.media_server.hashlib.sha256', side_effect=AssertionError("re-hashed")):
+            for _ in range(3):
+                self.assertEqual(store.get("abc", ".mp3"), path)
+                again = self.client.get('/audio/abc.mp3')
+                self.assertEqual(again.headers['ETag'], first.headers['ETag'])
+                self.assertEqual(again.headers['Last-Modified'], first.headers['Last-Modified'])
+
+    def test_range_requests(self):
+        response = self.client.get('/audio/abc.mp3', headers={'Range': 'bytes=500000-500099'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), self.data[500000:500100])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 500000-500099/{len(self.data)}')
+
+        tail = self.client.get('/audio/abc.mp3', headers={'Range': 'bytes=-10'})
+        self.assertEqual(tail.get_data(), self.data[-10:])
+
+        bad = self.client.get('/audio/abc.mp3', headers={'Range': f'bytes={len(self.data) + 5}-'})
+        self.assertEqual(bad.status_code, 416)
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        response = self.client.get('/audio/abc.mp3', headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_data()), len(self.data))
+
+    def test_rejects_paths_outside_directory(self):
+        self.assertEqual(self.client.get('/audio/..%2Fapp.py').status_code, 404)
+        self.assertEqual(self.client.get('/audio/missing.mp3').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
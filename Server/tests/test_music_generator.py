@@ -0,0 +1,83 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from ai.music_generator import (SAMPLE_RATE, ROOM_PRESETS, karplus_strong, karplus_strong_batch,
+                                apply_reverb, generate_local_track, ToneBank)
+# The original per-sample loops, which the vectorized versions must match.
+from benchmarks.bench_synth import karplus_strong_loop, apply_reverb_loop
+
+class TestMusicGenerator(unittest.TestCase):
+
+    def test_karplus_strong_matches_loop(self):
+        for freq in [130.81, 261.63, 987.77]:
+            np.random.seed(7)
+            expected = karplus_strong_loop(freq, 0.5)
+            np.random.seed(7)
+            actual = karplus_strong(freq, 0.5)
+            self.assertEqual(len(actual), len(expected))
+            np.testing.assert_allclose(actual, expected, atol=1e-12)
+
+    def test_chord_batch_matches_single_notes(self):
+        chord = [196.00, 246.94, 293.66]
+        np.random.seed(3)
+        expected = [karplus_strong_loop(f, 0.5) for f in chord]
+        np.random.seed(3)
+        actual = karplus_strong_batch(chord, 0.5)
+        self.assertEqual(actual.shape, (3, int(SAMPLE_RATE * 0.5)))
+        np.testing.assert_allclose(actual, np.array(expected), atol=1e-12)
+
+    def test_reverb_matches_loop(self):
+        np.random.seed(11)
+        audio = np.random.uniform(-1, 1, SAMPLE_RATE)
+        for preset in ROOM_PRESETS.values():
+            expected = apply_reverb_loop(audio, preset['delay_ms'], preset['decay'])
+            actual = apply_reverb(audio, preset['delay_ms'], preset['decay'], keep_tail=False)
+            np.testing.assert_allclose(actual, expected, atol=1e-12)
+
+    def test_reverb_keeps_decaying_tail(self):
+        impulse = np.zeros(SAMPLE_RATE // 10)
+        impulse[0] = 1.0
+        out = apply_reverb(impulse, preset='hall')
+        delay = int(SAMPLE_RATE * ROOM_PRESETS['hall']['delay_ms'] / 1000)
+        self.assertGreater(len(out), len(impulse))
+        echoes = out[::delay]
+        self.assertTrue(np.all(np.diff(echoes) < 0))
+        self.assertLess(echoes[-1], 1e-3 * 2)
+
+    def test_tone_bank_variants_and_counters(self):
+        bank = ToneBank(variants=2)
+        tones = [bank.get(440.0, 0.25) for _ in range(5)]
+        stats = bank.stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['keys'], 1)
+        self.assertFalse(tones[0].flags.writeable)
+        self.assertFalse(np.array_equal(tones[0], tones[1]))
+
+    def test_tone_bank_lru_eviction(self):
+        tone_bytes = int(SAMPLE_RATE * 0.25) * 4
+        bank = ToneBank(max_bytes=tone_bytes * 2, variants=1)
+        bank.get(220.0, 0.25)
+        bank.get(330.0, 0.25)
+        bank.get(220.0, 0.25)  # refresh 220 so 330 is the oldest
+        bank.get(440.0, 0.25)
+        stats = bank.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['bytes'], bank.max_bytes)
+        bank.get(220.0, 0.25)
+        self.assertEqual(bank.stats()['hits'], 2)
+
+    def test_local_track(self):
+        audio = generate_local_track("a sad rainy evening", duration=3)
+        self.assertEqual(audio.dtype, np.int16)
+        self.assertGreaterEqual(len(audio), SAMPLE_RATE * 3)
+        self.assertGreater(np.max(np.abs(audio)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import zipfile
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from utils.screenplay_parser import (
+    parse_screenplay, get_screenplay, Screenplay, format_plain_text, narration_text
+)
+from exports.pdf_export import generate_pdf
+from exports.docx_export import generate_docx
+
+SCRIPT = """TITLE: THE LAB
+
+**INT. LAB - DAY**
+
+SARAH mixes chemicals & hums.
+
+SARAH (V.O.)
+(whispering)
+It's <working>.
+
+MARCUS: Don't touch that!
+
+CUT TO:
+
+EXT. PARKING LOT - NIGHT
+
+Rain.
+"""
+
+class TestScreenplayParser(unittest.TestCase):
+
+    def test_element_kinds(self):
+        doc = parse_screenplay(SCRIPT)
+        self.assertEqual(list(doc), [
+            ('action', 'TITLE: THE LAB'),
+            ('heading', 'INT. LAB - DAY'),
+            ('action', 'SARAH mixes chemicals & hums.'),
+            ('character', 'SARAH (V.O.)'),
+            ('parenthetical', '(whispering)'),
+            ('dialogue', "It's <working>."),
+            ('character', 'MARCUS'),
+            ('dialogue', "Don't touch that!"),
+            ('transition', 'CUT TO:'),
+            ('heading', 'EXT. PARKING LOT - NIGHT'),
+            ('action', 'Rain.'),
+        ])
+        self.assertEqual(doc.characters(), ['SARAH', 'MARCUS'])
+
+    def test_spans_round_trip_and_reject_other_text(self):
+        doc = parse_screenplay(SCRIPT)
+        encoded = doc.to_spans()
+        restored = Screenplay.from_spans(SCRIPT, encoded)
+        self.assertEqual(list(restored), list(doc))
+        self.assertIsNone(Screenplay.from_spans(SCRIPT.replace("Rain", "Snow"), encoded))
+
+    def test_get_screenplay_uses_cached_spans(self):
+        encoded = parse_screenplay(SCRIPT).to_spans()
+        # A doctored cache proves the spans were reused rather than reparsed.
+        encoded['spans'][:3] = [1, 0, 5]
+        doc = get_screenplay({'screenplay': SCRIPT, 'screenplay_doc': encoded})
+        self.assertEqual(next(iter(doc)), ('action', 'TITLE'))
+
+    def test_plain_text_and_narration(self):
+        doc = parse_screenplay(SCRIPT)
+        text = format_plain_text(doc)
+        self.assertIn("\n" + " " * 22 + "MARCUS\n" + " " * 10 + "Don't touch that!", text)
+        narration = narration_text(doc)
+        self.assertIn("Interior. Lab. Day.", narration)
+        self.assertIn("Sarah: It's <working>.", narration)
+        self.assertNotIn("whispering", narration)
+        self.assertNotIn("CUT TO", narration)
+
+    def test_exporters_escape_markup(self):
+        content = {'screenplay': SCRIPT, 'characters': 'Sarah', 'sound_design': 'Rain'}
+        self.assertTrue(generate_pdf(content).getvalue().startswith(b'%PDF'))
+        with zipfile.ZipFile(generate_docx(content)) as docx:
+            body = docx.read('word/document.xml').decode('utf-8')
+            styles = docx.read('word/styles.xml').decode('utf-8')
+        self.assertIn("It's &lt;working&gt;.", body)
+        self.assertIn('<w:pStyle w:val="SceneHeading"/>', body)
+        self.assertIn('w:styleId="Dialogue"', styles)
+        self.assertIn('Courier New', styles)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import sys
+import os
+import asyncio
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# Add server directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tests import isolated_stores  # noqa: F401 (before app and ai.*)
+
+from utils import tts_handler
+from utils.tts_handler import split_narration, start_narration, text_to_speech
+from utils.artifact_store import ArtifactStore
+from utils.content_store import ContentStore
+import app as app_module
+
+SCENES = "\n\n".join(f"Interior. Room {i}. Day.\nSarah searches room {i} for the key." for i in range(40))
+
+@patch.object(tts_handler, 'TTS_BACKEND', 'stub')
+class TestTTSHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_split_narration_on_scene_boundaries(self):
+        chunks = split_narration(SCENES, max_chars=300, first_chars=100)
+        self.assertLessEqual(len(chunks[0]), 100)
+        self.assertTrue(all(len(c) <= 300 for c in chunks))
+        self.assertTrue(all(c.startswith("Interior.") for c in chunks))
+        self.assertEqual("\n\n".join(chunks), SCENES)
+        # A single long paragraph still gets cut at sentence ends.
+        long_line = " ".join(f"Sentence {i} is here." for i in range(100))
+        self.assertTrue(all(len(c) <= 300 for c in split_narration(long_line, 300, 300)))
+
+    def test_chunks_render_concurrently_and_join_in_order(self):
+        active, peak = [0], [0]
+        async def slow_stub(text, voice, boundaries=None):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            # Later chunks finish first, so ordering is really exercised.
+            await asyncio.sleep(0.05 if "Room 0." in text else 0.01)
+            active[0] -= 1
+            return text.split(".")[1].encode() + b"|"
+
+        with patch.object(tts_handler, '_synthesize_stub', slow_stub), \
+             patch.object(tts_handler, 'TTS_CHUNK_CHARS', 100), \
+             patch.object(tts_handler, '_slots', asyncio.Semaphore(3)):
+            chunks = split_narration(SCENES, 100, 100)
+            narration = tts_handler.Narration(chunks, os.path.join(self.tmp, "n.mp3"))
+            streamed = b"".join(narration.iter_audio(timeout=5))
+            path = narration.wait(5)
+
+        expected = b"".join(f" Room {i}|".encode() for i in range(40))
+        self.assertEqual(streamed, expected)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(peak[0], 3)
+        self.assertEqual(os.listdir(self.tmp), ["n.mp3"])
+
+    def test_failed_save_fails_narration(self):
+        finished = []
+        with patch.object(tts_handler.os, 'replace', side_effect=OSError("No space left on device")):
+            narration = start_narration(SCENES, self.tmp, on_done=finished.append)
+            self.assertIsNone(narration.wait(5))
+        self.assertTrue(narration.done)
+        self.assertIsInstance(narration.error, OSError)
+        self.assertEqual(finished, [narration])
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_stub_backend_writes_mpeg_frames(self):
+        path = text_to_speech("Interior. Lab. Day.", self.tmp)
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertEqual(len(data) % len(tts_handler._SILENT_FRAME), 0)
+        self.assertEqual(data[:2], b"\xff\xfb")
+
+    def test_failed_chunk_fails_narration(self):
+        async def broken(text, voice, boundaries=None):
+            raise RuntimeError("offline")
+        with patch.object(tts_handler, '_synthesize_stub', broken), \
+             patch.object(tts_handler, 'TTS_RETRIES', 0):
+            narration = start_narration(SCENES, self.tmp)
+            self.assertIsNone(narration.wait(5))
+            self.assertEqual(list(narration.iter_audio(timeout=1)), [])
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_narrate_endpoint_streams_audio(self):
+        client = app_module.app.test_client()
+        content = ContentStore(os.path.join(self.tmp, "content.sqlite3"))
+        with client.session_transaction() as sess:
+            sess['content_id'] = content.put({'screenplay': "INT. LAB - DAY\n\nSarah mixes chemicals.\n"})
+        with patch.object(app_module, 'CONTENT', content), \
+             patch.object(app_module, 'NARRATION_ARTIFACTS', ArtifactStore(os.path.join(self.tmp, "audio"))):
+            data = client.post('/narrate', json={'type': 'screenplay'}).get_json()
+            self.assertTrue(data['audio_url'].startswith('/narration-stream/'))
+            response = client.get(data['audio_url'])
+            self.assertEqual(response.mimetype, 'audio/mpeg')
+            self.assertEqual(response.get_data()[:2], b"\xff\xfb")
+            app_module.NARRATIONS[data['audio_url'].rsplit('/', 1)[1]].wait(5)
+
+            # The same request again is answered from the artifact store.
+            again = client.post('/narrate', json={'type': 'screenplay'}).get_json()
+            self.assertTrue(again['cached'])
+            self.assertEqual(again['audio_url'], data['download_url'])
+
+if __name__ == '__main__':
+    unittest.main()
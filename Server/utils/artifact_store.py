@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Leftovers of writes that never finished.
+_PARTIAL_SUFFIXES = (".part", ".tmp")
+# Partial writes untouched for this long are abandoned. Younger ones may be
+# renders still running in another worker process sharing the directory.
+PARTIAL_GRACE = 3600
+# A hit only bumps the file's mtime (its LRU position on disk) when the
+# last bump is older than this. Each bump changes Last-Modified and makes
+# media_server hash the file again for its ETag.
+TOUCH_INTERVAL = 3600
+
+class ArtifactStore:
+    """
+    Directory of generated media files named by a hash of the request that
+    produced them, so an identical request finds the existing file instead
+    of rendering a new one.
+
+    The directory has a byte quota; past it the least recently used files
+    are deleted. The index is rebuilt from disk at startup (reconcile),
+    which also adopts files from older versions so they count against the
+    quota, and removes stale half-written leftovers. Files that another
+    process wrote into the same directory are adopted on first lookup.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, name="artifacts"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self._files = OrderedDict()  # {filename: size}, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.reconcile()
+
+    @staticmethod
+    def make_key(**request):
+        blob = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def path(self, key, ext):
+        """Where the artifact for `key` lives (whether or not it exists yet)."""
+        return os.path.join(self.directory, f"{key}{ext}")
+
+    def get(self, key, ext):
+        """Returns the path of an existing artifact and marks it used, or None."""
+        filename = f"{key}{ext}"
+        path = os.path.join(self.directory, filename)
+        try:
+            st = os.stat(path)
+            size = st.st_size
+        except OSError:
+            size = None
+        with self._lock:
+            if size is None:
+                self._bytes -= self._files.pop(filename, 0)
+                self.misses += 1
+                return None
+            if filename not in self._files:
+                # Rendered by another worker process: count it from now on.
+                self._bytes += size
+                self._files[filename] = size
+                self._evict(keep=filename)
+            self._files.move_to_end(filename)
+            self.hits += 1
+        if time.time() - st.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path)  # keeps LRU order across restarts
+            except OSError:
+                pass
+        return path
+
+    def add(self, path):
+        """Registers a finished file written at path(key, ext) and enforces the quota."""
+        filename = os.path.basename(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes += size - self._files.pop(filename, 0)
+            self._files[filename] = size
+            self._evict(keep=filename)
+
+    def _evict(self, keep=None):
+        # Drop oldest files until back to 90% of the quota.
+        while self._bytes > self.max_bytes * 0.9 and self._files:
+            filename, size = next(iter(self._files.items()))
+            if filename == keep:
+                break
+            del self._files[filename]
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+
+    def reconcile(self):
+        """Rebuilds the index from the directory. Returns the number of files indexed."""
+        stale = time.time() - PARTIAL_GRACE
+        entries = []
+        removed = 0
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if not os.path.isfile(path):
+                continue
+            if filename.endswith(_PARTIAL_SUFFIXES):
+                if st.st_mtime > stale:
+                    continue
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+                continue
+            entries.append((st.st_mtime, filename, st.st_size))
+
+        with self._lock:
+            self._files = OrderedDict((filename, size) for _, filename, size in sorted(entries))
+            self._bytes = sum(self._files.values())
+            self._evict()
+            indexed = len(self._files)
+        logger.info(f"{self.name}: indexed {indexed} files ({self._bytes / 1e6:.1f} MB), "
+                    f"removed {removed} stale partial writes")
+        return indexed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "files": len(self._files),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+class AsyncWaiters:
+    """
+    Lets coroutines wait for state that worker threads change, without a
+    thread per waiter: wake() (callable from any thread) resolves every
+    pending future on its own event loop.
+
+    Objects that already signal a threading.Condition call wake() at the
+    same points; async readers then use wait_for() with a predicate.
+    """
+
+    def __init__(self):
+        self._waiters = set()  # {(loop, future)}
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait_for(self, predicate, timeout=None):
+        """Waits until predicate() is true or `timeout` passes. Returns predicate()."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not predicate():
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            entry = (loop, loop.create_future())
+            with self._lock:
+                self._waiters.add(entry)
+            # Re-check after registering so a wake() in between is not lost.
+            if predicate():
+                self._discard(entry)
+                return True
+            try:
+                await asyncio.wait_for(entry[1], remaining)
+            except asyncio.TimeoutError:
+                self._discard(entry)
+                return predicate()
+        return True
+
+    def _discard(self, entry):
+        with self._lock:
+            self._waiters.discard(entry)
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
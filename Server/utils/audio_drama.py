@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import os
+import re
+import uuid
+
+from .screenplay_parser import HEADING, ACTION, CHARACTER, DIALOGUE, spoken_heading
+from .tts_handler import DEFAULT_VOICE, Narration, synthesize, tts_slot
+
+logger = logging.getLogger(__name__)
+
+NARRATOR = "NARRATOR"
+NARRATOR_VOICE = DEFAULT_VOICE
+# Christopher stays the narrator, so cast voices never reuse it.
+MALE_VOICES = ["en-US-GuyNeural", "en-US-EricNeural", "en-US-RogerNeural",
+               "en-US-SteffanNeural", "en-US-AndrewNeural", "en-US-BrianNeural"]
+FEMALE_VOICES = ["en-US-JennyNeural", "en-US-AriaNeural", "en-US-MichelleNeural",
+                 "en-US-EmmaNeural", "en-US-AvaNeural"]
+
+# One synthesis call per voice, unless its script is longer than this;
+# oversized batches are split so they can render side by side.
+DRAMA_BATCH_CHARS = int(os.getenv("DRAMA_BATCH_CHARS", "6000"))
+# Silence between consecutive lines in the mixed track.
+LINE_GAP = 0.25
+
+# Subject pronouns and nouns say more about who a profile describes than
+# object forms ("He wants her formula"), so they count double.
+_SHE_RE = re.compile(r"\b(she|woman|girl|mother|daughter|sister|wife|queen)\b", re.I)
+_HE_RE = re.compile(r"\b(he|man|boy|father|son|brother|husband|king)\b", re.I)
+_HER_RE = re.compile(r"\b(her|hers|herself)\b", re.I)
+_HIM_RE = re.compile(r"\b(him|his|himself)\b", re.I)
+_NORM_RE = re.compile(r"[\W_]+")
+
+class Line:
+    """One spoken line of the drama and the scene section it belongs to."""
+    __slots__ = ('index', 'section', 'speaker', 'voice', 'text')
+
+    def __init__(self, index, section, speaker, voice, text):
+        self.index = index
+        self.section = section
+        self.speaker = speaker
+        self.voice = voice
+        self.text = text
+
+def assign_voices(names, characters_text=""):
+    """
+    Maps character names to voices. The characters section decides the
+    voice pool (pronouns near the name); unknown characters alternate.
+    """
+    voices = {}
+    pools = {"f": list(FEMALE_VOICES), "m": list(MALE_VOICES)}
+    used = {"f": 0, "m": 0}
+    profiles = [block for block in re.split(r"\n\s*\n|-{3,}|={3,}", characters_text or "") if block.strip()]
+
+    for i, name in enumerate(names):
+        profile = " ".join(b for b in profiles if name.lower() in b.lower())
+        she = 2 * len(_SHE_RE.findall(profile)) + len(_HER_RE.findall(profile))
+        he = 2 * len(_HE_RE.findall(profile)) + len(_HIM_RE.findall(profile))
+        pool = "f" if she > he else "m" if he > she else ("m" if i % 2 == 0 else "f")
+        voices[name] = pools[pool][used[pool] % len(pools[pool])]
+        used[pool] += 1
+    return voices
+
+def plan_drama(doc, characters_text=""):
+    """
+    Walks a parsed screenplay into spoken lines: the narrator reads scene
+    headings and action, each character speaks their own dialogue. Cues,
+    parentheticals and transitions are not read aloud.
+    Returns (lines, voices, sections).
+    """
+    voices = assign_voices(doc.characters(), characters_text)
+    voices[NARRATOR] = NARRATOR_VOICE
+    lines = []
+    section = 0
+    speaker = None
+
+    def add(who, text):
+        text = text.strip()
+        if not text:
+            return
+        # Consecutive dialogue of one speaker is one line.
+        if lines and lines[-1].speaker == who and lines[-1].section == section and who != NARRATOR:
+            lines[-1].text += " " + text
+            return
+        lines.append(Line(len(lines), section, who, voices[who], text))
+
+    for kind, text in doc:
+        if kind == HEADING:
+            if lines:
+                section += 1
+            add(NARRATOR, spoken_heading(text))
+            speaker = None
+        elif kind == ACTION:
+            add(NARRATOR, text)
+            speaker = None
+        elif kind == CHARACTER:
+            speaker = text.split("(")[0].strip()
+        elif kind == DIALOGUE:
+            add(speaker if speaker in voices else NARRATOR, text)
+    return lines, voices, section + 1 if lines else 0
+
+def batch_by_voice(lines, max_chars=DRAMA_BATCH_CHARS):
+    """Groups lines into [(voice, [Line, ...])], one batch per voice unless over max_chars."""
+    by_voice = {}
+    for line in lines:
+        by_voice.setdefault(line.voice, []).append(line)
+
+    batches = []
+    for voice, voice_lines in by_voice.items():
+        batch, size = [], 0
+        for line in voice_lines:
+            if batch and size + len(line.text) > max_chars:
+                batches.append((voice, batch))
+                batch, size = [], 0
+            batch.append(line)
+            size += len(line.text) + 2
+        batches.append((voice, batch))
+    return batches
+
+def _batch_text(batch):
+    # Each line must end a sentence so the boundaries can be matched back to it.
+    return "\n\n".join(line.text if line.text[-1] in ".!?…\"'" else line.text + "." for line in batch)
+
+# Layer III bitrate (kbps) tables by MPEG-1 / MPEG-2(.5), sample rates by version bits.
+_BITRATES = {True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+             False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+def mp3_frames(data):
+    """Returns [(start, end, seconds)] for the Layer III frames in data, skipping tags and junk."""
+    frames = []
+    pos = 0
+    while pos + 4 <= len(data):
+        if data[pos:pos + 3] == b"ID3" and pos + 10 <= len(data):
+            size = (data[pos + 6] << 21) | (data[pos + 7] << 14) | (data[pos + 8] << 7) | data[pos + 9]
+            pos += 10 + size
+            continue
+        b1, b2 = data[pos + 1], data[pos + 2]
+        version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if (data[pos] != 0xFF or b1 & 0xE0 != 0xE0 or layer != 1 or version == 1
+                or bitrate_index in (0, 15) or rate_index == 3):
+            pos += 1
+            continue
+        mpeg1 = version == 3
+        rate = _SAMPLE_RATES[version][rate_index]
+        samples = 1152 if mpeg1 else 576
+        length = samples // 8 * _BITRATES[mpeg1][bitrate_index] * 1000 // rate + ((b2 >> 1) & 1)
+        frames.append((pos, pos + length, samples / rate))
+        pos += length
+    return frames
+
+def silent_frame_like(data, frame):
+    """A silent frame in the same format as `frame`, so silence splices in cleanly."""
+    start, end, _ = frame
+    header = bytearray(data[start:start + 4])
+    padded = header[2] & 0x02
+    header[2] &= ~0x02 & 0xFF
+    return bytes(header) + bytes(end - start - 4 - (1 if padded else 0))
+
+def _line_starts(batch, boundaries, total):
+    """Start time of each line in its batch audio, from sentence boundaries."""
+    starts = []
+    b = 0
+    for line in batch:
+        if b >= len(boundaries):
+            break
+        starts.append(boundaries[b][0])
+        need = len(_NORM_RE.sub("", line.text))
+        got = 0
+        while b < len(boundaries) and got < need - 1:
+            got += len(_NORM_RE.sub("", boundaries[b][2]))
+            b += 1
+    if len(starts) == len(batch) and all(x < y for x, y in zip(starts, starts[1:])):
+        return [0.0] + starts[1:]
+    # Boundaries did not line up; fall back to sharing time by text length.
+    logger.warning("Sentence boundaries did not match the batch; splitting by length")
+    sizes = [len(line.text) + 1 for line in batch]
+    starts, acc = [], 0
+    for size in sizes:
+        starts.append(total * acc / sum(sizes))
+        acc += size
+    return starts
+
+def slice_batch(audio, batch, boundaries):
+    """Cuts a batch's audio into {line index: MP3 bytes} at the line start times."""
+    frames = mp3_frames(audio)
+    total = sum(f[2] for f in frames)
+    starts = _line_starts(batch, boundaries, total) + [float("inf")]
+    segments = {}
+    current, clock, parts = 0, 0.0, []
+    for start, end, seconds in frames:
+        # Midpoint decides which line a frame belongs to.
+        while clock + seconds / 2 >= starts[current + 1]:
+            segments[batch[current].index] = b"".join(parts)
+            current, parts = current + 1, []
+        parts.append(audio[start:end])
+        clock += seconds
+    segments[batch[current].index] = b"".join(parts)
+    for line in batch[current + 1:]:
+        segments[line.index] = b""
+    return segments
+
+class DramaNarration(Narration):
+    """
+    Multi-voice narration. Every voice's lines are rendered in as few
+    synthesis calls as possible, all voices in parallel; the audio is then
+    cut back into lines and sequenced into one track, scene by scene.
+    `cues` holds the timeline once done.
+    """
+
+    def __init__(self, doc, characters_text, output_path, on_done=None, narration_id=None):
+        self.lines, self.voices, sections = plan_drama(doc, characters_text)
+        self.batches = batch_by_voice(self.lines)
+        self.cues = None
+        super().__init__(list(range(sections)), output_path, NARRATOR_VOICE, on_done, narration_id)
+
+    async def _render(self, voice, batch):
+        boundaries = []
+        async with tts_slot():
+            audio = await synthesize(_batch_text(batch), voice, boundaries)
+        return slice_batch(audio, batch, boundaries)
+
+    async def _run(self):
+        try:
+            logger.info(f"Drama {self.id}: {len(self.lines)} lines, {len(self.batches)} synthesis calls")
+            rendered = await asyncio.gather(*(self._render(voice, batch) for voice, batch in self.batches))
+            segments = {}
+            for batch_segments in rendered:
+                segments.update(batch_segments)
+            self._mix(segments)
+        except Exception as e:
+            logger.error(f"Drama {self.id} failed: {e}")
+            self._finish(e)
+        else:
+            self._finish(None)
+
+    def _mix(self, segments):
+        gap = b""
+        gap_seconds = 0.0
+        sample = next((audio for audio in segments.values() if audio), b"")
+        frames = mp3_frames(sample)
+        if frames:
+            # All voices share one output format, so any frame can model the silence.
+            frames_per_gap = max(1, round(LINE_GAP / frames[0][2]))
+            gap = silent_frame_like(sample, frames[0]) * frames_per_gap
+            gap_seconds = frames_per_gap * frames[0][2]
+
+        cues = []
+        clock = 0.0
+        section, parts = 0, []
+        for line in self.lines:
+            if line.section != section:
+                self._store(section, b"".join(parts))
+                section, parts = line.section, []
+            audio = segments[line.index]
+            seconds = sum(f[2] for f in mp3_frames(audio))
+            cues.append({"start": round(clock, 3), "duration": round(seconds, 3),
+                         "speaker": line.speaker, "voice": line.voice, "text": line.text})
+            parts += [audio, gap]
+            clock += seconds + gap_seconds
+        self._store(section, b"".join(parts))
+        self.cues = cues
+
+def start_drama(doc, characters_text="", output_dir="server/temp", on_done=None,
+                output_path=None, narration_id=None):
+    """Starts a multi-voice narration of a parsed screenplay; None if there is nothing to read."""
+    if not any(kind in (HEADING, ACTION, DIALOGUE) for kind, _ in doc):
+        return None
+    if output_path is None:
+        output_path = os.path.join(output_dir, f"drama_{uuid.uuid4().hex}.mp3")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    return DramaNarration(doc, characters_text, output_path, on_done, narration_id)
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from .job_store import _Transaction
+
+logger = logging.getLogger(__name__)
+
+class ContentStore:
+    """
+    Server-side home of generated content (screenplay, characters, sound
+    design, synopsis...), so the session cookie only carries its ID.
+
+    Each field is stored once as a zlib-compressed JSON blob keyed by its
+    SHA-256; a content ID maps field names to blobs. Updates are copy-on-
+    write: update() returns a new ID that shares the unchanged fields, and
+    the old ID (e.g. held by a share link) keeps its version. Contents
+    expire `ttl` seconds after last use; sweep() drops them and any blob no
+    longer referenced.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, level=6):
+        self.path = path
+        self.ttl = ttl
+        self.level = level
+        self._local = threading.local()
+        self._sweeper = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL
+                )""")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS contents (
+                    id TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                )""")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS content_fields (
+                    id TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (id, field)
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS content_fields_hash ON content_fields (hash)")
+            db.execute("CREATE INDEX IF NOT EXISTS contents_expires ON contents (expires_at)")
+
+    def _connect(self, write=True):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return _Transaction(db, write)
+
+    def _encode(self, fields):
+        """{field: value} -> ({field: hash}, {hash: raw bytes})."""
+        hashes, raws = {}, {}
+        for field, value in fields.items():
+            raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            digest = hashlib.sha256(raw).hexdigest()
+            hashes[field] = digest
+            raws[digest] = raw
+        return hashes, raws
+
+    def _store_blobs(self, db, raws):
+        # Only compress what the store does not already hold.
+        marks = ",".join("?" * len(raws))
+        known = {row[0] for row in db.execute(f"SELECT hash FROM blobs WHERE hash IN ({marks})", list(raws))}
+        db.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                       [(h, zlib.compress(raw, self.level), len(raw)) for h, raw in raws.items() if h not in known])
+
+    def put(self, content):
+        """Stores a content dict and returns its new ID."""
+        content_id = uuid.uuid4().hex
+        hashes, raws = self._encode(content)
+        with self._connect() as db:
+            if raws:
+                self._store_blobs(db, raws)
+            db.execute("INSERT INTO contents VALUES (?, ?)", (content_id, time.time() + self.ttl))
+            db.executemany("INSERT INTO content_fields VALUES (?, ?, ?)",
+                           [(content_id, field, h) for field, h in hashes.items()])
+        return content_id
+
+    def update(self, content_id, **fields):
+        """
+        Copy-on-write: returns the ID of a new content with `fields` replaced
+        and the rest shared with `content_id`, or None if that has expired.
+        """
+        new_id = uuid.uuid4().hex
+        hashes, raws = self._encode(fields)
+        with self._connect() as db:
+            if not db.execute("SELECT 1 FROM contents WHERE id = ? AND expires_at > ?",
+                              (content_id, time.time())).fetchone():
+                return None
+            if raws:
+                self._store_blobs(db, raws)
+            db.execute("INSERT INTO contents VALUES (?, ?)", (new_id, time.time() + self.ttl))
+            db.execute("INSERT INTO content_fields SELECT ?, field, hash FROM content_fields WHERE id = ?",
+                       (new_id, content_id))
+            db.executemany("INSERT OR REPLACE INTO content_fields VALUES (?, ?, ?)",
+                           [(new_id, field, h) for field, h in hashes.items()])
+        return new_id
+
+    def get(self, content_id, fields=None):
+        """
+        Returns the content dict (only `fields`, if given) or None once
+        expired. Reading pushes the expiry back.
+        """
+        now = time.time()
+        query = ("SELECT f.field, b.data FROM content_fields f JOIN blobs b ON b.hash = f.hash "
+                 "WHERE f.id = ?")
+        params = [content_id]
+        if fields is not None:
+            query += f" AND f.field IN ({','.join('?' * len(fields))})"
+            params.extend(fields)
+        with self._connect(write=False) as db:
+            row = db.execute("SELECT expires_at FROM contents WHERE id = ?", (content_id,)).fetchone()
+            if row is None or row[0] <= now:
+                return None
+            rows = db.execute(query, params).fetchall()
+        # Only take the write lock to push the expiry back, once half the lifetime has passed.
+        if row[0] - now < self.ttl / 2:
+            with self._connect() as db:
+                db.execute("UPDATE contents SET expires_at = ? WHERE id = ? AND expires_at < ?",
+                           (now + self.ttl, content_id, now + self.ttl))
+        return {field: json.loads(zlib.decompress(data)) for field, data in rows}
+
+    def sweep(self):
+        """Drops expired contents and unreferenced blobs. Returns the number of contents removed."""
+        with self._connect() as db:
+            expired = db.execute("DELETE FROM contents WHERE expires_at <= ?", (time.time(),)).rowcount
+            if expired:
+                db.execute("DELETE FROM content_fields WHERE id NOT IN (SELECT id FROM contents)")
+                db.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM content_fields)")
+        return expired
+
+    def start_sweeper(self, interval=600):
+        """Runs sweep() every `interval` seconds on a daemon thread."""
+        if self._sweeper:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        logger.info(f"Swept {removed} expired contents")
+                except Exception as e:
+                    logger.error(f"Content store sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=_loop, daemon=True)
+        self._sweeper.start()
+
+    def stats(self):
+        with self._connect(write=False) as db:
+            contents = db.execute("SELECT COUNT(*) FROM contents").fetchone()[0]
+            blobs, raw, stored = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        return {"contents": contents, "blobs": blobs, "bytes": raw, "stored_bytes": stored}
@@ -0,0 +1,48 @@
+import threading
+
+from .async_waiters import AsyncWaiters
+
+class JobEvents:
+    """
+    Change counters per job that request handlers can block on, so status
+    long-polls answer the moment a worker moves a job on instead of
+    on the next poll.
+
+    Workers call notify(job_id) after changing a job (or notify() when a
+    change touches every job, like queue positions moving up). Readers
+    take version(job_id), check the job, then wait(job_id, version) —
+    or await wait_async() on an event loop.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._epoch = 0
+        self._cond = threading.Condition()
+        self._async = AsyncWaiters()
+
+    def version(self, job_id):
+        return self._epoch, self._versions.get(job_id, 0)
+
+    def notify(self, job_id=None):
+        with self._cond:
+            if job_id is None:
+                self._epoch += 1
+            else:
+                self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            self._cond.notify_all()
+        self._async.wake()
+
+    def discard(self, job_id):
+        with self._cond:
+            self._versions.pop(job_id, None)
+
+    def wait(self, job_id, version, timeout=None):
+        """Blocks until job_id's version differs from `version` or `timeout` passes. Returns the version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version(job_id) != version, timeout)
+            return self.version(job_id)
+
+    async def wait_async(self, job_id, version, timeout=None):
+        """wait() for coroutines: suspends instead of blocking a thread."""
+        await self._async.wait_for(lambda: self.version(job_id) != version, timeout)
+        return self.version(job_id)
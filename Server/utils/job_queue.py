@@ -0,0 +1,95 @@
+import time
+import heapq
+import logging
+import threading
+import itertools
+
+from .render_service import QueueFull
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    Fixed pool of worker threads fed from a bounded priority queue.
+
+    Jobs are ordered by submission order offset by `priority * priority_step`:
+    a priority-1 job is served as if it had arrived priority_step submissions
+    later than it did. Urgent work gets ahead, but nothing waits forever.
+
+    submit() raises QueueFull once max_queued jobs are waiting, so callers
+    can shed load (HTTP 429) instead of piling up threads.
+    """
+
+    def __init__(self, workers=1, max_queued=16, priority_step=4, name="jobs"):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.priority_step = priority_step
+        self.name = name
+        self._heap = []  # [(rank, job_id, fn, args)]
+        self._seq = itertools.count()
+        self._running = 0
+        self._cond = threading.Condition()
+        # Moving average of job duration, seeds the wait estimates.
+        self.avg_duration = 60.0
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job_id, fn, *args, priority=0):
+        """Queues fn(*args). Raises QueueFull when the backlog is at capacity."""
+        with self._cond:
+            if len(self._heap) >= self.max_queued:
+                raise QueueFull(f"{len(self._heap)} {self.name} already queued")
+            rank = next(self._seq) + priority * self.priority_step
+            heapq.heappush(self._heap, (rank, job_id, fn, args))
+            self._cond.notify()
+
+    @property
+    def queued(self):
+        return len(self._heap)
+
+    @property
+    def running(self):
+        return self._running
+
+    def position(self, job_id):
+        """1-based place in line, or None if the job is not waiting here."""
+        with self._cond:
+            ranks = sorted(entry[:2] for entry in self._heap)
+        for index, (_, queued_id) in enumerate(ranks):
+            if queued_id == job_id:
+                return index + 1
+        return None
+
+    def estimated_wait(self, position):
+        """Seconds until a job at `position` should start."""
+        with self._cond:
+            busy = self._running >= self.workers
+        # Jobs ahead (plus the ones running) are drained `workers` at a time.
+        rounds = (position - 1) // self.workers + (1 if busy else 0)
+        return rounds * self.avg_duration
+
+    def retry_after(self):
+        """Seconds before a rejected client should try again (one queue slot frees up)."""
+        return max(1, int(self.avg_duration / self.workers))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, job_id, fn, args = heapq.heappop(self._heap)
+                self._running += 1
+
+            started = time.monotonic()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"{self.name} job {job_id} crashed: {e}")
+            finally:
+                duration = time.monotonic() - started
+                with self._cond:
+                    self._running -= 1
+                    self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class JobStore(ABC):
+    """
+    Keyed store for short-lived records such as generation jobs and shared
+    scripts. Records are JSON-serialisable dicts; every record carries a
+    'status' and expires `ttl` seconds after its last write.
+
+    Backends: MemoryJobStore (single process) and SQLiteJobStore (shared
+    between worker processes). Use create_store() to pick one from the
+    environment.
+    """
+
+    def __init__(self, ttl=3600, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sweeper = None
+
+    @abstractmethod
+    def create(self, key, record, ttl=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, key, **fields):
+        """Merges fields into an existing record. Returns False if it is gone."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def transition(self, key, from_statuses, to_status, **fields):
+        """
+        Atomically moves a record to `to_status` (merging `fields`) only if
+        its current status is one of `from_statuses`. Returns True on success.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sweep(self):
+        """Removes expired records and returns how many were dropped."""
+        raise NotImplementedError
+
+    def start_sweeper(self, interval=60):
+        """Runs sweep() every `interval` seconds on a daemon thread."""
+        if self._sweeper:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        logger.info(f"Swept {removed} expired records")
+                except Exception as e:
+                    logger.error(f"Job store sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=_loop, daemon=True)
+        self._sweeper.start()
+
+class MemoryJobStore(JobStore):
+    """In-process store; beyond max_entries the least recently written record is dropped."""
+
+    def __init__(self, ttl=3600, max_entries=1000):
+        super().__init__(ttl, max_entries)
+        self._records = OrderedDict()  # {key: (expires_at, record)}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._records.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._records[key]
+            return None
+        return entry[1]
+
+    def create(self, key, record, ttl=None):
+        with self._lock:
+            self._records[key] = (time.time() + (ttl or self.ttl), dict(record))
+            self._records.move_to_end(key)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            record = self._live(key, time.time())
+            return dict(record) if record is not None else None
+
+    def update(self, key, **fields):
+        return self.transition(key, None, None, **fields)
+
+    def transition(self, key, from_statuses, to_status, **fields):
+        now = time.time()
+        with self._lock:
+            record = self._live(key, now)
+            if record is None:
+                return False
+            if from_statuses is not None and record.get('status') not in from_statuses:
+                return False
+            record.update(fields)
+            if to_status is not None:
+                record['status'] = to_status
+            expires_at = self._records[key][0]
+            self._records[key] = (max(expires_at, now + self.ttl), record)
+            self._records.move_to_end(key)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._records.pop(key, None) is not None
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (expires_at, _) in self._records.items() if expires_at <= now]
+            for key in expired:
+                del self._records[key]
+            return len(expired)
+
+    def __len__(self):
+        return len(self._records)
+
+class SQLiteJobStore(JobStore):
+    """
+    Store backed by one table in a SQLite database, so several worker
+    processes behind one port see the same jobs and survive restarts.
+    """
+
+    def __init__(self, path, table, ttl=3600, max_entries=1000):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    status TEXT,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires_at)")
+
+    def _connect(self, write=True):
+        # One connection per thread; isolation_level=None so we control transactions.
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return _Transaction(db, write)
+
+    def create(self, key, record, ttl=None):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)",
+                       (key, record.get('status'), json.dumps(record), now + (ttl or self.ttl), now))
+            db.execute(f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+
+    def get(self, key):
+        with self._connect(write=False) as db:
+            row = db.execute(f"SELECT data FROM {self.table} WHERE key = ? AND expires_at > ?",
+                             (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, key, **fields):
+        return self.transition(key, None, None, **fields)
+
+    def transition(self, key, from_statuses, to_status, **fields):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(f"SELECT data, expires_at FROM {self.table} WHERE key = ? AND expires_at > ?",
+                             (key, now)).fetchone()
+            if row is None:
+                return False
+            record = json.loads(row[0])
+            if from_statuses is not None and record.get('status') not in from_statuses:
+                return False
+            record.update(fields)
+            if to_status is not None:
+                record['status'] = to_status
+            db.execute(f"UPDATE {self.table} SET status = ?, data = ?, expires_at = ?, updated_at = ? WHERE key = ?",
+                       (record.get('status'), json.dumps(record), max(row[1], now + self.ttl), now, key))
+            return True
+
+    def delete(self, key):
+        with self._connect() as db:
+            return db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,)).rowcount > 0
+
+    def sweep(self):
+        with self._connect() as db:
+            return db.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def __len__(self):
+        with self._connect(write=False) as db:
+            return db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+class _Transaction:
+    """
+    Wraps a statement group in a transaction. Writes use BEGIN IMMEDIATE
+    so read-modify-write is atomic across processes; reads use a deferred
+    one, which under WAL never waits for (or blocks) a writer.
+    """
+
+    def __init__(self, db, write=True):
+        self.db = db
+        self.write = write
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE" if self.write else "BEGIN DEFERRED")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+def create_store(name, ttl=3600, max_entries=1000):
+    """
+    Builds the store configured by JOB_STORE ('memory' or 'sqlite').
+    SQLite stores share one database file (JOB_STORE_PATH), one table per name.
+    """
+    backend = os.getenv('JOB_STORE', 'memory').lower()
+    if backend == 'sqlite':
+        default_path = os.path.join(os.path.dirname(__file__), '..', 'cache', 'jobs.sqlite3')
+        return SQLiteJobStore(os.getenv('JOB_STORE_PATH', default_path), name, ttl, max_entries)
+    if backend != 'memory':
+        raise ValueError(f"Unknown JOB_STORE backend: {backend}")
+    return MemoryJobStore(ttl, max_entries)
@@ -0,0 +1,103 @@
+import os
+import mmap
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request, abort
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+# Generated files are written once under a request-hash name and never
+# edited in place, so clients may keep them for a year without revalidating.
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+BLOCK_SIZE = 256 * 1024
+
+_etags = OrderedDict()  # {(path, mtime_ns, size): etag}
+_etags_lock = threading.Lock()
+_ETAG_ENTRIES = 4096
+
+def content_etag(path, st):
+    """Strong ETag from the file's SHA-256, computed once per (path, mtime, size)."""
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _etags_lock:
+        etag = _etags.get(key)
+        if etag:
+            _etags.move_to_end(key)
+            return etag
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    etag = digest.hexdigest()[:32]
+
+    with _etags_lock:
+        _etags[key] = etag
+        while len(_etags) > _ETAG_ENTRIES:
+            _etags.popitem(last=False)
+    return etag
+
+def _mmap_body(path, start, stop):
+    """Yields memoryview slices of the mapped file: no read() copies into Python buffers."""
+    if stop <= start:
+        return
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # The server may still hold the last slice when this generator ends, so
+    # the mapping is left to be unmapped once the final reference goes.
+    view = memoryview(mapped)
+    for pos in range(start, stop, BLOCK_SIZE):
+        yield view[pos:min(pos + BLOCK_SIZE, stop)]
+
+def send_media(directory, filename, mimetype, download_name=None, cache_control=CACHE_CONTROL):
+    """
+    Serves a generated media file with a content-hash ETag and immutable
+    caching. If-None-Match answers 304; a single byte Range answers 206
+    from an mmap of the file (seeking never re-downloads the start); full
+    responses go through wsgi.file_wrapper so servers that support it
+    (gunicorn, uWSGI) send the file with sendfile(). With `download_name`
+    the browser saves it as an attachment under that name. URLs whose file
+    can change (e.g. /download/pdf) should pass cache_control="no-cache",
+    so clients revalidate and get a 304 while it is unchanged.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    st = os.stat(path)
+    size = st.st_size
+    etag = content_etag(path, st)
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if download_name:
+        headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+
+    if request.if_none_match.contains(etag) or request.if_none_match.star_tag:
+        return Response(status=304, headers=headers)
+
+    byte_range = request.range
+    # If-Range: only honour the range if the client still has this version.
+    if_range = request.if_range
+    if byte_range and ((if_range.etag and if_range.etag != etag)
+                       or (if_range.date and if_range.date.timestamp() < int(st.st_mtime))):
+        byte_range = None
+    if byte_range and byte_range.units == "bytes" and len(byte_range.ranges) == 1:
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, stop = bounds
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        headers["Content-Length"] = str(stop - start)
+        return Response(_mmap_body(path, start, stop), status=206, mimetype=mimetype,
+                        headers=headers, direct_passthrough=True)
+
+    headers["Content-Length"] = str(size)
+    body = wrap_file(request.environ, open(path, "rb"), BLOCK_SIZE)
+    response = Response(body, status=200, mimetype=mimetype, headers=headers, direct_passthrough=True)
+    response.last_modified = st.st_mtime
+    return response
@@ -0,0 +1,117 @@
+import threading
+from bisect import bisect_left
+
+# Prometheus text exposition format, as served by /metrics.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Generation stages take from under a second (cache hits) to many minutes.
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format(name, labels, value):
+    if labels:
+        name += "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+    value = float(value)
+    if value != value or value in (float("inf"), float("-inf")):
+        text = {"nan": "NaN", "inf": "+Inf", "-inf": "-Inf"}[repr(value)]
+    else:
+        text = int(value) if value.is_integer() else repr(value)
+    return f"{name} {text}"
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}  # {label values: value}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines += self._lines(list(zip(self.label_names, key)), value)
+        return lines
+
+    def _lines(self, labels, value):
+        return [_format(self.name, labels, value)]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _lines(self, labels, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(_format(f"{self.name}_bucket", labels + [("le", le)], cumulative))
+        lines.append(_format(f"{self.name}_sum", labels, total))
+        lines.append(_format(f"{self.name}_count", labels, cumulative))
+        return lines
+
+class Gauge(_Metric):
+    """A value read at scrape time from `fn`."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}",
+                _format(self.name, [], self.fn())]
+
+class Registry:
+    """The metrics behind one /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn):
+        return self._add(Gauge(name, help, fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
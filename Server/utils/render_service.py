@@ -0,0 +1,62 @@
+import os
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """Raised when the render backlog is at capacity."""
+
+class RenderService:
+    """
+    Runs CPU-bound renders (e.g. the local music synth) in a process pool,
+    so they use all cores and never block a Flask request thread.
+
+    At most `max_pending` renders may be queued or running at once; beyond
+    that submit() raises QueueFull and the caller should ask the client to
+    retry later.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, fn, *args, on_done=None):
+        """
+        Queues fn(*args) on the pool and returns its Future.
+        on_done(future) is called from a pool management thread when it ends.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} renders already queued")
+            if self._executor is None:
+                # Started lazily so importing the app doesn't fork workers.
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._pending += 1
+            future = self._executor.submit(fn, *args)
+
+        def _finished(f):
+            with self._lock:
+                self._pending -= 1
+            if on_done:
+                try:
+                    on_done(f)
+                except Exception as e:
+                    logger.error(f"Render callback failed: {e}")
+
+        future.add_done_callback(_finished)
+        return future
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
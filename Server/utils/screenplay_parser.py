@@ -0,0 +1,233 @@
+import re
+import zlib
+
+# Scene headings: INT./EXT./INT/EXT./I/E., optionally numbered or wrapped
+# in markdown (**INT. ...**, ## EXT. ...) as the model sometimes does.
+SCENE_HEADING_RE = re.compile(
+    r"^[ \t]*(?:[*#]+[ \t]*)?(?:\d+[.)]?[ \t]+)?(?:INT\./EXT\.|INT/EXT\.?|I/E\.?|INT\.|EXT\.)",
+    re.MULTILINE
+)
+
+class Scene:
+    """A scene as a span [start, end) of the screenplay text."""
+    __slots__ = ('index', 'heading', 'start', 'end')
+
+    def __init__(self, index, heading, start, end):
+        self.index = index
+        self.heading = heading
+        self.start = start
+        self.end = end
+
+    def text(self, source):
+        return source[self.start:self.end]
+
+    def __repr__(self):
+        return f"Scene({self.index}, {self.heading!r}, {self.start}, {self.end})"
+
+def split_scenes(text):
+    """
+    Splits a screenplay on its scene headings.
+    Anything before the first heading (title, notes) becomes a scene with an
+    empty heading. Scenes tile the text exactly, so joining their spans in
+    order gives back the original string.
+    """
+    if not text:
+        return []
+
+    starts = [m.start() for m in SCENE_HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+
+    scenes = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        first_line = text[start:end].split("\n", 1)[0]
+        heading = first_line.strip(" \t*#") if SCENE_HEADING_RE.match(first_line) else ""
+        scenes.append(Scene(len(scenes), heading, start, end))
+    return scenes
+
+# Element kinds, in the order used by the compact span encoding.
+HEADING, ACTION, CHARACTER, DIALOGUE, PARENTHETICAL, TRANSITION = KINDS = (
+    'heading', 'action', 'character', 'dialogue', 'parenthetical', 'transition'
+)
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+TRANSITION_RE = re.compile(r"^(?:[A-Z][A-Z ]*TO:|FADE (?:IN|OUT)[.:]?|FADE TO BLACK[.:]?|THE END\.?)$")
+# A cue is a short all-caps name, optionally with an extension: SARAH (V.O.)
+CUE_RE = re.compile(r"^[A-Z][A-Z0-9 .'\-]{0,30}(?:\s*\((?:V\.O\.|O\.S\.|O\.C\.|CONT'D|CONT’D)\))?$")
+# Inline dialogue some models produce: SARAH: Let's go. / SARAH (V.O.): ...
+INLINE_DIALOGUE_RE = re.compile(r"^([A-Z][A-Z0-9 .'\-]{0,30}(?:\s*\([^)]*\))?):\s*(\S.*)$")
+# Title-page fields look like inline dialogue but are not.
+_TITLE_FIELDS = {"TITLE", "AUTHOR", "WRITTEN BY", "GENRE", "LOGLINE", "SYNOPSIS", "NOTE", "NOTES", "DRAFT", "SCENE"}
+_MARKUP = " \t*#_"
+
+class Element:
+    """One screenplay element as a span [start, end) of the source text."""
+    __slots__ = ('kind', 'start', 'end')
+
+    def __init__(self, kind, start, end):
+        self.kind = kind
+        self.start = start
+        self.end = end
+
+    def text(self, source):
+        return source[self.start:self.end]
+
+    def __repr__(self):
+        return f"Element({self.kind!r}, {self.start}, {self.end})"
+
+class Screenplay:
+    """
+    Parsed screenplay: the original text plus typed element spans.
+    Elements never copy text; consumers slice the source on demand.
+    """
+    __slots__ = ('source', 'elements')
+
+    def __init__(self, source, elements):
+        self.source = source
+        self.elements = elements
+
+    def __iter__(self):
+        """Yields (kind, text) pairs in script order."""
+        source = self.source
+        for el in self.elements:
+            yield el.kind, source[el.start:el.end]
+
+    def scenes(self):
+        return split_scenes(self.source)
+
+    def characters(self):
+        """Character names in order of first appearance, without extensions."""
+        names = []
+        for kind, text in self:
+            if kind == CHARACTER:
+                name = text.split("(")[0].strip()
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def to_spans(self):
+        """Compact JSON-friendly encoding, cached alongside the job result."""
+        flat = []
+        for el in self.elements:
+            flat.extend((_KIND_CODES[el.kind], el.start, el.end))
+        return {"v": 1, "len": len(self.source), "crc": zlib.crc32(self.source.encode("utf-8")), "spans": flat}
+
+    @classmethod
+    def from_spans(cls, source, encoded):
+        """Rebuilds a parse from to_spans() output, or returns None if it belongs to other text."""
+        if not encoded or encoded.get("v") != 1 or encoded.get("len") != len(source):
+            return None
+        if encoded.get("crc") != zlib.crc32(source.encode("utf-8")):
+            return None
+        flat = encoded["spans"]
+        return cls(source, [Element(KINDS[flat[i]], flat[i + 1], flat[i + 2]) for i in range(0, len(flat), 3)])
+
+def _trimmed(line, offset):
+    """Span of a line without surrounding whitespace/markdown markers."""
+    left = len(line) - len(line.lstrip(_MARKUP))
+    right = len(line.rstrip(_MARKUP))
+    return offset + left, offset + max(left, right)
+
+def parse_screenplay(text):
+    """
+    Parses screenplay text into a Screenplay in a single pass over its lines.
+
+    Headings, transitions and character cues are recognised by shape; lines
+    following a cue are dialogue (or parentheticals in brackets) until the
+    next blank line; everything else is action.
+    """
+    elements = []
+    if not text:
+        return Screenplay(text or "", elements)
+
+    in_dialogue = False
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line)
+        start, end = _trimmed(line.rstrip("\r\n"), line_start)
+        if start == end:
+            in_dialogue = False
+            continue
+        content = text[start:end]
+
+        if SCENE_HEADING_RE.match(content):
+            elements.append(Element(HEADING, start, end))
+            in_dialogue = False
+        elif TRANSITION_RE.match(content):
+            elements.append(Element(TRANSITION, start, end))
+            in_dialogue = False
+        elif in_dialogue:
+            kind = PARENTHETICAL if content.startswith("(") and content.endswith(")") else DIALOGUE
+            elements.append(Element(kind, start, end))
+        elif CUE_RE.match(content) and any(c.isalpha() for c in content):
+            elements.append(Element(CHARACTER, start, end))
+            in_dialogue = True
+        else:
+            inline = INLINE_DIALOGUE_RE.match(content)
+            if inline and inline.group(1).split("(")[0].strip() not in _TITLE_FIELDS:
+                elements.append(Element(CHARACTER, start, start + len(inline.group(1))))
+                elements.append(Element(DIALOGUE, start + inline.start(2), end))
+            else:
+                elements.append(Element(ACTION, start, end))
+    return Screenplay(text, elements)
+
+def get_screenplay(content):
+    """
+    Returns the parsed screenplay for a content dict, reusing the cached
+    'screenplay_doc' spans when they still match the text.
+    """
+    source = content.get('screenplay') or ""
+    doc = Screenplay.from_spans(source, content.get('screenplay_doc'))
+    return doc or parse_screenplay(source)
+
+def format_plain_text(doc):
+    """Lays the screenplay out as monospaced text with standard indents."""
+    indents = {HEADING: 0, ACTION: 0, CHARACTER: 22, PARENTHETICAL: 16, DIALOGUE: 10}
+    lines = []
+    previous = None
+    for kind, text in doc:
+        # Blank line before every block except inside a speech.
+        if lines and not (kind in (DIALOGUE, PARENTHETICAL) and previous in (CHARACTER, DIALOGUE, PARENTHETICAL)):
+            lines.append("")
+        if kind == TRANSITION:
+            lines.append(text.rjust(60))
+        else:
+            lines.append(" " * indents[kind] + text)
+        previous = kind
+    return "\n".join(lines)
+
+def narration_text(doc):
+    """
+    Text for a single-voice read: scene headings spoken plainly, cues as
+    'NAME:' before the line, parentheticals and transitions skipped.
+    Scenes are separated by a blank line.
+    """
+    parts = []
+    speaker = None
+    for kind, text in doc:
+        if kind == HEADING:
+            if parts:
+                parts.append("")
+            parts.append(spoken_heading(text))
+        elif kind == ACTION:
+            parts.append(text)
+        elif kind == CHARACTER:
+            speaker = text.split("(")[0].strip().title()
+        elif kind == DIALOGUE:
+            parts.append(f"{speaker}: {text}" if speaker else text)
+            speaker = None
+    return "\n".join(parts)
+
+_HEADING_WORDS = {"INT.": "Interior.", "EXT.": "Exterior.", "INT./EXT.": "Interior, exterior.",
+                  "INT/EXT.": "Interior, exterior.", "I/E.": "Interior, exterior."}
+
+def spoken_heading(heading):
+    """'INT. LAB - DAY' -> 'Interior. Lab. Day.'"""
+    head, _, rest = heading.partition(" ")
+    prefix = _HEADING_WORDS.get(head.upper())
+    if not prefix:
+        return heading
+    place = ". ".join(part.strip().title() for part in rest.split(" - ") if part.strip())
+    return f"{prefix} {place}."
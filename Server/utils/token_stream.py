@@ -0,0 +1,59 @@
+import threading
+
+from .async_waiters import AsyncWaiters
+
+class TokenStream:
+    """
+    Append-only buffer of generated text chunks shared between the job
+    thread that produces them and any number of SSE readers.
+
+    Readers keep their own cursor and block in wait() (or await
+    wait_async() on an event loop) until new chunks arrive or the stream
+    is closed.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._closed = False
+        self.error = None
+        self._cond = threading.Condition()
+        self._async = AsyncWaiters()
+
+    def append(self, text):
+        if not text:
+            return
+        with self._cond:
+            self._chunks.append(text)
+            self._cond.notify_all()
+        self._async.wake()
+
+    def close(self, error=None):
+        with self._cond:
+            self._closed = True
+            self.error = error
+            self._cond.notify_all()
+        self._async.wake()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def text(self):
+        with self._cond:
+            return "".join(self._chunks)
+
+    def wait(self, cursor, timeout=None):
+        """
+        Returns (new_chunks, closed) for everything after `cursor`.
+        Blocks up to `timeout` seconds if nothing new is available yet.
+        """
+        with self._cond:
+            if cursor >= len(self._chunks) and not self._closed:
+                self._cond.wait(timeout)
+            return self._chunks[cursor:], self._closed
+
+    async def wait_async(self, cursor, timeout=None):
+        """wait() for coroutines: suspends instead of blocking a thread."""
+        await self._async.wait_for(lambda: cursor < len(self._chunks) or self._closed, timeout)
+        with self._cond:
+            return self._chunks[cursor:], self._closed
@@ -1,30 +1,272 @@
-import edge_tts
 import asyncio
+import logging
+import math
 import os
+import re
+import threading
 import uuid
 
+try:
+    import edge_tts
+except ImportError:  # only the stub backend is available
+    edge_tts = None
+
+from .async_waiters import AsyncWaiters
+
+logger = logging.getLogger(__name__)
+
 # Voice options: en-US-ChristopherNeural, en-US-EricNeural, en-US-GuyNeural, en-US-MichelleNeural
 # Christopher is great for cinematic narration.
+DEFAULT_VOICE = "en-US-ChristopherNeural"
+
+# 'edge' (online, neural) or 'stub' (offline silence, for tests and dev boxes).
+TTS_BACKEND = os.getenv("TTS_BACKEND", "edge").lower()
+# Chunks synthesized at once; edge-tts throttles beyond a handful per client.
+TTS_CONCURRENCY = max(1, int(os.getenv("TTS_CONCURRENCY", "4")))
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "2000"))
+# The first chunk is kept short so playback can start quickly.
+TTS_FIRST_CHUNK_CHARS = int(os.getenv("TTS_FIRST_CHUNK_CHARS", "400"))
+TTS_RETRIES = 1
+
+# Silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, 1152 samples.
+# Concatenates cleanly, so stub chunks behave like real ones.
+_SILENT_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC4]) + bytes(413)
+_FRAME_SECONDS = 1152 / 44100
+# Roughly 14 characters per second of speech.
+_STUB_SECONDS_PER_CHAR = 0.07
+# With TTS_STUB_SPEED=N the stub takes 1/N of the audio's length to answer,
+# like a network synthesizer running N times faster than real time
+# (edge-tts manages roughly 10-30x). 0 answers at once.
+TTS_STUB_SPEED = float(os.getenv("TTS_STUB_SPEED", "0"))
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def split_narration(text, max_chars=TTS_CHUNK_CHARS, first_chars=TTS_FIRST_CHUNK_CHARS):
+    """
+    Splits narration into chunks for synthesis, cutting at blank lines
+    (scene boundaries in narration_text()) where possible, then at lines,
+    then at sentence ends. The first chunk targets first_chars.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.split("\n"):
+            if len(line) <= max_chars:
+                pieces.append(line)
+            else:
+                pieces.extend(s for s in _SENTENCE_END_RE.split(line) if s)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        limit = first_chars if not chunks else max_chars
+        if current and len(current) + len(piece) + 2 > limit:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+_loop = None
+_loop_lock = threading.Lock()
+_slots = None
+
+def _event_loop():
+    """The one event loop all synthesis runs on, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="tts-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+def tts_slot():
+    """Semaphore bounding concurrent synthesis calls across all narrations (use on the TTS loop)."""
+    # Created on the loop thread on first use.
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(TTS_CONCURRENCY)
+    return _slots
+
+async def _synthesize_edge(text, voice, boundaries=None):
+    if edge_tts is None:
+        raise RuntimeError("edge-tts is not installed; set TTS_BACKEND=stub")
+    audio = bytearray()
+    async for chunk in edge_tts.Communicate(text, voice).stream():
+        if chunk["type"] == "audio":
+            audio.extend(chunk["data"])
+        elif chunk["type"] == "SentenceBoundary" and boundaries is not None:
+            # Offsets and durations come in 100 ns ticks.
+            boundaries.append((chunk["offset"] / 1e7, chunk["duration"] / 1e7, chunk["text"]))
+    return bytes(audio)
+
+async def _synthesize_stub(text, voice, boundaries=None):
+    await asyncio.sleep(0)
+    audio = bytearray()
+    for sentence in _SENTENCE_END_RE.split(text.replace("\n", " ")):
+        if not sentence.strip():
+            continue
+        frames = max(1, math.ceil(len(sentence) * _STUB_SECONDS_PER_CHAR / _FRAME_SECONDS))
+        if boundaries is not None:
+            offset = len(audio) // len(_SILENT_FRAME) * _FRAME_SECONDS
+            boundaries.append((offset, frames * _FRAME_SECONDS, sentence.strip()))
+        audio.extend(_SILENT_FRAME * frames)
+    if TTS_STUB_SPEED > 0:
+        await asyncio.sleep(len(audio) // len(_SILENT_FRAME) * _FRAME_SECONDS / TTS_STUB_SPEED)
+    return bytes(audio or _SILENT_FRAME)
+
+async def synthesize(text, voice, boundaries=None):
+    """
+    Renders text to MP3 bytes with the configured backend, retrying once.
+    If `boundaries` is a list it receives (offset s, duration s, text) per sentence.
+    """
+    backend = _synthesize_stub if TTS_BACKEND == "stub" else _synthesize_edge
+    for attempt in range(TTS_RETRIES + 1):
+        if boundaries is not None:
+            boundaries.clear()
+        try:
+            return await backend(text, voice, boundaries)
+        except Exception as e:
+            if attempt == TTS_RETRIES:
+                raise
+            logger.warning(f"TTS chunk failed ({e}), retrying")
+            await asyncio.sleep(1)
+
+class Narration:
+    """
+    One narration in progress. Chunks are synthesized concurrently but
+    exposed strictly in order: iter_audio() yields each chunk as soon as it
+    and everything before it exist, and the MP3 file is appended to the
+    same way, then renamed into place when complete. aiter_audio() is the
+    same stream for coroutines on another event loop (the async server).
+    """
+
+    def __init__(self, chunks, output_path, voice=DEFAULT_VOICE, on_done=None, narration_id=None):
+        self.id = narration_id or uuid.uuid4().hex
+        self.chunks = chunks
+        self.path = output_path
+        self.voice = voice
+        self.error = None
+        self.done = False
+        self._on_done = on_done
+        self._audio = [None] * len(chunks)
+        self._written = 0
+        self._cond = threading.Condition()
+        self._async = AsyncWaiters()
+        # Unique per process: workers sharing the artifact directory may render the same path.
+        self._tmp_path = f"{output_path}.{os.getpid()}.{self.id}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._future = asyncio.run_coroutine_threadsafe(self._run(), _event_loop())
+
+    async def _run(self):
+        async def one(i, text):
+            async with tts_slot():
+                audio = await synthesize(text, self.voice)
+            self._store(i, audio)
+
+        # Tasks queue on the semaphore in creation order, so early chunks go first.
+        tasks = [asyncio.ensure_future(one(i, text)) for i, text in enumerate(self.chunks)]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            logger.error(f"Narration {self.id} failed: {e}")
+            for task in tasks:
+                task.cancel()
+            self._finish(e)
+        else:
+            self._finish(None)
+
+    def _store(self, index, audio):
+        with self._cond:
+            self._audio[index] = audio
+            while self._written < len(self._audio) and self._audio[self._written] is not None:
+                self._file.write(self._audio[self._written])
+                self._written += 1
+            self._file.flush()
+            self._cond.notify_all()
+        self._async.wake()
+
+    def _finish(self, error):
+        try:
+            self._file.close()
+            if error is None:
+                os.replace(self._tmp_path, self.path)
+        except OSError as e:
+            # Disk full, or the directory was swept: the narration failed after all.
+            logger.error(f"Narration {self.id} could not be saved: {e}")
+            error = e
+        finally:
+            if error is not None:
+                try:
+                    os.remove(self._tmp_path)
+                except OSError:
+                    pass
+            with self._cond:
+                self.error = error
+                self.done = True
+                self._cond.notify_all()
+            self._async.wake()
+            if self._on_done:
+                self._on_done(self)
 
-async def _generate_audio(text, output_file, voice="en-US-ChristopherNeural"):
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_file)
+    def iter_audio(self, timeout=300):
+        """Yields MP3 bytes chunk by chunk, in order; stops early on failure."""
+        for index in range(len(self._audio)):
+            with self._cond:
+                ready = self._cond.wait_for(
+                    lambda: self._audio[index] is not None or self.error is not None, timeout)
+                if not ready or self._audio[index] is None:
+                    return
+                data = self._audio[index]
+            yield data
+
+    async def aiter_audio(self, timeout=300):
+        """iter_audio() for coroutines: waits without holding a thread."""
+        for index in range(len(self._audio)):
+            ready = await self._async.wait_for(
+                lambda: self._audio[index] is not None or self.error is not None, timeout)
+            if not ready or self._audio[index] is None:
+                return
+            yield self._audio[index]
+
+    def wait(self, timeout=None):
+        """Blocks until finished. Returns the MP3 path, or None if synthesis failed."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout)
+            return self.path if self.done and self.error is None else None
+
+def start_narration(text, output_dir="server/temp", voice=DEFAULT_VOICE, on_done=None,
+                    output_path=None, narration_id=None):
+    """
+    Starts synthesizing text in the background and returns its Narration.
+    The MP3 goes to output_path if given, else a fresh name in output_dir.
+    Returns None if there is nothing to read.
+    """
+    chunks = split_narration(text)
+    if not chunks:
+        return None
+    if output_path is None:
+        output_path = os.path.join(output_dir, f"speech_{uuid.uuid4().hex}.mp3")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    return Narration(chunks, output_path, voice, on_done, narration_id)
 
 def text_to_speech(text, output_dir="server/temp"):
     """
     Converts text to speech using Edge-TTS (online, neural).
     Returns the absolute path to the generated MP3 file.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    filename = f"speech_{uuid.uuid4().hex}.mp3"
-    filepath = os.path.join(output_dir, filename)
-
-    try:
-        # Run async function in synchronous wrapper
-        asyncio.run(_generate_audio(text, filepath))
-        return filepath
-    except Exception as e:
-        print(f"EdgeTTS Error: {e}")
+    narration = start_narration(text, output_dir)
+    if narration is None:
         return None
+    path = narration.wait()
+    if path is None:
+        print(f"EdgeTTS Error: {narration.error}")
+    return path